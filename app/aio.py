@@ -0,0 +1,95 @@
+# app/aio.py
+"""
+Chamadas boto3 sem bloquear o event loop (views async do Flask / modo ASGI).
+
+O boto3 é síncrono; em vez de trocar de SDK (aioboto3 exigiria outra versão
+do botocore e duplicar o repositório de cartões), cada chamada roda num pool
+de threads próprio (AIO_THREADS) e a view só faz `await`. Chamadas
+independentes rodam juntas:
+
+    user, card = await aio.gather(
+        aio.run(aws.users_table.get_item, Key={"email": email}),
+        aio.run(find_card_by_owner, email),
+    )
+
+O contexto (request/g) vai junto para a thread, então métricas e o
+Server-Timing continuam vendo as chamadas AWS.
+
+Hoje só o /login usa: é a única view com leituras independentes. As outras
+(cartão, criação, atualização, lote) encadeiam chamadas que dependem da
+anterior e continuam síncronas; a concorrência entre requisições vem das
+threads do servidor (gthread ou asgi.py).
+
+init_app() troca o async_to_sync do Flask (que exige o asgiref) por um
+event loop por thread: a view async roda no loop da própria thread que
+atende a requisição, seja no gunicorn ou atrás do asgi.py.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import Config
+
+_executor = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.AIO_THREADS, thread_name_prefix="aio")
+    return _executor
+
+
+async def run(fn, *args, **kwargs):
+    """Roda fn(*args, **kwargs) no pool e espera sem bloquear o loop."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor(), functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+async def gather(*awaitables):
+    """asyncio.gather que propaga a primeira exceção (as outras chamadas terminam no pool)."""
+    return await asyncio.gather(*awaitables)
+
+
+class AsyncProxy:
+    """Versão aguardável de um client/Table: `await wrap(table).get_item(...)`."""
+
+    def __init__(self, target):
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        return functools.partial(run, attr)
+
+
+def wrap(target):
+    return AsyncProxy(target)
+
+
+# ---------- Flask ----------
+def _thread_loop():
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop
+
+
+def async_to_sync(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # create_task copia o contexto atual: a view enxerga request/g normalmente
+        return _thread_loop().run_until_complete(func(*args, **kwargs))
+    return wrapper
+
+
+def init_app(app):
+    app.async_to_sync = async_to_sync
@@ -0,0 +1,281 @@
+# app/analytics.py
+"""
+Visualizações por cartão (leituras do GET /card, ex.: QR escaneado).
+
+Um UpdateItem ADD por leitura dobraria as escritas da rota mais quente.
+Em vez disso, cada worker soma em memória por (cartão, hora) e grava os
+totais de tempos em tempos (write-behind):
+
+  - record(card_id): só incrementa um dict (sem I/O no request)
+  - flush: a cada ANALYTICS_FLUSH_INTERVAL segundos (thread em segundo
+    plano), ou antes se houver ANALYTICS_FLUSH_KEYS pares pendentes, e na
+    saída do processo (atexit). Um contador atômico por par (cartão, hora):
+    o custo acompanha o número de cartões lidos por intervalo, não o tráfego
+  - falha no flush: as contagens voltam para o pendente e saem no próximo
+
+Backends (ANALYTICS_BACKEND):
+  - "dynamo": tabela CARD_STATS_TABLE (card_id + bucket "AAAA-MM-DDTHH", atributo views)
+  - "sqlite": arquivo local (ANALYTICS_PATH), compartilhado pelos workers
+  - "off":    não conta nada
+
+    GET /card/<card_id>/stats?days=30&granularity=day   (dono do cartão)
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from app import metrics
+from app.config import Config
+
+_BUCKET_FORMAT = "%Y-%m-%dT%H"
+
+
+def bucket_for(ts=None):
+    return datetime.fromtimestamp(time.time() if ts is None else ts, timezone.utc).strftime(_BUCKET_FORMAT)
+
+
+# ---------- Backends ----------
+class SQLiteStatsStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS card_views ("
+                " card_id TEXT NOT NULL, bucket TEXT NOT NULL, views INTEGER NOT NULL,"
+                " PRIMARY KEY (card_id, bucket))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def add(self, counts):
+        """counts: {(card_id, bucket): n}. Uma transação para o lote todo."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO card_views (card_id, bucket, views) VALUES (?, ?, ?)"
+                " ON CONFLICT(card_id, bucket) DO UPDATE SET views = views + excluded.views",
+                [(card_id, bucket, n) for (card_id, bucket), n in counts.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {}
+
+    def query(self, card_id, since_bucket):
+        rows = self._conn().execute(
+            "SELECT bucket, views FROM card_views WHERE card_id = ? AND bucket >= ? ORDER BY bucket",
+            (card_id, since_bucket),
+        )
+        return {bucket: views for bucket, views in rows}
+
+    def delete_card(self, card_id):
+        self._conn().execute("DELETE FROM card_views WHERE card_id = ?", (card_id,))
+
+
+class DynamoStatsStore:
+    def __init__(self, table, concurrency=8):
+        self.table = table
+        self.concurrency = concurrency
+        self._executor = None
+
+    def _add_one(self, card_id, bucket, n):
+        self.table.update_item(
+            Key={"card_id": card_id, "bucket": bucket},
+            UpdateExpression="ADD #views :n",
+            ExpressionAttributeNames={"#views": "views"},
+            ExpressionAttributeValues={":n": n},
+        )
+
+    def add(self, counts):
+        """Um ADD atômico por (cartão, hora), em paralelo. Retorna os pares que falharam."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="analytics")
+        futures = {key: self._executor.submit(self._add_one, key[0], key[1], n) for key, n in counts.items()}
+        failed = {}
+        for key, fut in futures.items():
+            try:
+                fut.result()
+            except Exception as e:
+                print("Erro ao gravar visualizações:", e)
+                failed[key] = counts[key]
+        return failed
+
+    def query(self, card_id, since_bucket):
+        from boto3.dynamodb.conditions import Key
+
+        out, kwargs = {}, {
+            "KeyConditionExpression": Key("card_id").eq(card_id) & Key("bucket").gte(since_bucket),
+        }
+        while True:
+            resp = self.table.query(**kwargs)
+            out.update((item["bucket"], int(item.get("views", 0))) for item in resp.get("Items", []))
+            if not resp.get("LastEvaluatedKey"):
+                return out
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    def delete_card(self, card_id):
+        keys = self.query(card_id, "")
+        with self.table.batch_writer() as batch:
+            for bucket in keys:
+                batch.delete_item(Key={"card_id": card_id, "bucket": bucket})
+
+
+def build_store():
+    kind = Config.ANALYTICS_BACKEND
+    if kind == "off":
+        return None
+    if kind == "dynamo":
+        from app import aws
+        return DynamoStatsStore(aws.card_stats_table)
+    return SQLiteStatsStore(Config.ANALYTICS_PATH)
+
+
+# ---------- Agregação em memória ----------
+class ViewCounter:
+    def __init__(self, store, flush_keys, flush_interval):
+        self.store = store
+        self.flush_keys = flush_keys
+        self.flush_interval = flush_interval
+        self._pending = {}  # (card_id, bucket) -> visualizações ainda não gravadas
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # um flush por vez por processo
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def record(self, card_id, ts=None):
+        key = (card_id, bucket_for(ts))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + 1
+            full = len(self._pending) >= self.flush_keys
+        self._ensure_thread()
+        if full:
+            self._wake.set()  # o flush sai na thread, não no request
+
+    def pending(self, card_id=None):
+        with self._lock:
+            if card_id is None:
+                return dict(self._pending)
+            return {bucket: n for (cid, bucket), n in self._pending.items() if cid == card_id}
+
+    def discard(self, card_id):
+        with self._lock:
+            for key in [k for k in self._pending if k[0] == card_id]:
+                del self._pending[key]
+
+    def flush(self):
+        """Grava o pendente. Retorna {"written": pares gravados, "failed": pares devolvidos}."""
+        with self._flush_lock:
+            with self._lock:
+                counts, self._pending = self._pending, {}
+            if not counts:
+                return {"written": 0, "failed": 0}
+            try:
+                failed = self.store.add(counts)
+            except Exception as e:
+                print("Erro ao gravar visualizações:", e)
+                failed = counts
+            if failed:
+                with self._lock:
+                    for key, n in failed.items():
+                        self._pending[key] = self._pending.get(key, 0) + n
+            metrics.VIEW_FLUSH.inc(len(counts) - len(failed), outcome="written")
+            metrics.VIEW_FLUSH.inc(len(failed), outcome="failed")
+            return {"written": len(counts) - len(failed), "failed": len(failed)}
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="view-flush", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Erro ao gravar visualizações:", e)
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+        self.flush()
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    """ViewCounter do processo, ou None com ANALYTICS_BACKEND=off."""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                store = build_store()
+                if store is None:
+                    return None
+                _counter = ViewCounter(store, Config.ANALYTICS_FLUSH_KEYS, Config.ANALYTICS_FLUSH_INTERVAL)
+                atexit.register(_counter.stop)  # gunicorn/uvicorn encerrando o worker: grava o que sobrou
+    return _counter
+
+
+def record_view(card_id):
+    counter = get_view_counter()
+    if counter is not None:
+        counter.record(card_id)
+
+
+# ---------- Leitura ----------
+def card_stats(card_id, days=30, granularity="hour"):
+    """
+    Visualizações do cartão nos últimos `days` dias: gravadas + pendentes
+    deste worker (os outros workers entram no próximo flush deles).
+    """
+    counter = get_view_counter()
+    if counter is None:
+        return {"card_id": card_id, "total": 0, "granularity": granularity, "buckets": []}
+    since = bucket_for(time.time() - days * 86400)
+    views = counter.store.query(card_id, since)
+    for bucket, n in counter.pending(card_id).items():
+        if bucket >= since:
+            views[bucket] = views.get(bucket, 0) + n
+    if granularity == "day":
+        daily = {}
+        for bucket, n in views.items():
+            daily[bucket[:10]] = daily.get(bucket[:10], 0) + n
+        views = daily
+    return {
+        "card_id": card_id,
+        "total": sum(views.values()),
+        "granularity": granularity,
+        "since": (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "buckets": [{"bucket": b, "views": views[b]} for b in sorted(views)],
+    }
+
+
+def forget_card(card_id):
+    """Apaga as estatísticas de um cartão excluído (e o pendente dele neste worker)."""
+    counter = get_view_counter()
+    if counter is None:
+        return
+    counter.discard(card_id)
+    counter.store.delete_card(card_id)
@@ -1,14 +1,146 @@
 # app/aws.py
-import boto3
+"""
+Registro único dos clients AWS.
+
+Nada é criado no import: a sessão boto3, os clients/resources e as tabelas
+nascem no primeiro uso e são reaproveitados pelo processo inteiro (todos
+com a mesma configuração de pool, keep-alive, retries e timeouts). Isso
+corta o cold start na Lambda (Zappa), já que importar o app não carrega
+mais boto3 nem os modelos de serviço.
+
+    from app import aws
+    aws.cards_table.get_item(...)      # tabela criada na 1ª vez
+    aws.get_client("s3")
+
+warm_up() cria tudo de uma vez (ex.: no boot do worker do gunicorn).
+Todo client sai com os hooks de tempo de app/metrics.py.
+"""
 import os
+import threading
+
 from app.config import Config
+from app.metrics import instrument_client
+
+_lock = threading.RLock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+# atributo do módulo -> nome da tabela (criadas sob demanda por __getattr__)
+_TABLES = {
+    "users_table": "GetiCardUsers",  # ou Testecard se for cartão
+    "cards_table": Config.CARDS_TABLE,
+    "card_owners_table": Config.CARD_OWNERS_TABLE,  # email -> card_id
+    "refresh_tokens_table": Config.REFRESH_TOKENS_TABLE,  # hash do token -> sessão (TTL em expires_at)
+    "blob_index_table": Config.BLOB_INDEX_TABLE,  # origens e contagens das imagens (app/content_index.py)
+    "card_stats_table": Config.CARD_STATS_TABLE,  # card_id + bucket -> views (app/analytics.py)
+}
+
+
+def boto_config(**overrides):
+    """Config do botocore compartilhada por todos os clients."""
+    from botocore.config import Config as BotoConfig
+
+    base = BotoConfig(
+        region_name=Config.AWS_REGION,
+        max_pool_connections=Config.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=Config.AWS_CONNECT_TIMEOUT,
+        read_timeout=Config.AWS_READ_TIMEOUT,
+        tcp_keepalive=True,
+        retries={"mode": "adaptive", "max_attempts": Config.AWS_MAX_ATTEMPTS},
+    )
+    return base.merge(BotoConfig(**overrides)) if overrides else base
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+
+            _session = boto3.session.Session(
+                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+                region_name=Config.AWS_REGION,
+            )
+    return _session
+
+
+def get_client(service, endpoint_url=None, region_name=None, **config_overrides):
+    key = (service, endpoint_url, region_name, tuple(sorted(config_overrides.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = get_session().client(
+                    service,
+                    endpoint_url=endpoint_url,
+                    region_name=region_name or Config.AWS_REGION,
+                    config=boto_config(**config_overrides),
+                )
+                instrument_client(client)
+                _clients[key] = client
+    return client
+
+
+def get_resource(service, endpoint_url=None):
+    key = (service, endpoint_url)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = get_session().resource(
+                    service,
+                    endpoint_url=endpoint_url,
+                    region_name=Config.AWS_REGION,
+                    config=boto_config(),
+                )
+                instrument_client(resource.meta.client)
+                _resources[key] = resource
+    return resource
+
+
+def get_table(name):
+    table = _tables.get(name)
+    if table is None:
+        with _lock:
+            table = _tables.get(name)
+            if table is None:
+                table = get_resource("dynamodb", endpoint_url=Config.DYNAMODB_ENDPOINT_URL).Table(name)
+                _tables[name] = table
+    return table
+
+
+def warm_up(ping=False):
+    """
+    Cria sessão, clients e tabelas antecipadamente. Com ping=True também
+    abre as conexões (um get_item barato), para o 1º request não pagar o TLS.
+    """
+    for attr, name in _TABLES.items():
+        table = get_table(name)
+        if ping:
+            try:
+                key = {"cards_table": {"card_id": "__warmup__"},
+                       "refresh_tokens_table": {"token_hash": "__warmup__"},
+                       "blob_index_table": {"id": "__warmup__"},
+                       "card_stats_table": {"card_id": "__warmup__", "bucket": "-"}}.get(attr, {"email": "__warmup__"})
+                table.get_item(Key=key)
+            except Exception as e:
+                print("Warm-up AWS falhou:", e)
+    if os.getenv("S3_BUCKET"):
+        from app import storage
+        storage.get_s3()
 
-dynamodb = boto3.resource(
-    'dynamodb',
-    region_name=Config.AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-)
 
-users_table = dynamodb.Table("GetiCardUsers")  # ou Testecard se for cartão
-cards_table = dynamodb.Table("Testecard")
+def __getattr__(name):
+    # compatibilidade: aws.dynamodb / aws.users_table / aws.cards_table ...
+    if name == "dynamodb":
+        return get_resource("dynamodb", endpoint_url=Config.DYNAMODB_ENDPOINT_URL)
+    if name in _TABLES:
+        table = get_table(_TABLES[name])
+        globals()[name] = table  # próximos acessos não passam mais por aqui
+        return table
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
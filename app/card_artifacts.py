@@ -0,0 +1,227 @@
+# app/card_artifacts.py
+"""
+Arquivos estáticos derivados de cada cartão, em cards/<card_id>/:
+
+  - card.vcf   vCard 3.0 (adicionar contato)
+  - qr.png     QR code apontando para PUBLIC_CARD_URL
+  - qr.svg     o mesmo QR em SVG
+  - index.html página mínima com as tags OpenGraph (preview de WhatsApp,
+               LinkedIn etc., que não executam o JS do frontend)
+
+As chaves são fixas, então as URLs vão no cartão (campo "artifacts") desde a
+criação e quem compartilha só busca arquivos estáticos. A geração roda numa
+thread em segundo plano e só acontece quando muda algum campo que aparece
+nos arquivos (ARTIFACT_FIELDS). Pedidos repetidos para o mesmo cartão
+enquanto um está na fila viram um só, com a versão mais nova.
+
+O QR usa o segno (opcional, importado só no uso); sem ele os QRs são pulados.
+"""
+import hashlib
+import html
+import importlib.util
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import storage
+from app.config import Config
+
+ARTIFACTS = {
+    "vcf": ("card.vcf", "text/vcard; charset=utf-8"),
+    "qr_png": ("qr.png", "image/png"),
+    "qr_svg": ("qr.svg", "image/svg+xml"),
+    "html": ("index.html", "text/html; charset=utf-8"),
+}
+# campos que entram em algum artefato: mudou outro campo, nada é regerado
+ARTIFACT_FIELDS = (
+    "nome", "empresa", "biografia", "whatsapp", "emailContato",
+    "instagram", "linkedin", "site", "foto_perfil",
+)
+_CACHE_CONTROL = "public, max-age=300"  # chave fixa, regravada quando o cartão muda
+
+_HAS_SEGNO = importlib.util.find_spec("segno") is not None
+
+
+def public_url(card_id):
+    return Config.PUBLIC_CARD_URL.format(card_id=card_id)
+
+
+def artifact_key(card_id, name):
+    return f"cards/{card_id}/{ARTIFACTS[name][0]}"
+
+
+def artifact_urls(card_id):
+    """URLs (fixas) dos artefatos; vão no cartão já na criação."""
+    names = [n for n in ARTIFACTS if _HAS_SEGNO or not n.startswith("qr_")]
+    return {name: storage.url_for_key(artifact_key(card_id, name)) for name in names}
+
+
+def fingerprint(card):
+    if not card:
+        return None
+    relevant = {f: card.get(f) for f in ARTIFACT_FIELDS}
+    relevant["_url"] = public_url(card.get("card_id"))
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def needs_regeneration(previous, card):
+    return fingerprint(previous) != fingerprint(card)
+
+
+# ---------- Geração ----------
+def _vcard_escape(value):
+    return (str(value).replace("\\", "\\\\").replace("\n", "\\n")
+            .replace(",", "\\,").replace(";", "\\;"))
+
+
+def _fold(line):
+    # RFC 6350: linhas de no máximo 75 octetos, continuação começa com espaço
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line
+    parts, current = [], b""
+    for ch in line:
+        b = ch.encode("utf-8")
+        if len(current) + len(b) > (75 if not parts else 74):
+            parts.append(current.decode("utf-8"))
+            current = b""
+        current += b
+    parts.append(current.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def _http(url):
+    return url if isinstance(url, str) and url.startswith(("http://", "https://")) else None
+
+
+def build_vcard(card):
+    nome = card.get("nome") or ""
+    lines = [
+        "BEGIN:VCARD",
+        "VERSION:3.0",
+        f"N:;{_vcard_escape(nome)};;;",
+        f"FN:{_vcard_escape(nome)}",
+    ]
+    if card.get("empresa"):
+        lines.append(f"ORG:{_vcard_escape(card['empresa'])}")
+    if card.get("whatsapp"):
+        lines.append(f"TEL;TYPE=CELL:{_vcard_escape(card['whatsapp'])}")
+    if card.get("emailContato"):
+        lines.append(f"EMAIL;TYPE=INTERNET:{_vcard_escape(card['emailContato'])}")
+    if card.get("site"):
+        lines.append(f"URL:{_vcard_escape(card['site'])}")
+    lines.append(f"URL;TYPE=geticard:{_vcard_escape(public_url(card['card_id']))}")
+    for rede in ("instagram", "linkedin"):
+        if card.get(rede):
+            lines.append(f"X-SOCIALPROFILE;TYPE={rede}:{_vcard_escape(card[rede])}")
+    if card.get("biografia"):
+        lines.append(f"NOTE:{_vcard_escape(card['biografia'])}")
+    if _http(card.get("foto_perfil")):
+        lines.append(f"PHOTO;VALUE=URI:{card['foto_perfil']}")
+    lines.append("END:VCARD")
+    return ("\r\n".join(_fold(l) for l in lines) + "\r\n").encode("utf-8")
+
+
+def build_qr(card):
+    """(png, svg) do QR com a URL pública do cartão."""
+    import segno
+
+    qr = segno.make(public_url(card["card_id"]), error="m")
+    png, svg = io.BytesIO(), io.BytesIO()
+    qr.save(png, kind="png", scale=10, border=2)
+    qr.save(svg, kind="svg", scale=10, border=2, xmldecl=False)
+    return png.getvalue(), svg.getvalue()
+
+
+def build_html(card, urls):
+    e = lambda v: html.escape(str(v or ""), quote=True)  # noqa: E731
+    nome = card.get("nome") or "Cartão"
+    descricao = " · ".join(v for v in (card.get("empresa"), card.get("biografia")) if v)[:200]
+    url = public_url(card["card_id"])
+    foto = _http(card.get("foto_perfil"))
+    meta = [
+        ("og:type", "profile"), ("og:title", nome), ("og:description", descricao),
+        ("og:url", url), ("og:image", foto), ("twitter:card", "summary"),
+    ]
+    tags = "\n".join(
+        f'  <meta property="{k}" content="{e(v)}">' for k, v in meta if v
+    )
+    links = [(card.get("site"), "Site"), (card.get("instagram"), "Instagram"), (card.get("linkedin"), "LinkedIn")]
+    items = "\n".join(f'    <li><a href="{e(h)}" rel="noopener">{t}</a></li>' for h, t in links if _http(h))
+    return f"""<!doctype html>
+<html lang="pt-BR">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1">
+  <title>{e(nome)}</title>
+  <meta name="description" content="{e(descricao)}">
+  <link rel="canonical" href="{e(url)}">
+{tags}
+</head>
+<body>
+  {f'<img src="{e(foto)}" alt="" width="128" height="128">' if foto else ""}
+  <h1>{e(nome)}</h1>
+  {f"<p>{e(card.get('empresa'))}</p>" if card.get("empresa") else ""}
+  {f"<p>{e(card.get('biografia'))}</p>" if card.get("biografia") else ""}
+  <ul>
+{items}
+    <li><a href="{e(urls.get('vcf'))}">Adicionar contato</a></li>
+  </ul>
+  <p><a href="{e(url)}">Abrir cartão</a></p>
+</body>
+</html>
+""".encode("utf-8")
+
+
+def generate(card):
+    """Gera e grava todos os artefatos do cartão. Retorna {nome: url}."""
+    card_id = card["card_id"]
+    urls = artifact_urls(card_id)
+    files = {"vcf": build_vcard(card), "html": build_html(card, urls)}
+    if _HAS_SEGNO:
+        files["qr_png"], files["qr_svg"] = build_qr(card)
+    for name, body in files.items():
+        storage.put_bytes_at(artifact_key(card_id, name), body, ARTIFACTS[name][1], _CACHE_CONTROL)
+    return urls
+
+
+# ---------- Segundo plano ----------
+_executor = None
+_pending = {}  # card_id -> cartão mais recente ainda não gerado
+_lock = threading.Lock()
+
+
+def _run(card_id):
+    with _lock:
+        card = _pending.pop(card_id, None)
+    if card is None:
+        return
+    try:
+        generate(card)
+    except Exception as e:
+        print(f"Erro ao gerar artefatos do cartão {card_id}:", e)
+
+
+def schedule(card):
+    """Agenda a geração (ARTIFACTS_ASYNC=0 gera na hora, ex.: Lambda)."""
+    if not Config.ARTIFACTS_ENABLED or not card or not card.get("card_id"):
+        return
+    if not Config.ARTIFACTS_ASYNC:
+        _pending[card["card_id"]] = dict(card)
+        _run(card["card_id"])
+        return
+    global _executor
+    with _lock:
+        already_queued = card["card_id"] in _pending
+        _pending[card["card_id"]] = dict(card)
+        if already_queued:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.ARTIFACTS_WORKERS, thread_name_prefix="artifacts")
+    _executor.submit(_run, card["card_id"])
+
+
+def schedule_if_changed(previous, card):
+    if needs_regeneration(previous, card):
+        schedule(card)
@@ -0,0 +1,198 @@
+# app/card_cache.py
+"""
+Cache de leitura (read-through) dos cartões públicos (GET /card/<card_id>).
+
+Guarda o payload já normalizado (URLs absolutas) para evitar o get_item no
+DynamoDB a cada leitura de QR code. Entradas expiram por TTL, o tamanho é
+limitado (LRU) e 404 também ficam em cache por pouco tempo.
+
+Backends:
+  - "memory": OrderedDict por processo (padrão)
+  - "sqlite": arquivo local compartilhado entre os workers do gunicorn
+  - "off":    desliga o cache
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import Config
+from app.json_provider import json_default
+
+_MISSING = {"__missing__": True}  # marcador de 404 em cache
+
+
+# ---------- Backends ----------
+class MemoryCacheBackend:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Grava a entrada e devolve quantas foram descartadas (LRU)."""
+        evicted = 0
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """Cache compartilhado entre processos na mesma máquina (arquivo SQLite em WAL)."""
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS card_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS card_cache_accessed ON card_cache(accessed)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT value, expires FROM card_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            self.delete(key)
+            return None
+        self._conn().execute("UPDATE card_cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO card_cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, default=json_default, ensure_ascii=False), now + ttl, now),
+        )
+        # remove expirados e o excedente menos usado
+        conn.execute("DELETE FROM card_cache WHERE expires < ?", (now,))
+        cur = conn.execute(
+            "DELETE FROM card_cache WHERE key IN ("
+            " SELECT key FROM card_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+        return max(cur.rowcount, 0)
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM card_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM card_cache")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM card_cache").fetchone()[0]
+
+
+# ---------- Cache ----------
+class CardCache:
+    def __init__(self, backend, ttl=60, negative_ttl=5):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "negative_hits": 0, "evictions": 0, "invalidations": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get(self, card_id, base=""):
+        """
+        Retorna (hit, card, etag). Em hit, card pode ser None (404 em cache).
+        `base` é o host usado na normalização das URLs legadas.
+        """
+        if self.backend is None:
+            return False, None, None
+        entry = self.backend.get(card_id)
+        if entry is None or entry.get("base") != base:
+            self._count("misses")
+            return False, None, None
+        if entry.get("card") == _MISSING:
+            self._count("negative_hits")
+            return True, None, None
+        self._count("hits")
+        return True, entry["card"], entry.get("etag")
+
+    def set(self, card_id, card, base="", etag=None):
+        if self.backend is None:
+            return
+        ttl = self.ttl if card is not None else self.negative_ttl
+        entry = {"base": base, "card": card if card is not None else _MISSING, "etag": etag}
+        evicted = self.backend.set(card_id, entry, ttl)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def invalidate(self, card_id):
+        if self.backend is None:
+            return
+        self.backend.delete(card_id)
+        self._count("invalidations")
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+        lookups = data["hits"] + data["negative_hits"] + data["misses"]
+        data["hit_ratio"] = round((data["hits"] + data["negative_hits"]) / lookups, 4) if lookups else 0.0
+        data["size"] = len(self.backend) if self.backend is not None else 0
+        data["backend"] = type(self.backend).__name__ if self.backend is not None else "off"
+        return data
+
+
+def build_card_cache():
+    kind = Config.CARD_CACHE_BACKEND
+    if kind == "off":
+        backend = None
+    elif kind == "sqlite":
+        backend = SQLiteCacheBackend(Config.CARD_CACHE_PATH, Config.CARD_CACHE_SIZE)
+    else:
+        backend = MemoryCacheBackend(Config.CARD_CACHE_SIZE)
+    return CardCache(backend, ttl=Config.CARD_CACHE_TTL, negative_ttl=Config.CARD_CACHE_NEGATIVE_TTL)
+
+
+card_cache = build_card_cache()
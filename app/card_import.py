@@ -0,0 +1,98 @@
+# app/card_import.py
+"""
+Importação em lote de cartões (onboarding de empresas).
+
+Valida cada linha com app.models.Card, elimina emails repetidos numa única
+passada (dentro do lote e contra o índice de donos, com BatchGetItem) e
+grava os novos com BatchWriteItem. Cada linha recebe seu próprio resultado.
+"""
+import csv
+import json
+import uuid
+
+from pydantic import ValidationError
+
+from app import card_artifacts, search
+from app.card_cache import card_cache
+from app.card_repository import get_card_repository
+from app.cleanup import retain_card_images
+from app.models import Card
+
+
+def import_cards(rows, repository=None):
+    """
+    rows: lista de dicts. Retorna {"results": [...], "created": n, "duplicates": n, "invalid": n},
+    com um resultado por linha: {"row", "status": created|duplicate|invalid, "card_id"?, "errors"?}.
+    """
+    repository = repository or get_card_repository()
+    results = [None] * len(rows)
+    valid = []  # (índice, card_dict)
+    seen = {}
+
+    for i, row in enumerate(rows):
+        try:
+            card = Card(**(row or {})).dict()
+        except ValidationError as e:
+            results[i] = {"row": i, "status": "invalid", "errors": e.errors(include_url=False)}
+            continue
+        except TypeError:
+            results[i] = {"row": i, "status": "invalid", "errors": [{"msg": "Linha deve ser um objeto"}]}
+            continue
+        email = card["emailContato"]
+        if email in seen:
+            results[i] = {"row": i, "status": "duplicate", "duplicate_of_row": seen[email]}
+            continue
+        seen[email] = i
+        valid.append((i, card))
+
+    existing = repository.find_owners([card["emailContato"] for _, card in valid])
+    new_cards = []
+    for i, card in valid:
+        email = card["emailContato"]
+        if email in existing:
+            results[i] = {"row": i, "status": "duplicate", "card_id": existing[email]}
+            continue
+        card["card_id"] = f"card-{uuid.uuid4().hex[:8]}"
+        card["artifacts"] = card_artifacts.artifact_urls(card["card_id"])
+        new_cards.append((i, card))
+
+    if new_cards:
+        repository.create_cards([card for _, card in new_cards])
+    for i, card in new_cards:
+        card_cache.invalidate(card["card_id"])
+        # cartões já gravados: falha daqui em diante só é registrada
+        try:
+            retain_card_images(card)
+        except Exception as e:
+            print("Erro ao registrar referências das imagens:", e)
+        try:
+            card_artifacts.schedule(card)
+        except Exception as e:
+            print("Erro ao agendar artefatos do cartão:", e)
+        results[i] = {"row": i, "status": "created", "card_id": card["card_id"]}
+    if new_cards:
+        try:
+            search.index_cards([card for _, card in new_cards])
+        except Exception as e:
+            print("Erro ao atualizar índice de busca:", e)
+
+    summary = {status: sum(1 for r in results if r["status"] == status) for status in ("created", "duplicate", "invalid")}
+    return {"results": results, **summary}
+
+
+def read_rows(path):
+    """Lê linhas de um .json (lista de objetos) ou .csv (cabeçalho = campos; galeria separada por '|')."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = []
+            for row in csv.DictReader(f):
+                row = {k: v for k, v in row.items() if v not in (None, "")}
+                if "galeria" in row:
+                    row["galeria"] = [u for u in row["galeria"].split("|") if u]
+                rows.append(row)
+            return rows
+    with open(path, encoding="utf-8") as f:
+        rows = json.load(f)
+    if isinstance(rows, dict):
+        rows = list(rows.values())  # formato do cards.json
+    return rows
@@ -0,0 +1,689 @@
+# app/card_repository.py
+"""
+Camada de acesso aos cartões.
+
+Toda leitura/escrita de cartão passa por aqui para que o índice
+dono (emailContato) -> card_id fique sempre sincronizado. Assim o login
+e a criação de cartão fazem leituras pontuais (get_item) em vez de
+varrer a tabela inteira com scan.
+
+Backends:
+  - DynamoCardRepository: tabelas Testecard + GetiCardOwners
+  - InMemoryCardRepository: dicionários em memória (testes/local)
+"""
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from app.config import Config
+
+
+class OwnerConflictError(Exception):
+    """Já existe outro cartão para o email informado."""
+
+    def __init__(self, email, card_id):
+        super().__init__(f"Já existe um cartão para {email}: {card_id}")
+        self.email = email
+        self.card_id = card_id
+
+
+class VersionConflictError(Exception):
+    """O cartão mudou desde a versão que o cliente leu (If-Match)."""
+
+
+class CardNotFoundError(Exception):
+    """O cartão não existe."""
+
+
+class CardAccessDeniedError(Exception):
+    """Quem pediu a alteração não é o dono (emailContato) do cartão."""
+
+
+class GalleryOpError(ValueError):
+    """Operação de galeria mal formada."""
+
+
+class GalleryConflictError(Exception):
+    """A galeria mudou e o índice/URL informado não confere mais."""
+
+
+def _stamp(card):
+    """Incrementa a versão do cartão e grava updated_at (UTC, ISO 8601)."""
+    card["version"] = int(card.get("version") or 0) + 1
+    card["updated_at"] = _now()
+    return card
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# ---------- Galeria ----------
+# galeria (URLs) e galeria_variants ({"thumb": url, ...} por imagem) andam
+# alinhadas por índice; toda operação mexe nas duas listas juntas.
+GALLERY_OPS = ("append", "replace", "remove", "reorder")
+
+
+def normalize_gallery_op(op):
+    """
+    Valida uma operação de galeria e devolve a forma canônica:
+      {"op": "append"|"replace", "urls": [...], "variants": [...]}
+      {"op": "remove", "indexes": [...], "urls": [...] | None}   (urls: guarda opcional)
+      {"op": "reorder", "order": [...]}                         (permutação dos índices)
+    Itens de append/replace podem ser URLs ou {"url", "variants"}; URLs
+    repetidas na lista entram uma vez só (e o append pula as que a galeria já tem).
+    """
+    if not isinstance(op, dict) or op.get("op") not in GALLERY_OPS:
+        raise GalleryOpError(f"op deve ser um de: {', '.join(GALLERY_OPS)}")
+    kind = op["op"]
+
+    if kind in ("append", "replace"):
+        items = op.get("items")
+        if not isinstance(items, list) or (kind == "append" and not items):
+            raise GalleryOpError("items deve ser uma lista de imagens")
+        urls, variants = [], []
+        for item in items:
+            if isinstance(item, str):
+                item = {"url": item}
+            if not isinstance(item, dict) or not isinstance(item.get("url"), str) or not item["url"]:
+                raise GalleryOpError("Cada item deve ser uma URL ou {\"url\", \"variants\"}")
+            if item["url"] in urls:
+                continue
+            urls.append(item["url"])
+            variants.append(item.get("variants") or {})
+        return {"op": kind, "urls": urls, "variants": variants}
+
+    if kind == "remove":
+        indexes = op.get("indexes", [op["index"]] if "index" in op else None)
+        if (not isinstance(indexes, list) or not indexes
+                or not all(isinstance(i, int) and not isinstance(i, bool) and i >= 0 for i in indexes)
+                or len(set(indexes)) != len(indexes)):
+            raise GalleryOpError("indexes deve ser uma lista de índices distintos")
+        urls = op.get("urls", [op["url"]] if "url" in op else None)
+        if urls is not None and (not isinstance(urls, list) or len(urls) != len(indexes)):
+            raise GalleryOpError("urls deve ter um item por índice")
+        return {"op": kind, "indexes": indexes, "urls": urls}
+
+    order = op.get("order")
+    if (not isinstance(order, list)
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in order)
+            or sorted(order) != list(range(len(order)))):
+        raise GalleryOpError("order deve ser uma permutação dos índices da galeria")
+    return {"op": kind, "order": order}
+
+
+def _aligned_variants(card):
+    """galeria_variants com o mesmo tamanho da galeria (legados ganham {})."""
+    n = len(card.get("galeria") or [])
+    variants = list(card.get("galeria_variants") or [])[:n]
+    return variants + [{}] * (n - len(variants))
+
+
+def _gallery_misaligned(card):
+    return "galeria" in card and len(card.get("galeria_variants") or []) != len(card.get("galeria") or [])
+
+
+def _without_present(card, op):
+    """O append sem as URLs que a galeria do cartão já tem (None se não sobrar nenhuma)."""
+    present = set(card.get("galeria") or [])
+    keep = [i for i, url in enumerate(op["urls"]) if url not in present]
+    if not keep:
+        return None
+    return {"op": "append", "urls": [op["urls"][i] for i in keep], "variants": [op["variants"][i] for i in keep]}
+
+
+def _apply_gallery_op(card, op):
+    """Aplica uma operação normalizada no dicionário do cartão (backend em memória)."""
+    urls, variants = list(card.get("galeria") or []), _aligned_variants(card)
+    kind = op["op"]
+    if kind == "append":
+        op = _without_present(card, op) or {"urls": [], "variants": []}
+        urls, variants = urls + op["urls"], variants + op["variants"]
+    elif kind == "replace":
+        urls, variants = list(op["urls"]), list(op["variants"])
+    elif kind == "remove":
+        for pos, i in enumerate(op["indexes"]):
+            if i >= len(urls) or (op["urls"] and urls[i] != op["urls"][pos]):
+                raise GalleryConflictError(card["card_id"])
+        for i in sorted(op["indexes"], reverse=True):
+            del urls[i], variants[i]
+    else:
+        if len(op["order"]) != len(urls):
+            raise GalleryConflictError(card["card_id"])
+        urls, variants = [urls[i] for i in op["order"]], [variants[i] for i in op["order"]]
+    card["galeria"], card["galeria_variants"] = urls, variants
+
+
+def _apply_update(card, fields, remove, gallery, now):
+    """O mesmo que o UpdateExpression faz, aplicado num dicionário (cartão antes -> depois)."""
+    card = dict(card)
+    card.update(fields)
+    for attr in remove:
+        card.pop(attr, None)
+    if gallery:
+        _apply_gallery_op(card, gallery)
+    card["version"] = int(card.get("version") or 0) + 1
+    card["updated_at"] = now
+    return card
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _update_failure(card, owner_email, expected_version):
+    """Traduz a condição que falhou (cartão antes da escrita) na exceção certa."""
+    if not card:
+        return CardNotFoundError(owner_email)
+    if card.get("emailContato") != owner_email:
+        return CardAccessDeniedError(card["card_id"])
+    if expected_version is not None and int(card.get("version") or 0) != int(expected_version):
+        return VersionConflictError(card["card_id"])
+    return GalleryConflictError(card["card_id"])
+
+
+def _check_update_args(fields, remove, gallery):
+    touched = set(fields) | set(remove)
+    if touched & {"card_id", "version", "updated_at"}:
+        raise GalleryOpError("card_id, version e updated_at não podem ser alterados")
+    if gallery and touched & {"galeria", "galeria_variants"}:
+        raise GalleryOpError("Use a operação de galeria ou os campos galeria, não os dois")
+
+
+# ---------- DynamoDB ----------
+class DynamoCardRepository:
+    BATCH_GET_SIZE = 100      # limite do BatchGetItem
+    BATCH_MAX_ATTEMPTS = 6
+
+    def __init__(self, cards_table, owners_table, resource=None):
+        self.cards_table = cards_table
+        self.owners_table = owners_table
+        self.resource = resource
+
+    def _batch_get(self, table, key_name, keys, projection=None):
+        """
+        BatchGetItem em blocos de 100, repetindo UnprocessedKeys com backoff.
+        Retorna (itens, chaves que continuaram sem resposta).
+        """
+        items, leftover = [], []
+        for chunk in _chunks(list(dict.fromkeys(k for k in keys if k)), self.BATCH_GET_SIZE):
+            request = {"Keys": [{key_name: k} for k in chunk]}
+            if projection:
+                request["ProjectionExpression"] = projection
+            pending = {table.name: request}
+            attempt = 0
+            while pending:
+                resp = self.resource.batch_get_item(RequestItems=pending)
+                items.extend(resp.get("Responses", {}).get(table.name, []))
+                pending = resp.get("UnprocessedKeys") or {}
+                if not pending:
+                    break
+                attempt += 1
+                if attempt >= self.BATCH_MAX_ATTEMPTS:
+                    leftover.extend(k[key_name] for k in pending[table.name]["Keys"])
+                    break
+                time.sleep(min(0.05 * (2 ** attempt), 2))
+        return items, leftover
+
+    def get_cards(self, card_ids):
+        """{card_id: cartão} dos que existem + lista dos que ficaram sem resposta (throttling)."""
+        items, leftover = self._batch_get(self.cards_table, "card_id", card_ids)
+        return {item["card_id"]: item for item in items}, leftover
+
+    def find_owners(self, emails):
+        """{email: card_id} para os emails que já têm cartão."""
+        items, leftover = self._batch_get(self.owners_table, "email", emails)
+        if leftover:
+            raise RuntimeError(f"DynamoDB não respondeu para {len(leftover)} emails")
+        return {item["email"]: item["card_id"] for item in items}
+
+    def create_cards(self, cards):
+        """
+        Grava vários cartões novos com BatchWriteItem (o batch_writer reenvia os
+        não processados). Sem condição: quem chama já deduplicou pelos emails.
+        """
+        for card in cards:
+            card["version"] = 0
+            _stamp(card)
+        with self.cards_table.batch_writer() as batch:
+            for card in cards:
+                batch.put_item(Item=card)
+        with self.owners_table.batch_writer(overwrite_by_pkeys=["email"]) as batch:
+            for card in cards:
+                if card.get("emailContato"):
+                    batch.put_item(Item={"email": card["emailContato"], "card_id": card["card_id"]})
+        return cards
+
+    def get_card(self, card_id):
+        if not card_id:
+            return None
+        return self.cards_table.get_item(Key={"card_id": card_id}).get("Item")
+
+    def find_card_by_owner(self, email):
+        """Retorna o cartão do dono (emailContato) ou None, sem scan."""
+        if not email:
+            return None
+        owner = self.owners_table.get_item(Key={"email": email}).get("Item")
+        if not owner:
+            return None
+        card = self.get_card(owner.get("card_id"))
+        # índice pode ter ficado para trás se uma escrita falhou no meio
+        if not card or card.get("emailContato") != email:
+            return None
+        return card
+
+    def owns_card(self, email, card_id):
+        """True se o índice de donos diz que `email` é dono de `card_id` (uma leitura pequena)."""
+        if not email or not card_id:
+            return False
+        owner = self.owners_table.get_item(Key={"email": email}, ProjectionExpression="card_id").get("Item")
+        return bool(owner) and owner.get("card_id") == card_id
+
+    def _claim_owner(self, email, card_id):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.owners_table.put_item(
+                Item={"email": email, "card_id": card_id},
+                ConditionExpression="attribute_not_exists(email) OR card_id = :cid",
+                ExpressionAttributeValues={":cid": card_id},
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            existing = self.find_card_by_owner(email)
+            if existing:
+                raise OwnerConflictError(email, existing["card_id"])
+            # índice órfão (cartão já não existe): assume a posse
+            self.owners_table.put_item(Item={"email": email, "card_id": card_id})
+
+    def _release_owner(self, email, card_id):
+        from botocore.exceptions import ClientError
+
+        if not email:
+            return
+        try:
+            self.owners_table.delete_item(
+                Key={"email": email},
+                ConditionExpression="card_id = :cid",
+                ExpressionAttributeValues={":cid": card_id},
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+
+    def create_card(self, card):
+        """Grava um cartão novo. Levanta OwnerConflictError se o email já tem cartão."""
+        email = card.get("emailContato")
+        if email:
+            self._claim_owner(email, card["card_id"])
+        card["version"] = 0
+        self.cards_table.put_item(Item=_stamp(card))
+        return card
+
+    def save_card(self, card, previous_email=None, expected_version=None):
+        """
+        Regrava um cartão existente, movendo o índice se o emailContato mudou.
+        Com expected_version, a escrita só acontece se a versão gravada ainda
+        for essa (senão VersionConflictError).
+        """
+        from botocore.exceptions import ClientError
+
+        email = card.get("emailContato")
+        if email and email != previous_email:
+            self._claim_owner(email, card["card_id"])
+        kwargs = {}
+        if expected_version is not None:
+            if int(expected_version) == 0:
+                kwargs["ConditionExpression"] = "attribute_not_exists(version)"
+            else:
+                kwargs["ConditionExpression"] = "version = :v"
+                kwargs["ExpressionAttributeValues"] = {":v": int(expected_version)}
+        try:
+            self.cards_table.put_item(Item=_stamp(card), **kwargs)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+                raise VersionConflictError(card["card_id"])
+            raise
+        if previous_email and previous_email != email:
+            self._release_owner(previous_email, card["card_id"])
+        return card
+
+    def update_card(self, card_id, owner_email, fields=None, remove=(), gallery=None, expected_version=None):
+        """
+        Atualização parcial numa ida só ao DynamoDB: um UpdateExpression só com
+        os campos enviados, sem ler o cartão antes. A posse é garantida pela
+        condição emailContato = dono; gallery é uma operação de
+        normalize_gallery_op (append usa list_append, então anexos simultâneos
+        não se perdem). Retorna (cartão depois, cartão antes): o DynamoDB
+        devolve o item anterior (ALL_OLD) e o novo sai dele aplicando a mesma
+        alteração, então quem chama sabe quais imagens deixaram de ser usadas.
+
+        Erros: CardNotFoundError, CardAccessDeniedError, VersionConflictError,
+        GalleryConflictError, OwnerConflictError (novo email já tem cartão).
+        """
+        fields, remove = dict(fields or {}), list(remove or ())
+        gallery = normalize_gallery_op(gallery) if gallery else None
+        _check_update_args(fields, remove, gallery)
+
+        new_email = fields.get("emailContato")
+        moving = bool(new_email) and new_email != owner_email
+        if moving:
+            self._claim_owner(new_email, card_id)
+        try:
+            card, previous = self._conditional_update(card_id, owner_email, fields, remove, gallery, expected_version)
+        except Exception:
+            if moving:
+                self._release_owner(new_email, card_id)
+            raise
+        if moving:
+            self._release_owner(owner_email, card_id)
+        return card, previous
+
+    def _conditional_update(self, card_id, owner_email, fields, remove, gallery, expected_version):
+        from botocore.exceptions import ClientError
+
+        now = _now()
+        for _ in range(3):
+            kwargs = self._update_request(card_id, owner_email, fields, remove, gallery, expected_version, now)
+            try:
+                old = self.cards_table.update_item(**kwargs)["Attributes"]
+                return _apply_update(old, fields, remove, gallery, now), old
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                old = _deserialize(e.response.get("Item"))
+            error = _update_failure(old, owner_email, expected_version)
+            if not (isinstance(error, GalleryConflictError) and gallery):
+                raise error
+            if gallery["op"] == "append" and _without_present(old, gallery) != gallery:
+                # imagem que a galeria já tem: sai do anexo e a escrita é refeita
+                gallery = _without_present(old, gallery)
+                continue
+            if not _gallery_misaligned(old):
+                raise error
+            # cartão legado sem galeria_variants alinhada: corrige uma vez e repete
+            self._realign_gallery(old, owner_email)
+        raise error
+
+    def _update_request(self, card_id, owner_email, fields, remove, gallery, expected_version, now):
+        names = {"#owner": "emailContato", "#ver": "version", "#upd": "updated_at"}
+        values = {":owner": owner_email, ":zero": 0, ":one": 1, ":now": now}
+        sets = ["#ver = if_not_exists(#ver, :zero) + :one", "#upd = :now"]
+        removes, conditions = [], ["attribute_exists(card_id)", "#owner = :owner"]
+
+        for i, (attr, value) in enumerate(fields.items()):
+            names[f"#f{i}"] = attr
+            values[f":f{i}"] = value
+            sets.append(f"#f{i} = :f{i}")
+        for i, attr in enumerate(remove):
+            names[f"#r{i}"] = attr
+            removes.append(f"#r{i}")
+        if expected_version is not None:
+            values[":ev"] = int(expected_version)
+            conditions.append("(attribute_not_exists(#ver) OR #ver = :ev)" if int(expected_version) == 0 else "#ver = :ev")
+        if gallery:
+            self._gallery_expression(gallery, names, values, sets, removes, conditions)
+
+        expression = "SET " + ", ".join(sets)
+        if removes:
+            expression += " REMOVE " + ", ".join(removes)
+        return {
+            "Key": {"card_id": card_id},
+            "UpdateExpression": expression,
+            "ConditionExpression": " AND ".join(conditions),
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+            "ReturnValues": "ALL_OLD",
+            # na falha o DynamoDB devolve o item atual: dá para saber qual condição falhou sem outra leitura
+            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+        }
+
+    @staticmethod
+    def _gallery_expression(op, names, values, sets, removes, conditions):
+        names.update({"#g": "galeria", "#gv": "galeria_variants"})
+        kind = op["op"]
+        if kind == "replace":
+            values.update({":gurls": op["urls"], ":gvars": op["variants"]})
+            sets += ["#g = :gurls", "#gv = :gvars"]
+            return
+        # as duas listas precisam estar alinhadas para mexer por índice / anexar
+        conditions.append("(attribute_not_exists(#g) OR size(#gv) = size(#g))")
+        if kind == "append":
+            values.update({":gurls": op["urls"], ":gvars": op["variants"], ":empty": []})
+            # sem repetir imagem: se alguma já está na galeria a condição falha e o anexo é refeito sem ela
+            for pos, url in enumerate(op["urls"]):
+                values[f":ga{pos}"] = url
+                conditions.append(f"(attribute_not_exists(#g) OR NOT contains(#g, :ga{pos}))")
+            sets += [
+                "#g = list_append(if_not_exists(#g, :empty), :gurls)",
+                "#gv = list_append(if_not_exists(#gv, :empty), :gvars)",
+            ]
+        elif kind == "remove":
+            values[":gmax"] = max(op["indexes"])
+            conditions.append("size(#g) > :gmax")
+            for pos, i in enumerate(op["indexes"]):
+                if op["urls"]:
+                    values[f":gu{pos}"] = op["urls"][pos]
+                    conditions.append(f"#g[{i}] = :gu{pos}")
+                removes += [f"#g[{i}]", f"#gv[{i}]"]
+        else:
+            values[":glen"] = len(op["order"])
+            conditions.append("size(#g) = :glen")
+            # os operandos enxergam o item antes da escrita, então isto permuta
+            for i, j in enumerate(op["order"]):
+                if i != j:
+                    sets += [f"#g[{i}] = #g[{j}]", f"#gv[{i}] = #gv[{j}]"]
+
+    def _realign_gallery(self, card, owner_email):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.cards_table.update_item(
+                Key={"card_id": card["card_id"]},
+                UpdateExpression="SET #gv = :gvars",
+                ConditionExpression="#owner = :owner AND size(#g) = :glen",
+                ExpressionAttributeNames={"#g": "galeria", "#gv": "galeria_variants", "#owner": "emailContato"},
+                ExpressionAttributeValues={
+                    ":gvars": _aligned_variants(card), ":owner": owner_email, ":glen": len(card.get("galeria") or []),
+                },
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+
+    def delete_card(self, card):
+        self.cards_table.delete_item(Key={"card_id": card["card_id"]})
+        self._release_owner(card.get("emailContato"), card["card_id"])
+
+    def scan_page(self, segment=0, total_segments=1, start_key=None, limit=500, fields=None):
+        """Uma página de um scan segmentado. Retorna (itens, LastEvaluatedKey | None)."""
+        kwargs = {"Segment": segment, "TotalSegments": total_segments, "Limit": limit}
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        if fields:
+            names = {f"#f{i}": f for i, f in enumerate(fields)}
+            kwargs["ProjectionExpression"] = ", ".join(names)
+            kwargs["ExpressionAttributeNames"] = names
+        resp = self.cards_table.scan(**kwargs)
+        return resp.get("Items", []), resp.get("LastEvaluatedKey")
+
+    def backfill_owner_index(self):
+        """
+        Reconstrói o índice dono -> card_id a partir da tabela de cartões
+        (scan paginado, só com as chaves). Retorna um resumo com conflitos.
+        """
+        indexed, conflicts = {}, []
+        kwargs = {
+            "ProjectionExpression": "card_id, emailContato",
+        }
+        while True:
+            resp = self.cards_table.scan(**kwargs)
+            for item in resp.get("Items", []):
+                email = item.get("emailContato")
+                if not email:
+                    continue
+                if email in indexed:
+                    conflicts.append({"email": email, "card_id": item["card_id"], "kept": indexed[email]})
+                    continue
+                indexed[email] = item["card_id"]
+            if "LastEvaluatedKey" not in resp:
+                break
+            kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+        with self.owners_table.batch_writer(overwrite_by_pkeys=["email"]) as batch:
+            for email, card_id in indexed.items():
+                batch.put_item(Item={"email": email, "card_id": card_id})
+        return {"indexed": len(indexed), "conflicts": conflicts}
+
+
+# ---------- Memória (testes) ----------
+class InMemoryCardRepository:
+    def __init__(self, cards=None):
+        self._lock = threading.Lock()
+        self.cards = {}
+        self.owners = {}
+        for card in (cards or []):
+            self.cards[card["card_id"]] = dict(card)
+
+    def get_card(self, card_id):
+        card = self.cards.get(card_id) if card_id else None
+        return dict(card) if card else None
+
+    def find_card_by_owner(self, email):
+        card = self.get_card(self.owners.get(email))
+        if not card or card.get("emailContato") != email:
+            return None
+        return card
+
+    def get_cards(self, card_ids):
+        return {cid: self.get_card(cid) for cid in card_ids if cid in self.cards}, []
+
+    def owns_card(self, email, card_id):
+        return bool(email and card_id) and self.owners.get(email) == card_id and card_id in self.cards
+
+    def find_owners(self, emails):
+        return {e: self.owners[e] for e in emails if e in self.owners}
+
+    def create_cards(self, cards):
+        with self._lock:
+            for card in cards:
+                card["version"] = 0
+                self.cards[card["card_id"]] = dict(_stamp(card))
+                if card.get("emailContato"):
+                    self.owners[card["emailContato"]] = card["card_id"]
+        return cards
+
+    def _claim_owner(self, email, card_id):
+        current = self.owners.get(email)
+        if current and current != card_id and current in self.cards:
+            raise OwnerConflictError(email, current)
+        self.owners[email] = card_id
+
+    def create_card(self, card):
+        with self._lock:
+            if card.get("emailContato"):
+                self._claim_owner(card["emailContato"], card["card_id"])
+            card["version"] = 0
+            self.cards[card["card_id"]] = dict(_stamp(card))
+        return card
+
+    def save_card(self, card, previous_email=None, expected_version=None):
+        with self._lock:
+            if expected_version is not None:
+                current = self.cards.get(card["card_id"]) or {}
+                if int(current.get("version") or 0) != int(expected_version):
+                    raise VersionConflictError(card["card_id"])
+            email = card.get("emailContato")
+            if email and email != previous_email:
+                self._claim_owner(email, card["card_id"])
+            self.cards[card["card_id"]] = dict(_stamp(card))
+            if previous_email and previous_email != email and self.owners.get(previous_email) == card["card_id"]:
+                del self.owners[previous_email]
+        return card
+
+    def update_card(self, card_id, owner_email, fields=None, remove=(), gallery=None, expected_version=None):
+        fields, remove = dict(fields or {}), list(remove or ())
+        gallery = normalize_gallery_op(gallery) if gallery else None
+        _check_update_args(fields, remove, gallery)
+        with self._lock:
+            current = self.cards.get(card_id)
+            error = _update_failure(current, owner_email, expected_version)
+            if not isinstance(error, GalleryConflictError):
+                raise error
+            new_email = fields.get("emailContato")
+            if new_email and new_email != owner_email:
+                self._claim_owner(new_email, card_id)
+            card = _apply_update(current, fields, remove, gallery, _now())
+            self.cards[card_id] = dict(card)
+            if new_email and new_email != owner_email and self.owners.get(owner_email) == card_id:
+                del self.owners[owner_email]
+        return card, dict(current)
+
+    def delete_card(self, card):
+        with self._lock:
+            self.cards.pop(card["card_id"], None)
+            email = card.get("emailContato")
+            if email and self.owners.get(email) == card["card_id"]:
+                del self.owners[email]
+
+    def scan_page(self, segment=0, total_segments=1, start_key=None, limit=500, fields=None):
+        ids = sorted(cid for cid in self.cards if zlib.crc32(cid.encode()) % total_segments == segment)
+        if start_key:
+            ids = [cid for cid in ids if cid > start_key["card_id"]]
+        page = ids[:limit]
+        items = [self.get_card(cid) for cid in page]
+        if fields:
+            items = [{k: v for k, v in item.items() if k in fields} for item in items]
+        last_key = {"card_id": page[-1]} if len(ids) > limit else None
+        return items, last_key
+
+    def backfill_owner_index(self):
+        indexed, conflicts = {}, []
+        for card in self.cards.values():
+            email = card.get("emailContato")
+            if not email:
+                continue
+            if email in indexed:
+                conflicts.append({"email": email, "card_id": card["card_id"], "kept": indexed[email]})
+                continue
+            indexed[email] = card["card_id"]
+        self.owners.update(indexed)
+        return {"indexed": len(indexed), "conflicts": conflicts}
+
+
+def _deserialize(item):
+    """Item no formato baixo nível do DynamoDB ({"S": ...}) -> dict Python."""
+    if not item:
+        return None
+    from boto3.dynamodb.types import TypeDeserializer
+
+    deserializer = TypeDeserializer()
+    return {k: deserializer.deserialize(v) for k, v in item.items()}
+
+
+# ---------- Instância padrão ----------
+_repository = None
+
+
+def get_card_repository():
+    global _repository
+    if _repository is None:
+        if Config.CARD_REPOSITORY == "memory":
+            _repository = InMemoryCardRepository()
+        else:
+            from app import aws
+            _repository = DynamoCardRepository(aws.cards_table, aws.card_owners_table, resource=aws.dynamodb)
+    return _repository
+
+
+def set_card_repository(repository):
+    """Troca o backend (ex.: InMemoryCardRepository nos testes)."""
+    global _repository
+    _repository = repository
+
+
+def find_card_by_owner(email):
+    return get_card_repository().find_card_by_owner(email)
@@ -0,0 +1,341 @@
+# app/cleanup.py
+"""
+Limpeza das imagens que nenhum cartão usa mais.
+
+Quem apaga ou troca imagens (delete_card, update_card, uploads descartados)
+só enfileira as URLs: a fila é uma tabela SQLite (sobrevive a restart e é
+compartilhada pelos workers do gunicorn) e uma thread em segundo plano a
+esvazia em lotes com DeleteObjects (até 1000 chaves por chamada). Falhas
+voltam para a fila com backoff; depois de CLEANUP_MAX_ATTEMPTS tentativas a
+chave vai para a lista de mortos (dead letter), que pode ser reenfileirada.
+
+Imagens endereçadas pelo conteúdo podem estar em vários cartões: as
+contagens de referências (app/content_index.py) mudam junto com os cartões,
+e na hora de apagar uma chave ainda em uso sai da fila sem ser apagada (e
+uma recém-usada espera BLOB_DELETE_GRACE).
+
+reconcile() cobre o que escapou: lista os prefixos cards/ e content/ no S3 e
+enfileira os objetos que nenhum cartão referencia (só os mais velhos que o
+período de carência, para não pegar upload em andamento).
+
+    enqueue_urls(urls)
+    flask --app main cards cleanup-drain | reconcile-images [--apply] | cleanup-dead [--requeue]
+"""
+import sqlite3
+import threading
+import time
+
+from app import content_index, storage
+from app.config import Config
+
+_LEASE_SECONDS = 120  # chave reservada por um worker enquanto o lote roda
+
+
+class CleanupQueue:
+    def __init__(self, path, max_attempts=6):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cleanup_queue ("
+                " target TEXT NOT NULL, key TEXT NOT NULL, enqueued REAL NOT NULL,"
+                " next_try REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+                " last_error TEXT, dead INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (target, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cleanup_due ON cleanup_queue(dead, next_try)")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, keys):
+        """keys: pares (target, chave) como os de storage.key_for_url. Retorna quantos entraram."""
+        now = time.time()
+        rows = [(target, key, now, now) for target, key in dict.fromkeys(keys)]
+        if not rows:
+            return 0
+        cur = self._conn().executemany(
+            "INSERT OR IGNORE INTO cleanup_queue (target, key, enqueued, next_try) VALUES (?, ?, ?, ?)", rows
+        )
+        return cur.rowcount
+
+    def claim(self, target, limit):
+        """Reserva até `limit` chaves vencidas de um destino (outros workers não as pegam)."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            keys = [r[0] for r in conn.execute(
+                "SELECT key FROM cleanup_queue WHERE target = ? AND dead = 0 AND next_try <= ?"
+                " ORDER BY next_try LIMIT ?", (target, now, limit),
+            )]
+            conn.executemany(
+                "UPDATE cleanup_queue SET next_try = ? WHERE target = ? AND key = ?",
+                [(now + _LEASE_SECONDS, target, k) for k in keys],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return keys
+
+    def done(self, target, keys):
+        self._conn().executemany(
+            "DELETE FROM cleanup_queue WHERE target = ? AND key = ?", [(target, k) for k in keys]
+        )
+
+    def defer(self, target, keys, until):
+        """Adia chaves sem contar tentativa (ex.: imagem usada há pouco)."""
+        self._conn().executemany(
+            "UPDATE cleanup_queue SET next_try = ? WHERE target = ? AND key = ?", [(until, target, k) for k in keys]
+        )
+
+    def fail(self, target, errors):
+        """errors: {chave: mensagem}. Reagenda com backoff ou manda para os mortos."""
+        now = time.time()
+        conn = self._conn()
+        for key, error in errors.items():
+            row = conn.execute(
+                "SELECT attempts FROM cleanup_queue WHERE target = ? AND key = ?", (target, key)
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            conn.execute(
+                "UPDATE cleanup_queue SET attempts = ?, last_error = ?, next_try = ?, dead = ?"
+                " WHERE target = ? AND key = ?",
+                (attempts, str(error)[:500], now + min(30 * 2 ** attempts, 3600),
+                 int(attempts >= self.max_attempts), target, key),
+            )
+
+    def dead_letters(self, limit=100):
+        rows = self._conn().execute(
+            "SELECT target, key, attempts, last_error FROM cleanup_queue WHERE dead = 1 ORDER BY enqueued LIMIT ?",
+            (limit,),
+        )
+        return [{"target": t, "key": k, "attempts": a, "error": e} for t, k, a, e in rows]
+
+    def requeue_dead(self):
+        cur = self._conn().execute(
+            "UPDATE cleanup_queue SET dead = 0, attempts = 0, next_try = ? WHERE dead = 1", (time.time(),)
+        )
+        return cur.rowcount
+
+    def stats(self):
+        pending, dead = self._conn().execute(
+            "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM cleanup_queue"
+        ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_cleanup_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = CleanupQueue(Config.CLEANUP_QUEUE_PATH, Config.CLEANUP_MAX_ATTEMPTS)
+    return _queue
+
+
+# ---------- Enfileirar ----------
+def card_image_urls(card):
+    """Todas as URLs de imagem de um cartão (principal + variantes)."""
+    if not card:
+        return set()
+    urls = {card.get("foto_perfil")}
+    urls.update((card.get("foto_perfil_variants") or {}).values())
+    urls.update(card.get("galeria") or [])
+    for variants in card.get("galeria_variants") or []:
+        urls.update((variants or {}).values())
+    return {u for u in urls if u}
+
+
+def card_file_urls(card):
+    """Imagens + artefatos gerados (vCard, QR, página) do cartão."""
+    if not card:
+        return set()
+    return card_image_urls(card) | {u for u in (card.get("artifacts") or {}).values() if u}
+
+
+def enqueue_urls(urls):
+    """Enfileira as URLs que são deste app (S3/uploads); links externos são ignorados."""
+    return _enqueue_keys([k for k in map(storage.key_for_url, urls) if k])
+
+
+def _enqueue_keys(keys):
+    if not keys:
+        return 0
+    n = get_cleanup_queue().enqueue(keys)
+    if Config.CLEANUP_WORKER:
+        start_worker()
+    return n
+
+
+def retain_card_images(card):
+    """Conta as imagens de um cartão recém-criado como referenciadas."""
+    content_index.update_refs(card_image_urls(card), ())
+
+
+def _card_keys(card_id, urls):
+    """
+    Chaves que um cartão pode mandar para a fila: as endereçadas pelo conteúdo
+    (a contagem de referências decide na hora de apagar) e as do espaço dele
+    (cards/<card_id>/). Uma URL de outro cartão colada no JSON do PUT fica de
+    fora, senão trocar o campo (ou apagar o cartão) apagaria o arquivo do outro.
+    """
+    keys = [k for k in map(storage.key_for_url, urls) if k]
+    return [k for k in keys if content_index.is_content_key(*k) or storage.card_owns_key(card_id, *k)]
+
+
+def enqueue_replaced(previous, card):
+    """Ajusta as referências e enfileira as imagens que estavam no cartão antes e não estão mais."""
+    before, after = card_image_urls(previous), card_image_urls(card)
+    content_index.update_refs(after - before, before - after)
+    return _enqueue_keys(_card_keys((card or previous)["card_id"], before - after))
+
+
+def enqueue_deleted(card):
+    """Cartão apagado: solta as referências e enfileira imagens e artefatos."""
+    content_index.update_refs((), card_image_urls(card))
+    return _enqueue_keys(_card_keys(card["card_id"], card_file_urls(card)))
+
+
+# ---------- Esvaziar ----------
+def _delete_s3(keys):
+    """DeleteObjects de um lote. Retorna {chave: erro} das que falharam."""
+    try:
+        resp = storage.get_s3().delete_objects(
+            Bucket=storage.bucket(),
+            Delete={"Objects": [{"Key": k} for k in keys], "Quiet": True},
+        )
+    except Exception as e:
+        return {k: e for k in keys}
+    return {err["Key"]: f"{err.get('Code')}: {err.get('Message')}" for err in resp.get("Errors", [])}
+
+
+def _delete_local(names):
+    errors = {}
+    for name in names:
+        try:
+            storage.delete_local_upload(name)
+        except OSError as e:
+            errors[name] = e
+    return errors
+
+
+def drain_once(queue=None, batch_size=None):
+    """Processa um lote por destino. Retorna {"deleted": n, "failed": n}."""
+    queue = queue or get_cleanup_queue()
+    batch_size = batch_size or Config.CLEANUP_BATCH_SIZE
+    deleted = failed = 0
+    for target, delete in (("s3", _delete_s3), ("local", _delete_local)):
+        if target == "s3" and not storage.uses_s3():
+            continue
+        keys = queue.claim(target, batch_size)
+        if not keys:
+            continue
+        keys, in_use, recent = content_index.split_deletable(target, keys)
+        # voltou a ser usada por algum cartão: sai da fila (volta quando for solta de novo)
+        queue.done(target, in_use)
+        queue.defer(target, recent, time.time() + Config.BLOB_DELETE_GRACE)
+        if not keys:
+            continue
+        errors = delete(keys)
+        removed = [k for k in keys if k not in errors]
+        queue.done(target, removed)
+        content_index.forget_keys(target, removed)
+        if errors:
+            queue.fail(target, errors)
+        deleted += len(keys) - len(errors)
+        failed += len(errors)
+    return {"deleted": deleted, "failed": failed}
+
+
+def drain(queue=None, batch_size=None):
+    """Esvazia tudo que já venceu (lote atrás de lote)."""
+    total = {"deleted": 0, "failed": 0}
+    while True:
+        result = drain_once(queue, batch_size)
+        total = {k: total[k] + result[k] for k in total}
+        if not result["deleted"] and not result["failed"]:
+            return total
+
+
+class CleanupWorker(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name="image-cleanup", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                drain()
+            except Exception as e:
+                print("Erro na limpeza de imagens:", e)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_worker = None
+
+
+def start_worker():
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return _worker
+    with _queue_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = CleanupWorker(Config.CLEANUP_INTERVAL)
+            _worker.start()
+    return _worker
+
+
+# ---------- Reconciliação ----------
+def _referenced_keys(repository):
+    fields = ["foto_perfil", "foto_perfil_variants", "galeria", "galeria_variants", "artifacts"]
+    keys, start = set(), None
+    while True:
+        items, start = repository.scan_page(0, 1, start, 1000, fields)
+        for card in items:
+            keys.update(k for k in map(storage.key_for_url, card_file_urls(card)) if k)
+        if not start:
+            return keys
+
+
+def reconcile(prefix=None, grace_hours=None, apply=False, repository=None):
+    """
+    Procura objetos em `prefix` (S3; padrão: cards/ e CONTENT_PREFIX/) que
+    nenhum cartão referencia. Com apply=True enfileira para apagar (zerando a
+    contagem de referências que tenha sobrado); senão só relata. Os cartões
+    são lidos antes da listagem, e o período de carência protege quem subiu depois.
+    """
+    from app.card_repository import get_card_repository
+
+    if not storage.uses_s3():
+        raise RuntimeError("Reconciliação só está disponível com S3 configurado")
+    grace = (Config.CLEANUP_GRACE_HOURS if grace_hours is None else grace_hours) * 3600
+    referenced = _referenced_keys(repository or get_card_repository())
+    cutoff = time.time() - grace
+
+    prefixes = [prefix] if prefix else ["cards/", Config.CONTENT_PREFIX.strip("/") + "/"]
+    scanned, orphans = 0, []
+    paginator = storage.get_s3().get_paginator("list_objects_v2")
+    for page in (p for pre in prefixes for p in paginator.paginate(Bucket=storage.bucket(), Prefix=pre)):
+        for obj in page.get("Contents", []):
+            scanned += 1
+            if ("s3", obj["Key"]) in referenced or obj["LastModified"].timestamp() > cutoff:
+                continue
+            orphans.append(obj["Key"])
+    if apply and orphans:
+        content_index.reset_keys("s3", orphans)
+        get_cleanup_queue().enqueue(("s3", k) for k in orphans)
+    return {"scanned": scanned, "referenced": len(referenced), "orphans": len(orphans), "sample": orphans[:20]}
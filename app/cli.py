@@ -0,0 +1,166 @@
+# app/cli.py
+"""
+Comandos de manutenção (flask --app main cards <comando>).
+"""
+import json
+
+import click
+from flask.cli import AppGroup
+
+from app.card_repository import get_card_repository
+
+cards_cli = AppGroup("cards", help="Manutenção dos cartões.")
+
+
+@cards_cli.command("backfill-owners")
+def backfill_owners():
+    """Popula o índice dono (emailContato) -> card_id a partir dos cartões existentes."""
+    result = get_card_repository().backfill_owner_index()
+    click.echo(f"Índice atualizado: {result['indexed']} cartões.")
+    for c in result["conflicts"]:
+        click.echo(f"Conflito: {json.dumps(c, ensure_ascii=False)}", err=True)
+
+
+@cards_cli.command("migrate-inline-images")
+@click.option("--source", type=click.Choice(["json", "dynamo"]), default="dynamo", show_default=True)
+@click.option("--path", default="cards.json", show_default=True, help="Arquivo para --source json.")
+@click.option("--segments", default=4, show_default=True, help="Segmentos paralelos do scan.")
+@click.option("--checkpoint", default="migrate-inline-images.checkpoint.json", show_default=True)
+@click.option("--dry-run", is_flag=True, help="Só calcula os bytes economizados.")
+def migrate_inline_images(source, path, segments, checkpoint, dry_run):
+    """Tira as imagens base64 inline dos cartões e grava as URLs no lugar."""
+    from app.inline_images import Checkpoint, migrate_json_file, migrate_dynamo_table
+
+    saved = {"total": 0}
+
+    def report(r):
+        saved["total"] += r.get("saved", 0)
+        status = f"erro: {'; '.join(r['errors'])}" if r["errors"] else f"{r.get('saved', 0)} bytes economizados"
+        click.echo(f"{r['card_id']}: {r['images']} imagens, {status}")
+
+    cp = Checkpoint(None if dry_run else checkpoint)
+    if source == "json":
+        migrate_json_file(path, checkpoint=cp, dry_run=dry_run, on_report=report)
+    else:
+        from app.aws import cards_table
+        totals = migrate_dynamo_table(cards_table, segments=segments, checkpoint=cp, dry_run=dry_run, on_report=report)
+        click.echo(f"Cartões lidos: {totals['cards']}, conflitos: {totals['conflicts']}, erros: {totals['errors']}")
+    click.echo(f"Total economizado: {saved['total']} bytes{' (dry-run)' if dry_run else ''}")
+
+
+@cards_cli.command("import-local")
+@click.option("--path", default=None, help="cards.json a importar (padrão: LOCAL_CARDS_JSON).")
+def import_local(path):
+    """Importa um cards.json para o armazenamento local em SQLite."""
+    from app.config import Config
+    from app.local_store import get_local_store
+
+    total = get_local_store().import_json(path or Config.LOCAL_CARDS_JSON)
+    click.echo(f"{total} cartões importados para {Config.LOCAL_STORE_PATH}.")
+
+
+@cards_cli.command("import-bulk")
+@click.argument("path")
+def import_bulk(path):
+    """Importa cartões de um .json/.csv (dedup por emailContato, BatchWriteItem)."""
+    from app.card_import import import_cards, read_rows
+
+    result = import_cards(read_rows(path))
+    for r in result["results"]:
+        if r["status"] != "created":
+            click.echo(json.dumps(r, ensure_ascii=False, default=str), err=True)
+    click.echo(f"Criados: {result['created']}, duplicados: {result['duplicate']}, inválidos: {result['invalid']}")
+
+
+@cards_cli.command("export")
+@click.option("--out", default="cards.ndjson.gz", show_default=True, help=".gz comprime a saída.")
+@click.option("--segments", default=4, show_default=True, help="Segmentos paralelos do scan.")
+@click.option("--fields", default=None, help='Campos separados por vírgula, ou "*" para todos.')
+@click.option("--token", default=None, help="Continua uma exportação interrompida (ver <out>.checkpoint).")
+def export_cards(out, segments, fields, token):
+    """Exporta os cartões em NDJSON com scan paralelo e memória constante."""
+    from app.export import export_to_file, parse_fields
+
+    count, last_token = export_to_file(out, segments=segments, fields=parse_fields(fields), token=token)
+    click.echo(f"{count} cartões exportados para {out}.")
+
+
+@cards_cli.command("cleanup-drain")
+def cleanup_drain():
+    """Apaga agora as imagens na fila de limpeza (DeleteObjects em lotes)."""
+    from app.cleanup import drain, get_cleanup_queue
+
+    result = drain()
+    stats = get_cleanup_queue().stats()
+    click.echo(f"{result['deleted']} apagadas, {result['failed']} falharam; "
+               f"{stats['pending']} pendentes, {stats['dead']} desistidas.")
+
+
+@cards_cli.command("reconcile-images")
+@click.option("--prefix", default=None, help="Prefixo no S3 (padrão: cards/ e CONTENT_PREFIX/).")
+@click.option("--grace-hours", type=float, default=None, help="Ignora objetos mais novos (padrão: CLEANUP_GRACE_HOURS).")
+@click.option("--apply", is_flag=True, help="Enfileira os órfãos para apagar (sem isso só relata).")
+def reconcile_images(prefix, grace_hours, apply):
+    """Encontra objetos no S3 que nenhum cartão referencia."""
+    from app.cleanup import reconcile
+
+    result = reconcile(prefix=prefix, grace_hours=grace_hours, apply=apply)
+    click.echo(f"{result['scanned']} objetos, {result['referenced']} referenciados, {result['orphans']} órfãos"
+               + (" (enfileirados)." if apply else "."))
+    for key in result["sample"]:
+        click.echo(f"  {key}")
+
+
+@cards_cli.command("cleanup-dead")
+@click.option("--requeue", is_flag=True, help="Devolve as chaves desistidas para a fila.")
+def cleanup_dead(requeue):
+    """Lista (ou reenfileira) as chaves que esgotaram as tentativas."""
+    from app.cleanup import get_cleanup_queue
+
+    queue = get_cleanup_queue()
+    if requeue:
+        click.echo(f"{queue.requeue_dead()} chaves devolvidas para a fila.")
+        return
+    for d in queue.dead_letters():
+        click.echo(json.dumps(d, ensure_ascii=False))
+
+
+@cards_cli.command("generate-artifacts")
+@click.option("--card-id", "card_ids", multiple=True, help="Só estes cartões (padrão: todos).")
+def generate_artifacts(card_ids):
+    """Gera vCard, QR e página de compartilhamento (backfill dos cartões antigos)."""
+    from app.card_artifacts import generate
+    from app.card_cache import card_cache
+
+    repository = get_card_repository()
+
+    def pages():
+        if card_ids:
+            yield [c for c in map(repository.get_card, card_ids) if c]
+            return
+        start = None
+        while True:
+            items, start = repository.scan_page(0, 1, start, 500)
+            yield items
+            if not start:
+                return
+
+    for cards in pages():
+        for card in cards:
+            try:
+                urls = generate(card)
+                if card.get("artifacts") != urls:
+                    repository.update_card(card["card_id"], card.get("emailContato"), fields={"artifacts": urls})
+                    card_cache.invalidate(card["card_id"])
+                click.echo(f"{card['card_id']}: ok")
+            except Exception as e:
+                click.echo(f"{card['card_id']}: erro: {e}", err=True)
+
+
+@cards_cli.command("search-reindex")
+def search_reindex():
+    """Remonta o índice de busca com um scan dos cartões (retrato novo, diário zerado)."""
+    from app.search import get_search_store
+
+    total = get_search_store().rebuild()
+    click.echo(f"Índice de busca: {total} cartões.")
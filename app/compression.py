@@ -0,0 +1,213 @@
+# app/compression.py
+"""
+Compressão das respostas (gzip, ou brotli se instalado), negociada pelo
+Accept-Encoding.
+
+  - after_request: respostas de texto/JSON com corpo em memória acima de
+    COMPRESS_MIN_BYTES são comprimidas; arquivos (sendfile) e streams ficam
+    de fora. Vai sempre "Vary: Accept-Encoding".
+  - corpos quentes: a rota pode marcar a resposta com uma chave estável
+    (cached_json(obj, key) — no GET /card é o ETag). O corpo serializado e
+    cada versão comprimida ficam num LRU limitado por bytes, então um cartão
+    lido em sequência não é serializado nem comprimido de novo. Como a
+    compressão acontece uma vez só, esses usam nível mais alto.
+  - compress_stream(): para respostas em streaming (export NDJSON).
+
+ETag: gzip e br são outras representações (RFC 9110), então o ETag forte
+da rota ganha o sufixo da codificação ("<etag>-gzip"). Quem compara ETags
+vindos do cliente (If-Match das atualizações, If-None-Match do GET) tira o
+sufixo antes com decoded_etag_header / conditional_environ.
+"""
+import gzip
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+from app.config import Config
+
+try:
+    import brotli
+except ImportError:  # opcional
+    brotli = None
+
+_COMPRESSIBLE = (
+    "application/json", "application/x-ndjson", "application/javascript",
+    "image/svg+xml", "text/",
+)
+
+
+def _compressible(mimetype):
+    return bool(mimetype) and any(
+        mimetype == t or (t.endswith("/") and mimetype.startswith(t)) for t in _COMPRESSIBLE
+    )
+
+
+def negotiate(accept_encodings=None):
+    """"br", "gzip" ou None conforme o Accept-Encoding (respeita q=0)."""
+    accept = request.accept_encodings if accept_encodings is None else accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data, encoding, hot=False):
+    if encoding == "br":
+        quality = Config.COMPRESS_HOT_BR_QUALITY if hot else Config.COMPRESS_BR_QUALITY
+        return brotli.compress(data, quality=quality, mode=brotli.MODE_TEXT)
+    level = Config.COMPRESS_HOT_GZIP_LEVEL if hot else Config.COMPRESS_GZIP_LEVEL
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, encoding, flush_bytes=64 * 1024):
+    """Comprime um iterável de bytes, soltando blocos de ~flush_bytes."""
+    if encoding == "br":
+        comp = brotli.Compressor(quality=Config.COMPRESS_BR_QUALITY, mode=brotli.MODE_TEXT)
+        compress_chunk, flush, finish = comp.process, comp.flush, comp.finish
+    else:
+        comp = zlib.compressobj(Config.COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits=31 -> cabeçalho gzip
+        compress_chunk, flush, finish = comp.compress, lambda: comp.flush(zlib.Z_SYNC_FLUSH), comp.flush
+    pending = 0
+    for chunk in chunks:
+        pending += len(chunk)
+        out = compress_chunk(chunk)
+        if pending >= flush_bytes:
+            out += flush()
+            pending = 0
+        if out:
+            yield out
+    yield finish()
+
+
+# ---------- Corpos quentes ----------
+class BodyCache:
+    """LRU de corpos prontos, (chave, codificação) -> bytes, limitado pelo total de bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, encoding):
+        with self._lock:
+            body = self._data.get((key, encoding))
+            if body is not None:
+                self._data.move_to_end((key, encoding))
+            return body
+
+    def set(self, key, encoding, body):
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._data.pop((key, encoding), None)
+            if old is not None:
+                self._size -= len(old)
+            self._data[(key, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, dropped = self._data.popitem(last=False)
+                self._size -= len(dropped)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+
+hot_bodies = BodyCache(Config.COMPRESS_HOT_CACHE_BYTES)
+
+
+def cached_json(obj, key):
+    """
+    Resposta JSON de `obj` reaproveitando o corpo já serializado (e depois os
+    comprimidos) guardado sob `key`. A chave tem que mudar junto com o
+    conteúdo — um ETag forte, por exemplo.
+    """
+    from flask import current_app
+
+    body = hot_bodies.get(key, "identity") if key else None
+    if body is None:
+        resp = current_app.json.response(obj)
+        if key:
+            hot_bodies.set(key, "identity", resp.get_data())
+    else:
+        resp = current_app.response_class(body, mimetype="application/json")
+    resp.hot_key = key
+    return resp
+
+
+# ---------- ETag por codificação ----------
+_CODING_SUFFIX = re.compile(r'-(?:gzip|br)"')
+
+
+def decoded_etag_header(value):
+    """If-Match/If-None-Match com os ETags "<etag>-gzip"/"<etag>-br" de volta ao "<etag>"."""
+    return _CODING_SUFFIX.sub('"', value) if value else value
+
+
+def conditional_environ(environ):
+    """Cópia do environ para response.make_conditional, com os If-*-Match sem o sufixo."""
+    environ = dict(environ)
+    for name in ("HTTP_IF_MATCH", "HTTP_IF_NONE_MATCH"):
+        if environ.get(name):
+            environ[name] = decoded_etag_header(environ[name])
+    return environ
+
+
+def _coded_etag(response, encoding):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+
+
+def _matched_etag(response):
+    """304: devolve o ETag que o cliente mandou (com a codificação que ele tem em cache)."""
+    etag, weak = response.get_etag()
+    if not etag or weak:
+        return
+    for encoding in ("gzip", "br"):
+        if request.if_none_match.contains_weak(f"{etag}-{encoding}"):
+            response.set_etag(f"{etag}-{encoding}")
+            return
+
+
+# ---------- Flask ----------
+def _after_request(response):
+    if request.method == "HEAD" or response.status_code not in (200, 304):
+        return response
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    if not _compressible(response.mimetype):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.status_code == 304:
+        _matched_etag(response)
+        return response
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    key = getattr(response, "hot_key", None)
+    body = hot_bodies.get(key, encoding) if key else None
+    if body is None:
+        data = response.get_data()
+        if len(data) < Config.COMPRESS_MIN_BYTES:
+            return response
+        body = compress(data, encoding, hot=bool(key))
+        if len(body) >= len(data):
+            return response
+        if key:
+            hot_bodies.set(key, encoding, body)
+    response.set_data(body)  # também acerta o Content-Length
+    response.headers["Content-Encoding"] = encoding
+    _coded_etag(response, encoding)
+    return response
+
+
+def init_app(app):
+    if Config.COMPRESS_ENABLED:
+        app.after_request(_after_request)
@@ -1,6 +1,7 @@
 #config.py
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,3 +11,136 @@ class Config:
     DYNAMODB_TABLE = os.getenv("DYNAMODB_TABLE", "GetiCardUsers")
     S3_BUCKET = os.getenv("S3_BUCKET", "meu-bucket-geticard")
     SECRET_KEY = os.getenv("SECRET_KEY", "sua_chave_secreta_segura")  # ✅ Correto!
+
+    # Clients AWS (app/aws.py)
+    DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL") or None  # ex.: DynamoDB Local
+    AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32"))
+    AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "2"))
+    AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "10"))
+    AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "4"))
+    AWS_WARM_UP = os.getenv("AWS_WARM_UP", "0") in ("1", "true", "yes")
+
+    # Cartões e índice dono (email) -> card_id
+    CARDS_TABLE = os.getenv("CARDS_TABLE", "Testecard")
+    CARD_OWNERS_TABLE = os.getenv("CARD_OWNERS_TABLE", "GetiCardOwners")
+    CARD_REPOSITORY = os.getenv("CARD_REPOSITORY", "dynamo")  # "dynamo" | "memory"
+
+    # Tokens: JWT de acesso e refresh tokens (POST /refresh)
+    ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "3600"))  # segundos
+    REFRESH_TOKENS_TABLE = os.getenv("REFRESH_TOKENS_TABLE", "GetiCardRefreshTokens")  # chave token_hash, TTL em expires_at
+    REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))
+    REFRESH_REUSE_GRACE = int(os.getenv("REFRESH_REUSE_GRACE", "10"))  # segundos em que reusar só é recusado, sem revogar
+    REFRESH_TOKEN_BACKEND = os.getenv(
+        "REFRESH_TOKEN_BACKEND", "memory" if CARD_REPOSITORY == "memory" else "dynamo"
+    )  # "dynamo" | "memory"
+
+    # Cache do GET /card/<card_id>
+    CARD_CACHE_BACKEND = os.getenv("CARD_CACHE_BACKEND", "memory")  # "memory" | "sqlite" | "off"
+    CARD_CACHE_PATH = os.getenv("CARD_CACHE_PATH", os.path.join("/tmp", "geticard-card-cache.sqlite3"))
+    CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "1024"))
+    CARD_CACHE_TTL = int(os.getenv("CARD_CACHE_TTL", "60"))
+    CARD_CACHE_NEGATIVE_TTL = int(os.getenv("CARD_CACHE_NEGATIVE_TTL", "5"))
+    CARD_CACHE_CONTROL = os.getenv("CARD_CACHE_CONTROL", "public, max-age=30, must-revalidate")
+
+    # Persistência local (sem AWS): SQLite; o cards.json antigo é importado na primeira abertura
+    LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", os.path.join(os.getcwd(), "cards.sqlite3"))
+    LOCAL_CARDS_JSON = os.getenv("LOCAL_CARDS_JSON", os.path.join(os.getcwd(), "cards.json"))
+
+    # Upload direto (URL assinada)
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+    UPLOAD_URL_EXPIRES = int(os.getenv("UPLOAD_URL_EXPIRES", "900"))
+    UPLOAD_MAX_FILES = int(os.getenv("UPLOAD_MAX_FILES", "10"))
+    UPLOAD_CONTENT_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/heic", "image/avif")
+
+    # Recebimento em streaming (app/ingest.py)
+    MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(60 * 1024 * 1024)))
+    MAX_FORM_MEMORY_BYTES = int(os.getenv("MAX_FORM_MEMORY_BYTES", str(512 * 1024)))
+    INGEST_TARGET = os.getenv("INGEST_TARGET", "s3")  # "s3" (multipart direto) | "local"
+    INGEST_PART_SIZE = int(os.getenv("INGEST_PART_SIZE", str(8 * 1024 * 1024)))
+    INGEST_S3_PREFIX = os.getenv("INGEST_S3_PREFIX", "incoming")
+    INGEST_TMP_DIR = os.getenv("INGEST_TMP_DIR", os.path.join(tempfile.gettempdir(), "geticard-incoming"))  # LocalSink
+
+    # Leitura/importação em lote
+    BATCH_GET_MAX = int(os.getenv("BATCH_GET_MAX", "100"))
+    IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "1000"))
+    ADMIN_EMAILS = {e.strip() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+    EXPORT_MAX_SEGMENTS = int(os.getenv("EXPORT_MAX_SEGMENTS", "16"))
+
+    # Limpeza de imagens órfãs (app/cleanup.py)
+    CLEANUP_QUEUE_PATH = os.getenv("CLEANUP_QUEUE_PATH", os.path.join("/tmp", "geticard-cleanup.sqlite3"))
+    CLEANUP_WORKER = os.getenv("CLEANUP_WORKER", "1") == "1"  # 0: só via `flask cards cleanup-drain`
+    CLEANUP_INTERVAL = float(os.getenv("CLEANUP_INTERVAL", "5"))
+    CLEANUP_BATCH_SIZE = min(int(os.getenv("CLEANUP_BATCH_SIZE", "1000")), 1000)  # limite do DeleteObjects
+    CLEANUP_MAX_ATTEMPTS = int(os.getenv("CLEANUP_MAX_ATTEMPTS", "6"))
+    CLEANUP_GRACE_HOURS = float(os.getenv("CLEANUP_GRACE_HOURS", "24"))
+
+    # Imagens endereçadas pelo conteúdo: índice de origens e contagem de referências (app/content_index.py)
+    CONTENT_PREFIX = os.getenv("CONTENT_PREFIX", "content")  # S3: content/<aa>/<sha256>.<ext>
+    BLOB_INDEX_BACKEND = os.getenv(
+        "BLOB_INDEX_BACKEND", "dynamo" if os.getenv("S3_BUCKET") and CARD_REPOSITORY == "dynamo" else "sqlite"
+    )  # "sqlite" | "dynamo"
+    BLOB_INDEX_PATH = os.getenv("BLOB_INDEX_PATH", os.path.join("/tmp", "geticard-blob-index.sqlite3"))
+    BLOB_INDEX_TABLE = os.getenv("BLOB_INDEX_TABLE", "GetiCardBlobs")  # chave "id"
+    BLOB_DELETE_GRACE = float(os.getenv("BLOB_DELETE_GRACE", "3600"))  # segundos sem uso antes de apagar
+
+    # Servir /uploads (app/uploads_server.py)
+    UPLOADS_OFFLOAD = os.getenv("UPLOADS_OFFLOAD", "")  # "" | "x-accel" (nginx) | "x-sendfile" (apache/lighttpd)
+    UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/_uploads")  # location internal do nginx
+    UPLOADS_MAX_AGE = int(os.getenv("UPLOADS_MAX_AGE", "3600"))  # arquivos sem hash/uuid no nome
+
+    # Métricas (app/metrics.py)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0") == "1"
+    METRICS_DYNAMO_CAPACITY = os.getenv("METRICS_DYNAMO_CAPACITY", "1") == "1"  # ReturnConsumedCapacity=TOTAL
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # /metrics, /debug/profiler e /debug-cache (ou JWT de ADMIN_EMAILS); vazio: só admin
+
+    # Visualizações por cartão, agregadas em memória e gravadas em lote (app/analytics.py)
+    ANALYTICS_BACKEND = os.getenv(
+        "ANALYTICS_BACKEND", "sqlite" if CARD_REPOSITORY == "memory" else "dynamo"
+    )  # "dynamo" | "sqlite" | "off"
+    CARD_STATS_TABLE = os.getenv("CARD_STATS_TABLE", "GetiCardStats")  # card_id + bucket (hora UTC)
+    ANALYTICS_PATH = os.getenv("ANALYTICS_PATH", os.path.join("/tmp", "geticard-analytics.sqlite3"))
+    ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "30"))
+    ANALYTICS_FLUSH_KEYS = int(os.getenv("ANALYTICS_FLUSH_KEYS", "5000"))  # pares pendentes que antecipam o flush
+    ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "90"))
+
+    # Busca de cartões: índice invertido em memória, retrato + diário em disco (app/search.py)
+    SEARCH_ENABLED = os.getenv("SEARCH_ENABLED", "1") == "1"
+    SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join("/tmp", "geticard-search-index.json.gz"))
+    SEARCH_JOURNAL_MAX_BYTES = int(os.getenv("SEARCH_JOURNAL_MAX_BYTES", str(1024 * 1024)))
+    SEARCH_MIN_PREFIX = int(os.getenv("SEARCH_MIN_PREFIX", "2"))  # letras antes de completar por prefixo
+    SEARCH_MAX_EXPANSIONS = int(os.getenv("SEARCH_MAX_EXPANSIONS", "200"))  # termos por prefixo
+    SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "50"))
+    SEARCH_PREVIEW_CHARS = int(os.getenv("SEARCH_PREVIEW_CHARS", "140"))
+
+    # Artefatos por cartão: vCard, QR e página OpenGraph (app/card_artifacts.py)
+    ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "1") == "1"
+    ARTIFACTS_ASYNC = os.getenv("ARTIFACTS_ASYNC", "1") == "1"  # 0: gera dentro da requisição
+    ARTIFACTS_WORKERS = int(os.getenv("ARTIFACTS_WORKERS", "1"))
+    PUBLIC_CARD_URL = os.getenv("PUBLIC_CARD_URL", "https://geticard.com/card/{card_id}")
+
+    # Compressão das respostas (app/compression.py); brotli só se instalado
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+    COMPRESS_BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY", "4"))
+    COMPRESS_HOT_GZIP_LEVEL = int(os.getenv("COMPRESS_HOT_GZIP_LEVEL", "9"))  # corpos em cache: comprime uma vez só
+    COMPRESS_HOT_BR_QUALITY = int(os.getenv("COMPRESS_HOT_BR_QUALITY", "9"))
+    COMPRESS_HOT_CACHE_BYTES = int(os.getenv("COMPRESS_HOT_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+    # Controle de admissão (app/rate_limit.py). Regras "N/S": rajada N, N fichas a cada S segundos; "" desliga
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" | "sqlite" | "off"
+    RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", os.path.join("/tmp", "geticard-rate-limit.sqlite3"))
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))  # proxies na frente (X-Forwarded-For)
+    RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "20/60")
+    RATE_LIMIT_AUTH_EMAIL = os.getenv("RATE_LIMIT_AUTH_EMAIL", "5/60")
+    RATE_LIMIT_WRITE = os.getenv("RATE_LIMIT_WRITE", "60/60")
+    RATE_LIMIT_WRITE_EMAIL = os.getenv("RATE_LIMIT_WRITE_EMAIL", "30/60")
+    RATE_LIMIT_READ = os.getenv("RATE_LIMIT_READ", "300/60")
+    ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "64"))  # por processo; 0 = sem teto
+    ADMISSION_DEGRADED_INFLIGHT = int(os.getenv("ADMISSION_DEGRADED_INFLIGHT", "4"))  # auth/write com AWS lento
+    ADMISSION_LATENCY_MS = float(os.getenv("ADMISSION_LATENCY_MS", "500"))  # média das chamadas AWS; 0 desliga
+
+    # Modo async: threads para as chamadas boto3 aguardadas (app/aio.py) e por worker ASGI (asgi.py)
+    AIO_THREADS = int(os.getenv("AIO_THREADS", "32"))
+    ASGI_THREADS = int(os.getenv("ASGI_THREADS", "32"))
@@ -0,0 +1,323 @@
+# app/content_index.py
+"""
+Índice das imagens endereçadas pelo conteúdo (ver storage.put_content).
+
+A chave de cada objeto é o sha256 dos bytes gravados, então o mesmo arquivo
+enviado de novo (o mesmo avatar a cada edição, a mesma foto em dois
+cartões) cai na mesma chave. Este índice guarda:
+
+  - origens: sha256 do arquivo recebido + assinatura do processamento ->
+    {"url", "variants"} já gravados. Um reenvio é respondido daqui, sem
+    reprocessar a imagem nem transferir nada
+  - referências: quantos cartões usam cada chave. Ao criar/editar/apagar
+    cartões as contagens mudam (cleanup.retain_card_images /
+    enqueue_replaced / enqueue_deleted) e a fila de limpeza só apaga uma
+    chave com contagem 0 e sem uso há BLOB_DELETE_GRACE segundos (um upload
+    em andamento que reaproveitou a chave ainda não virou referência)
+
+Backends (BLOB_INDEX_BACKEND):
+  - "sqlite": arquivo local (BLOB_INDEX_PATH), compartilhado pelos workers
+  - "dynamo": tabela BLOB_INDEX_TABLE (chave "id"), para várias máquinas no mesmo bucket
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from app.config import Config
+
+_CONTENT_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+
+
+def is_content_key(target, key):
+    """("s3", "content/ab/<sha256>.webp") / ("local", "<sha256>.webp") -> True."""
+    if target == "s3":
+        prefix = Config.CONTENT_PREFIX.strip("/") + "/"
+        return key.startswith(prefix) and bool(_CONTENT_NAME.match(key.rsplit("/", 1)[-1]))
+    return bool(_CONTENT_NAME.match(key))
+
+
+def _ref(target, key):
+    return f"{target}:{key}"
+
+
+def _content_refs(urls):
+    from app import storage
+
+    keys = (storage.key_for_url(u) for u in urls)
+    return [_ref(*k) for k in keys if k and is_content_key(*k)]
+
+
+# ---------- SQLite ----------
+class SQLiteContentIndex:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, result TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS refs (ref TEXT PRIMARY KEY, count INTEGER NOT NULL, touched REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get_source(self, source):
+        row = self._conn().execute("SELECT result FROM sources WHERE source = ?", (source,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_source(self, source, result):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sources (source, result) VALUES (?, ?)", (source, json.dumps(result))
+        )
+
+    def drop_source(self, source):
+        self._conn().execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    def touch(self, refs, now):
+        self.adjust({r: 0 for r in refs}, now)
+
+    def adjust(self, deltas, now):
+        if not deltas:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            released = [ref for ref, delta in deltas.items() if delta < 0]
+            if released:
+                counts = self.states(released)
+                _log_underflow([r for r in released if counts.get(r, (0, 0))[0] + deltas[r] < 0])
+            # nunca abaixo de 0: uma liberação repetida não pode esconder uma referência futura
+            conn.executemany(
+                "INSERT INTO refs (ref, count, touched) VALUES (?, MAX(?, 0), ?)"
+                " ON CONFLICT(ref) DO UPDATE SET count = MAX(count + ?, 0), touched = excluded.touched",
+                [(ref, delta, now, delta) for ref, delta in deltas.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def states(self, refs):
+        """{ref: (contagem, último uso)}; chaves nunca vistas ficam de fora."""
+        out = {}
+        refs = list(refs)
+        for i in range(0, len(refs), 500):
+            chunk = refs[i:i + 500]
+            rows = self._conn().execute(
+                f"SELECT ref, count, touched FROM refs WHERE ref IN ({','.join('?' * len(chunk))})", chunk
+            )
+            out.update((ref, (count, touched)) for ref, count, touched in rows)
+        return out
+
+    def forget(self, refs):
+        self._conn().executemany("DELETE FROM refs WHERE ref = ?", [(r,) for r in refs])
+
+    def reset(self, refs, now):
+        self._conn().executemany(
+            "UPDATE refs SET count = 0, touched = ? WHERE ref = ?", [(now, r) for r in refs]
+        )
+
+
+# ---------- DynamoDB ----------
+class DynamoContentIndex:
+    def __init__(self, table):
+        self.table = table
+
+    def get_source(self, source):
+        item = self.table.get_item(Key={"id": f"src#{source}"}).get("Item")
+        return json.loads(item["result"]) if item else None
+
+    def put_source(self, source, result):
+        self.table.put_item(Item={"id": f"src#{source}", "result": json.dumps(result)})
+
+    def drop_source(self, source):
+        self.table.delete_item(Key={"id": f"src#{source}"})
+
+    def touch(self, refs, now):
+        self.adjust({r: 0 for r in refs}, now)
+
+    def adjust(self, deltas, now):
+        # ADD é atômico: dois cartões soltando a mesma imagem ao mesmo tempo não se perdem
+        for ref, delta in deltas.items():
+            if delta >= 0:
+                self.table.update_item(
+                    Key={"id": f"ref#{ref}"},
+                    UpdateExpression="ADD refs :d SET touched = :now",
+                    ExpressionAttributeValues={":d": delta, ":now": int(now)},
+                )
+            else:
+                self._release(ref, delta, int(now))
+
+    def _release(self, ref, delta, now, attempts=5):
+        """
+        ADD negativo só se a contagem comporta (refs >= -delta). Senão (liberação
+        repetida, ex.: delete refeito) a contagem vai a 0, sem ficar negativa.
+        """
+        from botocore.exceptions import ClientError
+
+        key = {"id": f"ref#{ref}"}
+        for _ in range(attempts):
+            try:
+                self.table.update_item(
+                    Key=key,
+                    UpdateExpression="ADD refs :d SET touched = :now",
+                    ConditionExpression="refs >= :need",
+                    ExpressionAttributeValues={":d": delta, ":need": -delta, ":now": now},
+                )
+                return
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+            _log_underflow([ref])
+            try:
+                # condicionado ao mesmo teste: um +1 que chegou no meio não é apagado
+                self.table.update_item(
+                    Key=key,
+                    UpdateExpression="SET refs = :zero, touched = :now",
+                    ConditionExpression="attribute_not_exists(refs) OR refs < :need",
+                    ExpressionAttributeValues={":zero": 0, ":need": -delta, ":now": now},
+                )
+                return
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+
+    def states(self, refs):
+        from app.aws import get_resource
+
+        out = {}
+        refs = list(refs)
+        dynamodb = get_resource("dynamodb", endpoint_url=Config.DYNAMODB_ENDPOINT_URL)
+        for i in range(0, len(refs), 100):
+            request = {self.table.name: {"Keys": [{"id": f"ref#{r}"} for r in refs[i:i + 100]]}}
+            while request:
+                resp = dynamodb.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(self.table.name, []):
+                    out[item["id"][len("ref#"):]] = (int(item.get("refs", 0)), float(item.get("touched", 0)))
+                request = resp.get("UnprocessedKeys") or None
+        return out
+
+    def forget(self, refs):
+        with self.table.batch_writer() as batch:
+            for ref in refs:
+                batch.delete_item(Key={"id": f"ref#{ref}"})
+
+    def reset(self, refs, now):
+        for ref in refs:
+            self.table.put_item(Item={"id": f"ref#{ref}", "refs": 0, "touched": int(now)})
+
+
+def _log_underflow(refs):
+    if refs:
+        print("Referências liberadas a mais (contagem mantida em 0):", ", ".join(refs[:10]))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_content_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            if Config.BLOB_INDEX_BACKEND == "dynamo":
+                from app import aws
+                _index = DynamoContentIndex(aws.blob_index_table)
+            else:
+                _index = SQLiteContentIndex(Config.BLOB_INDEX_PATH)
+    return _index
+
+
+def set_content_index(index):
+    global _index
+    _index = index
+
+
+# ---------- Operações ----------
+def lookup(source):
+    """Resultado já gravado para esta origem, ou None."""
+    try:
+        return get_content_index().get_source(source)
+    except Exception as e:
+        print("Erro ao consultar índice de conteúdo:", e)
+        return None
+
+
+def remember(source, result):
+    """Guarda o resultado de uma origem e marca as chaves como em uso agora."""
+    try:
+        index = get_content_index()
+        index.put_source(source, result)
+        index.touch(_content_refs([result["url"], *result["variants"].values()]), time.time())
+    except Exception as e:
+        print("Erro ao gravar índice de conteúdo:", e)
+
+
+def forget_source(source):
+    try:
+        get_content_index().drop_source(source)
+    except Exception as e:
+        print("Erro ao gravar índice de conteúdo:", e)
+
+
+def touch_urls(urls):
+    """Adia a limpeza das chaves (upload que reaproveitou um objeto existente)."""
+    try:
+        refs = _content_refs(urls)
+        if refs:
+            get_content_index().touch(refs, time.time())
+    except Exception as e:
+        print("Erro ao gravar índice de conteúdo:", e)
+
+
+def update_refs(added, removed):
+    """+1 para cada URL que passou a ser usada por um cartão, -1 para cada uma que deixou de ser."""
+    deltas = dict.fromkeys(_content_refs(added), 1)
+    for ref in _content_refs(removed):
+        deltas[ref] = deltas.get(ref, 0) - 1
+    deltas = {ref: d for ref, d in deltas.items() if d}
+    if deltas:
+        get_content_index().adjust(deltas, time.time())
+
+
+def split_deletable(target, keys, now=None):
+    """
+    Separa as chaves de um lote da fila de limpeza em (apagar, em uso, recentes).
+    Chaves que não são endereçadas pelo conteúdo são de um cartão só (a fila
+    só recebe as de cards/<card_id>/ do próprio cartão) e podem ser apagadas.
+    """
+    now = time.time() if now is None else now
+    content = [k for k in keys if is_content_key(target, k)]
+    states = get_content_index().states(_ref(target, k) for k in content) if content else {}
+    delete, in_use, recent = [], [], []
+    for key in keys:
+        count, touched = states.get(_ref(target, key), (0, 0))
+        if count > 0:
+            in_use.append(key)
+        elif now - touched < Config.BLOB_DELETE_GRACE:
+            recent.append(key)
+        else:
+            delete.append(key)
+    return delete, in_use, recent
+
+
+def forget_keys(target, keys):
+    refs = [_ref(target, k) for k in keys if is_content_key(target, k)]
+    if refs:
+        get_content_index().forget(refs)
+
+
+def reset_keys(target, keys):
+    """Zera as contagens de chaves que nenhum cartão usa (reconciliação)."""
+    refs = [_ref(target, k) for k in keys if is_content_key(target, k)]
+    if refs:
+        get_content_index().reset(refs, time.time())
@@ -0,0 +1,169 @@
+# app/export.py
+"""
+Exportação dos cartões em NDJSON (uma linha JSON por cartão), em streaming.
+
+O scan roda em N segmentos paralelos (uma thread por segmento) e os itens
+passam por uma fila limitada até quem escreve a saída, então a memória
+fica constante qualquer que seja o tamanho da tabela.
+
+Retomada: de tempos em tempos sai uma linha {"_checkpoint": "<token>"}. O
+token guarda onde cada segmento parou considerando só as páginas já
+escritas por inteiro; passando-o de volta (token=...) a exportação continua
+dali. Cartões depois do último checkpoint podem sair de novo.
+
+Fim do stream: a última linha é {"_complete": true, "count": N} ou, se a
+leitura falhou no meio, {"error": "...", "_checkpoint": "<token>"}. Sem
+nenhuma das duas, a conexão caiu antes do fim.
+"""
+import base64
+import gzip
+import json
+import queue
+import threading
+
+from app.card_repository import get_card_repository
+from app.json_provider import dumps_bytes, json_default
+
+# sem galeria/variantes (os campos pesados); fields="*" exporta tudo
+DEFAULT_FIELDS = (
+    "card_id", "nome", "emailContato", "whatsapp", "empresa", "biografia",
+    "instagram", "linkedin", "site", "chave_pix", "foto_perfil", "version", "updated_at",
+)
+
+_DONE = "done"
+
+
+class ExportTokenError(ValueError):
+    pass
+
+
+def encode_token(segments, state):
+    raw = json.dumps({"s": segments, "k": state}, separators=(",", ":"), default=json_default)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return int(data["s"]), {int(k): v for k, v in data["k"].items()}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ExportTokenError(f"Token de continuação inválido: {e}")
+
+
+def parse_fields(value):
+    if not value:
+        return list(DEFAULT_FIELDS)
+    if value.strip() == "*":
+        return None
+    return [f.strip() for f in value.split(",") if f.strip()]
+
+
+def iter_cards(segments=4, fields=DEFAULT_FIELDS, token=None, page_size=500, repository=None, queue_size=1000):
+    """
+    Gera ("item", cartão) e ("checkpoint", token) enquanto os segmentos são lidos em paralelo.
+    Se o consumidor parar no meio (ex.: cliente desconectou), as threads param também.
+    """
+    repository = repository or get_card_repository()
+    state = {s: None for s in range(segments)}
+    if token:
+        segments, state = decode_token(token)
+
+    q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(msg):
+        while not stop.is_set():
+            try:
+                q.put(msg, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(segment, start_key):
+        try:
+            while not stop.is_set():
+                items, last_key = repository.scan_page(segment, segments, start_key, page_size, fields)
+                for item in items:
+                    if not put(("item", item)):
+                        return
+                if not put(("page", segment, last_key or _DONE)):
+                    return
+                if not last_key:
+                    return
+                start_key = last_key
+        except Exception as e:
+            put(("error", e))
+
+    threads = [
+        threading.Thread(target=worker, args=(s, key), name=f"export-{s}", daemon=True)
+        for s, key in state.items() if key != _DONE
+    ]
+    for t in threads:
+        t.start()
+
+    running = len(threads)
+    try:
+        while running:
+            msg = q.get()
+            if msg[0] == "item":
+                yield msg
+            elif msg[0] == "page":
+                _, segment, key = msg
+                state[segment] = key
+                if key == _DONE:
+                    running -= 1
+                yield "checkpoint", encode_token(segments, state)
+            else:
+                raise msg[1]
+    finally:
+        stop.set()
+
+
+def ndjson_lines(events, checkpoint_every=10):
+    """
+    Linhas NDJSON (bytes). checkpoint_every=0 omite as linhas de checkpoint
+    (o trailer de fim/erro sai sempre).
+    """
+    pages = count = 0
+    last = None
+    try:
+        for kind, value in events:
+            if kind == "item":
+                yield dumps_bytes(value) + b"\n"
+                count += 1
+                continue
+            pages += 1
+            last = value
+            if checkpoint_every and pages % checkpoint_every == 0:
+                yield json.dumps({"_checkpoint": value}).encode() + b"\n"
+    except Exception as e:
+        # o status 200 já foi enviado: o erro vai numa linha e o stream termina
+        # normalmente (senão o gzip não fecha e o cliente não vê a linha)
+        print("Erro na exportação:", e)
+        yield json.dumps({"error": str(e), "_checkpoint": last}).encode() + b"\n"
+        return
+    if checkpoint_every and last and pages % checkpoint_every:
+        yield json.dumps({"_checkpoint": last}).encode() + b"\n"
+    yield json.dumps({"_complete": True, "count": count}).encode() + b"\n"
+
+
+def export_to_file(path, segments=4, fields=DEFAULT_FIELDS, token=None):
+    """
+    Exporta para um arquivo (.gz comprime). O token de cada página concluída vai
+    para <path>.checkpoint; com token=..., continua acrescentando ao mesmo arquivo.
+    Retorna (cartões exportados, último token).
+    """
+    count, last_token = 0, None
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "ab" if token else "wb") as out:
+        for kind, value in iter_cards(segments=segments, fields=fields, token=token):
+            if kind == "item":
+                out.write(dumps_bytes(value) + b"\n")
+                count += 1
+                continue
+            last_token = value
+            out.flush()
+            with open(f"{path}.checkpoint", "w") as cp:
+                cp.write(value)
+    return count, last_token
@@ -0,0 +1,125 @@
+# app/image_processing.py
+"""
+Processamento das imagens no upload.
+
+Remove EXIF (aplicando a rotação antes), limita as dimensões, recodifica
+para WebP/AVIF e gera as variantes de tamanho fixo usadas no srcset:
+
+  - avatar:  "128", "256"
+  - galeria: "thumb", "display"
+
+A recodificação é pesada em CPU, então roda num pool de processos para não
+travar os workers de request. Sem Pillow instalado (ou com
+IMAGE_PROCESSING=0) as imagens seguem como chegaram.
+"""
+import importlib.util
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_PROCESSING = os.getenv("IMAGE_PROCESSING", "1") not in ("0", "false", "no")
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP").upper()  # WEBP | AVIF
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "0"))  # 0 = os.cpu_count(); -1 = sem pool (inline)
+
+# nome da variante -> (largura, altura, recorte quadrado?)
+VARIANTS = {
+    "avatar": {"128": (128, 128, True), "256": (256, 256, True)},
+    "galeria": {"thumb": (320, 320, True), "display": (1080, 1080, False)},
+}
+
+_CONTENT_TYPES = {"WEBP": "image/webp", "AVIF": "image/avif"}
+
+
+_HAS_PIL = importlib.util.find_spec("PIL") is not None  # Pillow é opcional (e importado só no uso)
+
+
+def enabled() -> bool:
+    return IMAGE_PROCESSING and _HAS_PIL
+
+
+def signature(kind: str = None) -> str:
+    """Identifica tudo que muda a saída de process_image (chave do índice de conteúdo)."""
+    return f"{IMAGE_FORMAT}-q{IMAGE_QUALITY}-{IMAGE_MAX_DIMENSION}-{kind or ''}"
+
+
+def _output_format() -> str:
+    from PIL import features
+
+    if IMAGE_FORMAT == "AVIF" and features.check("avif"):
+        return "AVIF"
+    return "WEBP"
+
+
+def _encode(img, fmt) -> bytes:
+    buf = io.BytesIO()
+    opts = {"quality": IMAGE_QUALITY}
+    if fmt == "WEBP":
+        opts["method"] = 4
+    # sem exif=..., o Pillow não copia os metadados originais
+    img.save(buf, format=fmt, **opts)
+    return buf.getvalue()
+
+
+def process_image(data: bytes, kind: str = "galeria") -> dict:
+    """
+    Recodifica `data` (bytes ou caminho de arquivo) e gera as variantes de `kind`.
+
+    Retorna {"": (bytes, content_type, ext), "<variante>": (...), ...}, em que
+    "" é a imagem principal (limitada a IMAGE_MAX_DIMENSION). Levanta
+    ValueError se os bytes não forem uma imagem.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(data if isinstance(data, str) else io.BytesIO(data))
+        img = ImageOps.exif_transpose(img)
+    except Exception as e:
+        raise ValueError(f"Imagem inválida: {e}")
+
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+    fmt = _output_format()
+    content_type = _CONTENT_TYPES[fmt]
+    ext = fmt.lower()
+
+    main = img.copy()
+    main.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+    out = {"": (_encode(main, fmt), content_type, ext)}
+
+    for name, (w, h, crop) in VARIANTS.get(kind, {}).items():
+        if crop:
+            variant = ImageOps.fit(img, (w, h), Image.LANCZOS)
+        else:
+            variant = img.copy()
+            variant.thumbnail((w, h), Image.LANCZOS)
+        out[name] = (_encode(variant, fmt), content_type, ext)
+    return out
+
+
+# ---------- Pool de processos ----------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None and IMAGE_WORKERS >= 0:
+            try:
+                _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS or None)
+            except (OSError, NotImplementedError):
+                # ex.: Lambda sem /dev/shm -> processa no próprio worker
+                _pool = False
+    return _pool or None
+
+
+def process_image_async(data: bytes, kind: str = "galeria") -> dict:
+    """process_image no pool de processos (ou inline se não houver pool)."""
+    pool = _get_pool()
+    if pool is None:
+        return process_image(data, kind)
+    return pool.submit(process_image, data, kind).result()
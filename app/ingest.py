@@ -0,0 +1,236 @@
+# app/ingest.py
+"""
+Recebimento em streaming dos arquivos de um multipart/form-data.
+
+Por padrão o Werkzeug guarda cada arquivo inteiro (em memória ou num
+temporário) antes de a rota rodar. Aqui cada arquivo vai sendo escrito,
+pedaço por pedaço, direto no destino:
+
+  - S3MultipartSink: partes de um multipart upload no S3 (chave temporária
+    em incoming/, movida com CopyObject quando a rota decide a chave final)
+  - LocalSink: um arquivo em INGEST_TMP_DIR (fora do pacote: no Lambda só o
+    /tmp é gravável), movido para uploads/ quando a rota decide o nome
+
+Em ambos o tamanho é checado a cada escrita (413 assim que passa do
+limite) e o SHA-256 é calculado durante a cópia, então a memória por
+upload fica limitada ao buffer (uma parte no S3, 8 KB no disco).
+
+Ativado em main.py com app.request_class = StreamingRequest.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.config import Config
+
+_MIN_PART_SIZE = 5 * 1024 * 1024  # mínimo do S3 (exceto a última parte)
+
+
+class _HashingSink:
+    """Conta bytes, aplica o limite por arquivo e calcula o SHA-256 durante a escrita."""
+
+    def __init__(self, filename, content_type, max_bytes):
+        self.filename = filename
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hasher = hashlib.sha256()
+
+    def _account(self, b):
+        self.size += len(b)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Arquivo {self.filename!r} maior que {self.max_bytes} bytes")
+        self._hasher.update(b)
+
+    @property
+    def sha256(self):
+        return self._hasher.hexdigest()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+
+class LocalSink(_HashingSink):
+    def __init__(self, filename, content_type, max_bytes):
+        super().__init__(filename, content_type, max_bytes)
+        os.makedirs(Config.INGEST_TMP_DIR, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=Config.INGEST_TMP_DIR, prefix="in-")
+        self._f = os.fdopen(fd, "w+b")
+
+    def write(self, b):
+        self._account(b)
+        return self._f.write(b)
+
+    def read(self, n=-1):
+        return self._f.read(n)
+
+    def readline(self, n=-1):
+        return self._f.readline(n)
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def flush(self):
+        self._f.flush()
+
+    def promote(self, dest_path):
+        """
+        Move o arquivo recebido para o destino final. No mesmo sistema de
+        arquivos é um rename; senão o shutil.move copia para um nome
+        temporário ao lado do destino, e o os.replace final garante que ninguém
+        vê o arquivo pela metade.
+        """
+        self._f.flush()
+        tmp = os.path.join(os.path.dirname(dest_path), f".{uuid.uuid4().hex}.part")
+        try:
+            shutil.move(self.path, tmp)
+            os.replace(tmp, dest_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.path = None
+
+    @property
+    def closed(self):
+        return self._f.closed
+
+    def close(self):
+        self._f.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class S3MultipartSink(_HashingSink):
+    def __init__(self, filename, content_type, max_bytes, part_size):
+        super().__init__(filename, content_type, max_bytes)
+        from app.storage import get_s3, bucket
+
+        self._s3 = get_s3()
+        self.bucket = bucket()
+        self.key = f"{Config.INGEST_S3_PREFIX.strip('/')}/{uuid.uuid4().hex}"
+        self.part_size = max(part_size, _MIN_PART_SIZE)
+        self._buf = bytearray()
+        self._parts = []
+        self._body = None
+        self.completed = False
+        self.promoted = False
+        self.closed = False
+        self.upload_id = self._s3.create_multipart_upload(
+            Bucket=self.bucket, Key=self.key, ContentType=content_type or "application/octet-stream"
+        )["UploadId"]
+
+    def _send_part(self, data):
+        number = len(self._parts) + 1
+        resp = self._s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=bytes(data)
+        )
+        self._parts.append({"PartNumber": number, "ETag": resp["ETag"]})
+
+    def write(self, b):
+        self._account(b)
+        self._buf.extend(b)
+        while len(self._buf) >= self.part_size:
+            self._send_part(self._buf[: self.part_size])
+            del self._buf[: self.part_size]
+        return len(b)
+
+    def _complete(self):
+        if self._buf or not self._parts:
+            self._send_part(self._buf)
+            self._buf = bytearray()
+        self._s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+        self.completed = True
+
+    def seek(self, offset, whence=0):
+        # o parser do Werkzeug chama seek(0) quando termina o arquivo
+        if not self.completed:
+            self._complete()
+        if offset == 0 and whence == 0:
+            self._body = None
+            return 0
+        raise OSError("S3MultipartSink só volta para o início")
+
+    def tell(self):
+        return 0 if self._body is None else -1
+
+    def read(self, n=-1):
+        # leitura (rara) direto do objeto temporário, em streaming
+        if self._body is None:
+            self._body = self._s3.get_object(Bucket=self.bucket, Key=self.key)["Body"]
+        return self._body.read(None if n is None or n < 0 else n)
+
+    def readline(self, n=-1):
+        return self.read(n)
+
+    def flush(self):
+        pass
+
+    def promote(self, key, extra_args):
+        """Copia (no servidor) o objeto temporário para a chave final e apaga o temporário."""
+        if not self.completed:
+            self._complete()
+        self._s3.copy_object(
+            Bucket=self.bucket, Key=key,
+            CopySource={"Bucket": self.bucket, "Key": self.key},
+            MetadataDirective="REPLACE", **extra_args,
+        )
+        self._s3.delete_object(Bucket=self.bucket, Key=self.key)
+        self.promoted = True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if not self.completed:
+                self._s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            elif not self.promoted:
+                self._s3.delete_object(Bucket=self.bucket, Key=self.key)
+        except Exception as e:
+            print("Erro ao limpar upload temporário:", e)
+
+
+def new_sink(total_content_length, content_type, filename):
+    """Escolhe o destino: S3 direto só para arquivos grandes que não serão reprocessados."""
+    from app import image_processing, storage
+
+    max_bytes = Config.UPLOAD_MAX_BYTES
+    large = total_content_length is None or total_content_length >= Config.INGEST_PART_SIZE
+    if Config.INGEST_TARGET == "s3" and storage.uses_s3() and large and not image_processing.enabled():
+        return S3MultipartSink(filename, content_type, max_bytes, Config.INGEST_PART_SIZE)
+    return LocalSink(filename, content_type, max_bytes)
+
+
+class StreamingRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        sink = new_sink(total_content_length, content_type, filename)
+        self.__dict__.setdefault("_ingest_sinks", []).append(sink)
+        return sink
+
+    def close(self):
+        # inclui arquivos de um parse interrompido (ex.: 413 no meio do upload)
+        try:
+            super().close()
+        finally:
+            for sink in self.__dict__.get("_ingest_sinks", ()):
+                sink.close()
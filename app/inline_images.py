@@ -0,0 +1,340 @@
+# app/inline_images.py
+"""
+Migração das imagens inline (data:image/...;base64,...) dos cartões.
+
+Cartões antigos guardam a galeria (e às vezes a foto) como base64 dentro do
+próprio registro. Aqui cada imagem inline é decodificada, enviada por
+app.storage.upload_image e trocada pela URL no cartão.
+
+Fontes:
+  - cards.json: lido em streaming (um cartão por vez) e regravado num
+    arquivo temporário que substitui o original no final
+  - DynamoDB: scan paginado em segmentos paralelos, escrita condicional
+    (só grava se a versão do cartão não mudou)
+
+O progresso vai para um arquivo de checkpoint, então uma execução
+interrompida pode ser retomada sem reenviar imagens. Em dry-run nada é
+enviado nem gravado; só os bytes economizados são calculados.
+"""
+import base64
+import binascii
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from werkzeug.datastructures import FileStorage
+
+from app import content_index
+from app.storage import upload_image
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/gif": "gif"}
+
+
+def is_inline(value) -> bool:
+    return isinstance(value, str) and value.startswith("data:")
+
+
+def _decode_data_uri(uri: str):
+    """data:image/png;base64,AAAA -> (bytes, mimetype)."""
+    header, _, payload = uri.partition(",")
+    mimetype = header[5:].split(";", 1)[0] or "application/octet-stream"
+    try:
+        return base64.b64decode(payload), mimetype
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"base64 inválido: {e}")
+
+
+# ---------- Leitura em streaming do cards.json ----------
+def iter_json_object(fp, chunk_size=1 << 16):
+    """
+    Percorre um objeto JSON de topo ({"id": {...}, ...}) sem carregá-lo inteiro,
+    devolvendo (chave, valor) um de cada vez.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill(min_size):
+        nonlocal buf, pos, eof
+        buf = buf[pos:]
+        pos = 0
+        while not eof and len(buf) < min_size:
+            chunk = fp.read(max(chunk_size, min_size - len(buf)))
+            if not chunk:
+                eof = True
+            buf += chunk
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill(chunk_size)
+
+    def decode():
+        nonlocal pos
+        need = chunk_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # número no fim do buffer pode estar cortado
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            need *= 2  # valor maior que o buffer: lê mais e tenta de novo
+            fill(len(buf) - pos + need)
+
+    fill(chunk_size)
+    skip_ws()
+    if pos >= len(buf) or buf[pos] != "{":
+        raise ValueError("Esperado um objeto JSON")
+    pos += 1
+    while True:
+        skip_ws()
+        if pos >= len(buf):
+            raise ValueError("JSON truncado")
+        if buf[pos] == "}":
+            return
+        key = decode()
+        skip_ws()
+        if buf[pos] != ":":
+            raise ValueError("Esperado ':'")
+        pos += 1
+        skip_ws()
+        yield key, decode()
+
+
+# ---------- Checkpoint ----------
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"cards": {}, "segments": {}}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def card(self, card_id):
+        return self.data["cards"].get(card_id)
+
+    def mark_card(self, card_id, new_fields):
+        with self._lock:
+            self.data["cards"][card_id] = new_fields
+            self._flush()
+
+    def segment(self, segment):
+        return self.data["segments"].get(str(segment))
+
+    def mark_segment(self, segment, last_key):
+        with self._lock:
+            self.data["segments"][str(segment)] = last_key if last_key else "done"
+            self._flush()
+
+    def _flush(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+# ---------- Migração ----------
+def migrate_card(card, dry_run=False):
+    """
+    Troca as imagens inline do cartão por URLs.
+    Retorna (campos_novos | None, relatório). campos_novos é None se não havia nada a migrar.
+    """
+    card_id = card["card_id"]
+    report = {"card_id": card_id, "images": 0, "bytes_before": 0, "bytes_after": 0, "errors": []}
+
+    def convert(value, key_prefix, index):
+        if not is_inline(value):
+            return value
+        report["images"] += 1
+        report["bytes_before"] += len(value)
+        if dry_run:
+            # estimativa: a URL final tem ~120 caracteres
+            report["bytes_after"] += 120
+            return value
+        data, mimetype = _decode_data_uri(value)
+        ext = _EXTENSIONS.get(mimetype, "bin")
+        url = upload_image(
+            FileStorage(stream=io.BytesIO(data), filename=f"inline-{index}.{ext}", content_type=mimetype),
+            key_prefix=key_prefix,
+        )
+        report["bytes_after"] += len(url)
+        return url
+
+    new_fields = {}
+    try:
+        if is_inline(card.get("foto_perfil")):
+            new_fields["foto_perfil"] = convert(card["foto_perfil"], f"cards/{card_id}/avatar", 0)
+        galeria = card.get("galeria")
+        if isinstance(galeria, list) and any(is_inline(u) for u in galeria):
+            new_fields["galeria"] = [convert(u, f"cards/{card_id}/galeria", i) for i, u in enumerate(galeria)]
+    except ValueError as e:
+        report["errors"].append(str(e))
+        return None, report
+
+    report["saved"] = report["bytes_before"] - report["bytes_after"]
+    return (new_fields or None), report
+
+
+def _migrated_urls(card, new_fields):
+    """URLs que entraram no lugar de imagens inline (as que já eram URL não contam de novo)."""
+    urls = []
+    if is_inline(card.get("foto_perfil")) and new_fields.get("foto_perfil"):
+        urls.append(new_fields["foto_perfil"])
+    for old, new in zip(card.get("galeria") or [], new_fields.get("galeria") or []):
+        if is_inline(old) and new:
+            urls.append(new)
+    return urls
+
+
+def _retain(urls, report=None):
+    """
+    Conta as imagens migradas como usadas pelo cartão: sem isso a fila de
+    limpeza veria 0 referências e apagaria um objeto que outro cartão soltou.
+    """
+    try:
+        content_index.update_refs(urls, ())
+    except Exception as e:
+        print("Erro ao registrar referências das imagens migradas:", e)
+        if report is not None:
+            report["errors"].append(f"referências não registradas: {e}")
+
+
+def migrate_json_file(path, checkpoint=None, dry_run=False, on_report=print):
+    """Migra o cards.json em streaming e o substitui atomicamente no final."""
+    checkpoint = checkpoint or Checkpoint(None)
+    tmp = f"{path}.migrating"
+    out = None if dry_run else open(tmp, "w", encoding="utf-8")
+    first = True
+    # contadas só depois de o arquivo novo entrar no lugar; inclui as que vieram do
+    # checkpoint (execução interrompida antes do replace): contar a mais só adia a limpeza
+    retained = []
+    try:
+        with open(path, "r", encoding="utf-8") as src:
+            if out:
+                out.write("{")
+            for card_id, card in iter_json_object(src):
+                done = checkpoint.card(card_id)
+                if done is not None:
+                    retained += _migrated_urls(card, done)
+                    card.update(done)
+                else:
+                    new_fields, report = migrate_card(card, dry_run=dry_run)
+                    if report["images"] or report["errors"]:
+                        on_report(report)
+                    if new_fields and not dry_run:
+                        retained += _migrated_urls(card, new_fields)
+                        card.update(new_fields)
+                        checkpoint.mark_card(card_id, new_fields)
+                if out:
+                    body = json.dumps(card, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+                    out.write(f'{"" if first else ","}\n  {json.dumps(card_id)}: {body}')
+                    first = False
+        if out:
+            out.write("\n}")
+            out.close()
+            os.replace(tmp, path)
+            if retained:
+                _retain(retained)
+    finally:
+        if out and not out.closed:
+            out.close()
+
+
+def _stamped_update(table, card_id, new_fields, current_version):
+    """Grava só os campos migrados, se a versão do cartão não mudou."""
+    names = {"#v": "version", "#u": "updated_at"}
+    values = {
+        ":nv": int(current_version or 0) + 1,
+        ":u": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    sets = ["#v = :nv", "#u = :u"]
+    for i, (field, value) in enumerate(new_fields.items()):
+        names[f"#f{i}"] = field
+        values[f":f{i}"] = value
+        sets.append(f"#f{i} = :f{i}")
+    if current_version is None:
+        condition = "attribute_not_exists(#v)"
+    else:
+        condition = "#v = :cv"
+        values[":cv"] = current_version
+    table.update_item(
+        Key={"card_id": card_id},
+        UpdateExpression="SET " + ", ".join(sets),
+        ConditionExpression=condition,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def migrate_dynamo_table(table, segments=4, checkpoint=None, dry_run=False, page_size=100, on_report=print):
+    """Scan paralelo em `segments` segmentos, retomável pelo checkpoint."""
+    from botocore.exceptions import ClientError
+
+    checkpoint = checkpoint or Checkpoint(None)
+    totals = {"cards": 0, "images": 0, "saved": 0, "conflicts": 0, "errors": 0}
+    totals_lock = threading.Lock()
+
+    def run_segment(segment):
+        start = checkpoint.segment(segment)
+        if start == "done":
+            return
+        kwargs = {
+            "Segment": segment,
+            "TotalSegments": segments,
+            "Limit": page_size,
+            "ProjectionExpression": "card_id, foto_perfil, galeria, #v",
+            "ExpressionAttributeNames": {"#v": "version"},
+        }
+        if start:
+            kwargs["ExclusiveStartKey"] = start
+        while True:
+            resp = table.scan(**kwargs)
+            for item in resp.get("Items", []):
+                if checkpoint.card(item["card_id"]) is not None:
+                    continue
+                new_fields, report = migrate_card(item, dry_run=dry_run)
+                status = "errors" if report["errors"] else None
+                if new_fields and not dry_run:
+                    try:
+                        _stamped_update(table, item["card_id"], new_fields, item.get("version"))
+                        # gravado: as URLs novas passam a contar como referências do cartão
+                        _retain(_migrated_urls(item, new_fields), report)
+                        checkpoint.mark_card(item["card_id"], {})
+                    except ClientError as e:
+                        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                            raise
+                        # cartão editado durante a migração: não é marcado no checkpoint
+                        report["errors"].append("alterado durante a migração")
+                        status = "conflicts"
+                if report["images"] or report["errors"]:
+                    on_report(report)
+                with totals_lock:
+                    totals["cards"] += 1
+                    totals["images"] += report["images"]
+                    totals["saved"] += report.get("saved", 0)
+                    if status:
+                        totals[status] += 1
+            last_key = resp.get("LastEvaluatedKey")
+            if not dry_run:
+                checkpoint.mark_segment(segment, last_key)
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+
+    with ThreadPoolExecutor(max_workers=segments, thread_name_prefix="migrate") as pool:
+        for fut in [pool.submit(run_segment, s) for s in range(segments)]:
+            fut.result()
+    return totals
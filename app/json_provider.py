@@ -0,0 +1,91 @@
+# app/json_provider.py
+"""
+Serialização JSON do app (jsonify, request.json, export NDJSON).
+
+Usa o orjson quando instalado (bem mais rápido nos cartões com galeria
+grande) e cai no json da biblioteca padrão senão. Os dois usam o mesmo
+formato (chaves ordenadas, compacto, UTF-8 sem escapes), mas a saída não é
+idêntica byte a byte: floats pequenos (0.00001 x 1e-05), NaN/Infinity (null
+x NaN) e inteiros acima de 64 bits (o orjson recusa) saem diferentes. Como
+o ETag é o hash do corpo, todos os workers devem ter (ou não ter) o orjson.
+
+Tipos que o DynamoDB/boto3 devolve:
+  - Decimal  -> número: int quando inteiro, senão float. Antes saía como
+    string ("12"); clientes que liam esses campos como texto passam a
+    receber números.
+  - datetime/date -> ISO 8601
+  - set      -> lista ordenada
+"""
+import dataclasses
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # opcional
+    orjson = None
+
+_ORJSON_OPTIONS = (
+    orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson else 0
+)
+
+
+def json_default(o):
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, (set, frozenset)):
+        return sorted(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, "__html__"):
+        return str(o.__html__())
+    raise TypeError(f"Tipo não serializável: {type(o)!r}")
+
+
+def dumps_bytes(obj):
+    """JSON compacto em UTF-8 (bytes), com chaves ordenadas."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        obj, default=json_default, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class GetiCardJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            return dumps_bytes(obj).decode("utf-8")
+        kwargs.setdefault("default", json_default)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            body = self.dumps(obj, indent=2).encode("utf-8")
+        else:
+            body = dumps_bytes(obj)  # sem passar por str
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json_provider_class = GetiCardJSONProvider
+    app.json = GetiCardJSONProvider(app)
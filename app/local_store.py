@@ -0,0 +1,136 @@
+# app/local_store.py
+"""
+Persistência local (sem AWS) dos cartões e usuários em SQLite.
+
+Substitui o antigo cards.json, que era relido inteiro no import e
+regravado inteiro a cada save. Aqui cada cartão é uma linha: a escrita é
+incremental, o WAL deixa vários workers do gunicorn lerem/escreverem o
+mesmo arquivo com segurança e há índice por card_id e por emailContato.
+
+O banco só é aberto no primeiro uso. Se ainda não existir e houver um
+cards.json ao lado, ele é importado automaticamente.
+"""
+import json
+import os
+import sqlite3
+import threading
+from decimal import Decimal
+
+from app.config import Config
+
+
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    raise TypeError(f"Tipo não serializável: {type(o)!r}")
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, default=_json_default)
+
+
+class LocalCardStore:
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            self._init_schema(conn)
+        return conn
+
+    def _init_schema(self, conn):
+        with self._init_lock:
+            if self._ready:
+                return
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cards ("
+                " card_id TEXT PRIMARY KEY, email TEXT, data TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cards_email ON cards(email)")
+            conn.execute("CREATE TABLE IF NOT EXISTS users (email TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            empty = conn.execute("SELECT 1 FROM cards LIMIT 1").fetchone() is None
+            if empty and self.legacy_json and os.path.exists(self.legacy_json):
+                # as outras threads esperam o import terminar em vez de ler o banco vazio;
+                # se ele falhar, _ready fica False e o próximo uso tenta de novo
+                self._import_json(conn, self.legacy_json)
+            self._ready = True
+
+    # ---------- Cartões ----------
+    def save_card(self, card):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cards (card_id, email, data) VALUES (?, ?, ?)",
+            (card["card_id"], card.get("emailContato"), _dumps(card)),
+        )
+
+    def get_card(self, card_id):
+        row = self._conn().execute("SELECT data FROM cards WHERE card_id = ?", (card_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_card_by_email(self, email):
+        row = self._conn().execute(
+            "SELECT data FROM cards WHERE email = ? ORDER BY rowid LIMIT 1", (email,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_card(self, card_id):
+        self._conn().execute("DELETE FROM cards WHERE card_id = ?", (card_id,))
+
+    # ---------- Usuários ----------
+    def save_user(self, user):
+        try:
+            self._conn().execute(
+                "INSERT INTO users (email, data) VALUES (?, ?)", (user["email"], _dumps(user))
+            )
+        except sqlite3.IntegrityError:
+            raise RuntimeError("Usuário já existe")
+
+    def get_user(self, email):
+        row = self._conn().execute("SELECT data FROM users WHERE email = ?", (email,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # ---------- Importação ----------
+    def import_json(self, path):
+        """Importa um cards.json ({card_id: cartão}) em streaming, numa transação. Retorna o total."""
+        return self._import_json(self._conn(), path)
+
+    def _import_json(self, conn, path):
+        from app.inline_images import iter_json_object
+
+        count = 0
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                conn.execute("BEGIN")
+                for card_id, card in iter_json_object(f):
+                    card.setdefault("card_id", card_id)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cards (card_id, email, data) VALUES (?, ?, ?)",
+                        (card["card_id"], card.get("emailContato"), _dumps(card)),
+                    )
+                    count += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_local_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalCardStore(Config.LOCAL_STORE_PATH, legacy_json=Config.LOCAL_CARDS_JSON)
+    return _store
@@ -0,0 +1,363 @@
+# app/metrics.py
+"""
+Métricas de latência do app, no formato texto do Prometheus (GET /metrics,
+com "Authorization: Bearer <METRICS_TOKEN>" ou o JWT de um ADMIN_EMAILS).
+
+  - middleware: histograma de latência e contagem de status por rota
+  - botocore: cada chamada DynamoDB/S3 cronometrada por operação (hooks
+    before-call/after-call em todo client criado por app/aws.py), com o
+    ConsumedCapacity das tabelas somado por operação
+  - span("jwt"), span("json")...: trechos do próprio código
+  - Server-Timing (METRICS_SERVER_TIMING=1): o total de cada trecho/serviço
+    da requisição vai no cabeçalho e aparece no DevTools do navegador
+  - profiler por amostragem (/debug/profiler, mesma autorização): junta as
+    pilhas de todas as threads a cada N ms no formato "collapsed" (flamegraph)
+
+As métricas são por processo; com vários workers do gunicorn cada um
+responde pelas suas (o Prometheus soma por instância).
+"""
+import hmac
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, abort, g, has_request_context, jsonify, request
+
+from app.config import Config
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ---------- Registro ----------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [contagem por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    row[i] += 1
+                    break
+            row[-2] += seconds
+            row[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = _labels(self.labelnames, key, [f'le="{bound}"'])
+                yield f"{self.name}_bucket{le} {cumulative}"
+            le = _labels(self.labelnames, key, ['le="+Inf"'])
+            yield f"{self.name}_bucket{le} {row[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {row[-2]:.6f}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {row[-1]}"
+
+
+REQUEST_SECONDS = Histogram("geticard_http_request_duration_seconds", "Latência das requisições por rota.", ("method", "route"))
+REQUESTS = Counter("geticard_http_requests_total", "Requisições por rota e status.", ("method", "route", "status"))
+AWS_SECONDS = Histogram("geticard_aws_call_duration_seconds", "Latência das chamadas AWS (com retries).", ("service", "operation"))
+AWS_CALLS = Counter("geticard_aws_calls_total", "Chamadas AWS por resultado.", ("service", "operation", "outcome"))
+CAPACITY = Counter("geticard_dynamodb_consumed_capacity_total", "Capacidade consumida (RCU+WCU).", ("table", "operation"))
+SPAN_SECONDS = Histogram("geticard_span_duration_seconds", "Trechos cronometrados com span().", ("span",))
+RATE_LIMITED = Counter("geticard_rate_limited_total", "Requisições recusadas (429 por cliente, 503 por sobrecarga).", ("group", "reason"))
+VIEW_FLUSH = Counter("geticard_view_flush_total", "Pares (cartão, hora) de visualizações gravados no flush.", ("outcome",))
+_REGISTRY = (REQUEST_SECONDS, REQUESTS, AWS_SECONDS, AWS_CALLS, CAPACITY, SPAN_SECONDS, RATE_LIMITED, VIEW_FLUSH)
+
+
+class LatencyAverage:
+    """Média móvel exponencial de uma latência; sem amostras por `stale` segundos volta a 0."""
+
+    def __init__(self, alpha=0.2, stale=10.0):
+        self.alpha, self.stale = alpha, stale
+        self._value, self._updated = 0.0, 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._updated > self.stale:
+                self._value = seconds
+            else:
+                self._value += self.alpha * (seconds - self._value)
+            self._updated = now
+
+    def value(self):
+        with self._lock:
+            return self._value if time.monotonic() - self._updated <= self.stale else 0.0
+
+
+aws_latency = LatencyAverage()  # lida pelo controle de admissão (app/rate_limit.py)
+
+
+def render():
+    lines = [line for metric in _REGISTRY for line in metric.render()]
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Tempo por requisição (Server-Timing) ----------
+def _add_timing(name, seconds):
+    if not has_request_context():
+        return
+    timings = g.setdefault("_timings", {})
+    total, count = timings.get(name, (0.0, 0))
+    timings[name] = (total + seconds, count + 1)
+
+
+@contextmanager
+def span(name):
+    """Cronometra um trecho (histograma + Server-Timing da requisição atual)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, span=name)
+        _add_timing(name, elapsed)
+
+
+def _server_timing(total):
+    parts = [f"app;dur={total * 1000:.1f}"]
+    for name, (seconds, count) in g.get("_timings", {}).items():
+        desc = f';desc="{count}x"' if count > 1 else ""
+        parts.append(f"{name};dur={seconds * 1000:.1f}{desc}")
+    return ", ".join(parts)
+
+
+# ---------- botocore ----------
+_CAPACITY_OPS = {
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+}
+
+
+def _service_op(event_name):
+    # "before-call.dynamodb.GetItem" -> ("dynamodb", "GetItem")
+    parts = event_name.split(".")
+    return parts[1], parts[2]
+
+
+def _ask_capacity(params, model, **kwargs):
+    if model.name in _CAPACITY_OPS:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _before_call(context, **kwargs):
+    context["_metrics_start"] = time.perf_counter()
+
+
+def _after_call(event_name, context, parsed=None, http_response=None, **kwargs):
+    start = context.pop("_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    service, operation = _service_op(event_name)
+    status = getattr(http_response, "status_code", 200)
+    AWS_SECONDS.observe(elapsed, service=service, operation=operation)
+    AWS_CALLS.inc(service=service, operation=operation, outcome="ok" if status < 400 else "error")
+    aws_latency.observe(elapsed)
+    _add_timing(service, elapsed)
+
+    consumed = (parsed or {}).get("ConsumedCapacity")
+    for entry in consumed if isinstance(consumed, list) else [consumed] if consumed else []:
+        CAPACITY.inc(entry.get("CapacityUnits", 0), table=entry.get("TableName", ""), operation=operation)
+
+
+def _after_call_error(event_name, context, exception=None, **kwargs):
+    start = context.pop("_metrics_start", None)
+    if start is None:
+        return
+    service, operation = _service_op(event_name)
+    elapsed = time.perf_counter() - start
+    AWS_SECONDS.observe(elapsed, service=service, operation=operation)
+    AWS_CALLS.inc(service=service, operation=operation, outcome="exception")
+    aws_latency.observe(elapsed)
+
+
+def instrument_client(client):
+    """Pendura os hooks de tempo (e de ConsumedCapacity) num client do botocore."""
+    if not Config.METRICS_ENABLED:
+        return client
+    events = client.meta.events
+    events.register("before-call.*.*", _before_call, unique_id="geticard-metrics-before")
+    events.register("after-call.*.*", _after_call, unique_id="geticard-metrics-after")
+    events.register("after-call-error.*.*", _after_call_error, unique_id="geticard-metrics-error")
+    if Config.METRICS_DYNAMO_CAPACITY and client.meta.service_model.service_name == "dynamodb":
+        events.register("provide-client-params.dynamodb.*", _ask_capacity, unique_id="geticard-metrics-capacity")
+    return client
+
+
+# ---------- Profiler por amostragem ----------
+class SamplingProfiler:
+    """Amostra as pilhas de todas as threads (exceto a própria) a cada `interval` segundos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = {}
+        self.started_at = None
+        self.interval = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=30, interval=0.005):
+        with self._lock:
+            if self.running:
+                return False
+            self.samples, self.started_at, self.interval = {}, time.time(), interval
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds, interval), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, seconds, interval):
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                with self._lock:
+                    self.samples[key] = self.samples.get(key, 0) + 1
+
+    def collapsed(self):
+        """Uma linha por pilha: "f1;f2;f3 N" (entrada do flamegraph.pl/speedscope)."""
+        with self._lock:
+            items = sorted(self.samples.items(), key=lambda kv: kv[1], reverse=True)
+        return "".join(f"{stack} {n}\n" for stack, n in items)
+
+
+profiler = SamplingProfiler()
+
+
+# ---------- Flask ----------
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def authorized():
+    """
+    Acesso a métricas e rotas de diagnóstico: "Bearer <METRICS_TOKEN>" (scrape
+    do Prometheus) ou o JWT de acesso de alguém em ADMIN_EMAILS. Sem token
+    configurado e sem admin, nada é exposto.
+    """
+    import jwt
+
+    auth_header = request.headers.get("Authorization") or ""
+    expected = f"Bearer {Config.METRICS_TOKEN}".encode()
+    if Config.METRICS_TOKEN and hmac.compare_digest(auth_header.encode(), expected):
+        return True
+    try:
+        payload = jwt.decode(auth_header.split(" ")[1], Config.SECRET_KEY, algorithms=["HS256"])
+    except Exception:
+        return False
+    return payload.get("sub") in Config.ADMIN_EMAILS
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    if not authorized():
+        abort(403)
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+@metrics_bp.route("/debug/profiler", methods=["GET", "POST", "DELETE"])
+def profiler_endpoint():
+    """POST ?seconds=30&interval_ms=5 inicia; DELETE para; GET devolve as pilhas (collapsed)."""
+    if not authorized():
+        abort(403)
+    if request.method == "POST":
+        try:
+            seconds = float(request.args.get("seconds", 30))
+            interval_ms = float(request.args.get("interval_ms", 5))
+        except ValueError:
+            return jsonify({"error": "seconds e interval_ms devem ser números"}), 400
+        if not (math.isfinite(seconds) and seconds > 0 and math.isfinite(interval_ms) and interval_ms > 0):
+            return jsonify({"error": "seconds e interval_ms devem ser maiores que zero"}), 400
+        seconds = min(seconds, 600)
+        interval = max(interval_ms, 1) / 1000
+        started = profiler.start(seconds, interval)
+        return jsonify({"started": started, "running": profiler.running}), 202 if started else 409
+    if request.method == "DELETE":
+        profiler.stop()
+        return jsonify({"running": False}), 200
+    return Response(profiler.collapsed(), mimetype="text/plain")
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    start = g.pop("_metrics_start", None)
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    route = request.url_rule.rule if request.url_rule else "<unmatched>"
+    REQUEST_SECONDS.observe(total, method=request.method, route=route)
+    REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+    if Config.METRICS_SERVER_TIMING:
+        response.headers["Server-Timing"] = _server_timing(total)
+    return response
+
+
+def init_app(app):
+    if not Config.METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.register_blueprint(metrics_bp)
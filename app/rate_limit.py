@@ -0,0 +1,297 @@
+# app/rate_limit.py
+"""
+Controle de admissão das rotas que chegam no DynamoDB.
+
+Limite por cliente (token bucket), por grupo de rotas:
+  - auth  (/register, /login):         por IP e pelo email do corpo
+  - write (criar/editar/apagar/upload): por IP e pelo email do token
+  - read  (GET /card, batchGet):        por IP
+Cada regra é "N/S": rajada de até N requisições, repostas à taxa de N a cada
+S segundos. Estourou -> 429 com Retry-After.
+
+Backends dos baldes:
+  - "memory": dict por processo (padrão)
+  - "sqlite": arquivo local compartilhado pelos workers do gunicorn
+  - "off":    desliga os limites por cliente
+
+Limite global (por processo): no máximo ADMISSION_MAX_INFLIGHT requisições
+desses grupos ao mesmo tempo. Quando a latência média das chamadas AWS
+(metrics.aws_latency) passa de ADMISSION_LATENCY_MS, auth/write caem para
+ADMISSION_DEGRADED_INFLIGHT: a leitura de cartões continua, e o resto
+recebe 503 + Retry-After logo na entrada, em vez de empilhar no DynamoDB.
+
+    @routes.route("/login", methods=["POST"])
+    @rate_limited("auth", email_field="email")
+    def login(): ...
+"""
+import inspect
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request
+
+from app import metrics
+from app.config import Config
+
+_PROTECTED_UNDER_LOAD = ("auth", "write")  # a leitura de cartões é o que mais importa
+
+
+def parse_rule(rule):
+    """"10/60" -> (capacidade 10, 10/60 fichas por segundo); "" -> None (sem limite)."""
+    if not rule:
+        return None
+    count, _, seconds = rule.partition("/")
+    count, seconds = float(count), float(seconds or 1)
+    return count, count / seconds
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    if tokens is None:
+        return capacity
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+def _decide(tokens, capacity, rate, cost):
+    """(permitido, fichas depois, segundos até ter `cost` fichas)."""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate if rate else math.inf
+
+
+# ---------- Backends ----------
+class MemoryBucketBackend:
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}  # chave -> (fichas, atualizado em)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (None, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            allowed, tokens, retry_after = _decide(tokens, capacity, rate, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now):
+        # balde ocioso há 1h já se encheu de novo: apagar é o mesmo que mantê-lo cheio
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for k in stale:
+            del self._buckets[k]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketBackend:
+    """Baldes compartilhados entre processos na mesma máquina (arquivo SQLite em WAL)."""
+
+    _PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # perder baldes num crash não importa
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0] if row else None, row[1] if row else now, now, capacity, rate)
+            allowed, tokens, retry_after = _decide(tokens, capacity, rate, cost)
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._takes += 1
+        if self._takes % self._PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 3600,))
+        return allowed, retry_after
+
+    def clear(self):
+        self._conn().execute("DELETE FROM buckets")
+
+
+def build_backend():
+    kind = Config.RATE_LIMIT_BACKEND
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        return SQLiteBucketBackend(Config.RATE_LIMIT_PATH)
+    return MemoryBucketBackend()
+
+
+_backend = build_backend()
+
+
+# ---------- Limite por cliente ----------
+def _rules():
+    return {
+        ("auth", "ip"): parse_rule(Config.RATE_LIMIT_AUTH),
+        ("auth", "email"): parse_rule(Config.RATE_LIMIT_AUTH_EMAIL),
+        ("write", "ip"): parse_rule(Config.RATE_LIMIT_WRITE),
+        ("write", "email"): parse_rule(Config.RATE_LIMIT_WRITE_EMAIL),
+        ("read", "ip"): parse_rule(Config.RATE_LIMIT_READ),
+    }
+
+
+_RULES = _rules()
+
+
+def client_ip():
+    """IP do cliente; atrás de N proxies confiáveis, o N-ésimo da direita no X-Forwarded-For."""
+    hops = Config.RATE_LIMIT_TRUSTED_PROXIES
+    if hops:
+        forwarded = [p.strip() for p in request.headers.get("X-Forwarded-For", "").split(",") if p.strip()]
+        if len(forwarded) >= hops:
+            return forwarded[-hops]
+    return request.remote_addr or "-"
+
+
+def check(group, email=None):
+    """Consome uma ficha de cada balde do grupo. Retorna segundos de espera (0 = liberado)."""
+    if _backend is None:
+        return 0
+    keys = [("ip", client_ip())]
+    if email:
+        keys.append(("email", str(email).strip().lower()))
+    wait = 0
+    for kind, value in keys:
+        rule = _RULES.get((group, kind))
+        if rule is None:
+            continue
+        allowed, retry_after = _backend.take(f"{group}:{kind}:{value}", *rule)
+        if not allowed:
+            wait = max(wait, retry_after)
+    return wait
+
+
+# ---------- Limite global ----------
+class AdmissionController:
+    def __init__(self, max_inflight, degraded_inflight, latency_ms):
+        self.max_inflight = max_inflight
+        self.degraded_inflight = degraded_inflight
+        self.latency_ms = latency_ms
+        self.inflight = {}
+        self.shed = {}
+        self._lock = threading.Lock()
+
+    def degraded(self):
+        return bool(self.latency_ms) and metrics.aws_latency.value() * 1000 > self.latency_ms
+
+    def acquire(self, group):
+        with self._lock:
+            total = sum(self.inflight.values())
+            limit = self.max_inflight
+            if group in _PROTECTED_UNDER_LOAD and self.degraded():
+                limit = self.degraded_inflight
+                total = sum(self.inflight.get(g, 0) for g in _PROTECTED_UNDER_LOAD)
+            if limit and total >= limit:
+                self.shed[group] = self.shed.get(group, 0) + 1
+                return False
+            self.inflight[group] = self.inflight.get(group, 0) + 1
+            return True
+
+    def release(self, group):
+        with self._lock:
+            self.inflight[group] -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "inflight": dict(self.inflight),
+                "shed": dict(self.shed),
+                "degraded": self.degraded(),
+                "aws_latency_ms": round(metrics.aws_latency.value() * 1000, 1),
+            }
+
+
+admission = AdmissionController(
+    Config.ADMISSION_MAX_INFLIGHT, Config.ADMISSION_DEGRADED_INFLIGHT, Config.ADMISSION_LATENCY_MS
+)
+
+
+# ---------- Decorator ----------
+def _too_many(wait):
+    resp = jsonify({"error": "Muitas requisições. Tente novamente em instantes."})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+    return resp
+
+
+def _overloaded():
+    resp = jsonify({"error": "Serviço sobrecarregado. Tente novamente em instantes."})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "1"
+    return resp
+
+
+def rate_limited(group, email_field=None):
+    """
+    Aplica os limites do grupo. email_field: campo do JSON (ou do formulário,
+    em multipart) com o email, para rotas sem login. Abaixo de @token_required,
+    o email do token (1º argumento) é usado.
+    """
+    def refuse(args):
+        if email_field:
+            body = request.get_json(silent=True)
+            email = body.get(email_field) if isinstance(body, dict) else request.form.get(email_field)
+        else:
+            email = args[0] if args else None
+        wait = check(group, email if isinstance(email, str) else None)
+        if wait:
+            metrics.RATE_LIMITED.inc(group=group, reason="client")
+            return _too_many(wait)
+        if not admission.acquire(group):
+            metrics.RATE_LIMITED.inc(group=group, reason="overload")
+            return _overloaded()
+        return None
+
+    def wrap(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def decorated_async(*args, **kwargs):
+                refused = refuse(args)
+                if refused is not None:
+                    return refused
+                try:
+                    return await f(*args, **kwargs)
+                finally:
+                    admission.release(group)
+            return decorated_async
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            refused = refuse(args)
+            if refused is not None:
+                return refused
+            try:
+                return f(*args, **kwargs)
+            finally:
+                admission.release(group)
+        return decorated
+    return wrap
@@ -0,0 +1,212 @@
+# app/refresh_tokens.py
+"""
+Refresh tokens: o cliente troca um token opaco por um novo JWT de acesso
+(POST /refresh) em vez de refazer o login (usuário + hash da senha + busca
+do cartão).
+
+  - o token é aleatório (secrets) e só o HMAC-SHA256 dele vai para a tabela
+    (REFRESH_TOKENS_TABLE, chave token_hash), com email, card_id e o TTL em
+    expires_at (ative o TTL da tabela nesse atributo)
+  - rotação: cada uso marca o token como usado (UpdateItem condicional, que
+    já devolve email/card_id) e grava o sucessor. São 2 chamadas, sem leitura
+  - reuso: apresentar um token já usado (fora da janela de
+    REFRESH_REUSE_GRACE, para duas abas renovando juntas) indica vazamento,
+    e a família inteira (a cadeia replaced_by a partir dele) é revogada
+  - revogação: revoke(token) derruba a família (logout)
+
+Os JWTs de acesso carregam sub (email) e card_id; token_required lê os dois
+sem ir ao banco. O card_id é só uma dica: as rotas que dependem dele ainda
+conferem o índice de donos (ou a escrita condicional faz isso).
+"""
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+import uuid
+
+from app.config import Config
+
+
+class RefreshTokenError(Exception):
+    """Token desconhecido, expirado, revogado ou reutilizado."""
+
+
+class RefreshTokenReuseError(RefreshTokenError):
+    pass
+
+
+_MAX_CHAIN = 1000  # segurança ao seguir replaced_by na revogação
+
+
+def hash_token(token):
+    return hmac.new(Config.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+def _new_token():
+    return secrets.token_urlsafe(32)
+
+
+def _record(token_hash, email, card_id, family_id, now):
+    item = {
+        "token_hash": token_hash,
+        "email": email,
+        "family_id": family_id,
+        "created_at": now,
+        "expires_at": now + Config.REFRESH_TOKEN_TTL,
+    }
+    if card_id:
+        item["card_id"] = card_id
+    return item
+
+
+def _refused(old, now):
+    """Erro para um token que não pôde ser usado (old = item atual ou None)."""
+    if not old or int(old.get("expires_at", 0)) <= now or old.get("revoked_at"):
+        return RefreshTokenError("Refresh token inválido ou expirado")
+    if now - int(old["used_at"]) <= Config.REFRESH_REUSE_GRACE:
+        # corrida legítima (duas abas): recusa sem derrubar a sessão
+        return RefreshTokenError("Refresh token já renovado")
+    return RefreshTokenReuseError("Refresh token reutilizado; sessão revogada")
+
+
+# ---------- DynamoDB ----------
+class DynamoRefreshTokenStore:
+    def __init__(self, table):
+        self.table = table
+
+    def issue(self, email, card_id=None, family_id=None):
+        """Cria um refresh token (nova família no login). Retorna o token em claro."""
+        now = int(time.time())
+        token = _new_token()
+        self.table.put_item(Item=_record(hash_token(token), email, card_id, family_id or uuid.uuid4().hex, now))
+        return token
+
+    def rotate(self, token, find_card_id=None):
+        """
+        Troca o token pelo sucessor. Retorna (novo token, {email, card_id, family_id}).
+        find_card_id(email) é consultado a cada troca e o resultado vai para o
+        sucessor (o card_id gravado no token antigo pode não valer mais).
+        Levanta RefreshTokenError / RefreshTokenReuseError.
+        """
+        from botocore.exceptions import ClientError
+
+        now = int(time.time())
+        old_hash, token_next = hash_token(token), _new_token()
+        next_hash = hash_token(token_next)
+        try:
+            old = self.table.update_item(
+                Key={"token_hash": old_hash},
+                UpdateExpression="SET used_at = :now, replaced_by = :next",
+                ConditionExpression=(
+                    "attribute_exists(token_hash) AND attribute_not_exists(used_at)"
+                    " AND attribute_not_exists(revoked_at) AND expires_at > :now"
+                ),
+                ExpressionAttributeValues={":now": now, ":next": next_hash},
+                ReturnValues="ALL_NEW",
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )["Attributes"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+            from app.card_repository import _deserialize
+
+            item = e.response.get("Item")
+            error = _refused(_deserialize(item) if item else None, now)
+            if isinstance(error, RefreshTokenReuseError):
+                self._revoke_chain(old_hash, now)
+            raise error
+        # o cartão é conferido a cada renovação: apagado/recriado ou com outro dono, o claim muda
+        card_id = find_card_id(old["email"]) if find_card_id else old.get("card_id")
+        self.table.put_item(Item=_record(next_hash, old["email"], card_id, old["family_id"], now))
+        return token_next, {"email": old["email"], "card_id": card_id, "family_id": old["family_id"]}
+
+    def _revoke_chain(self, token_hash, now):
+        from botocore.exceptions import ClientError
+
+        for _ in range(_MAX_CHAIN):
+            try:
+                item = self.table.update_item(
+                    Key={"token_hash": token_hash},
+                    UpdateExpression="SET revoked_at = :now",
+                    ConditionExpression="attribute_exists(token_hash)",
+                    ExpressionAttributeValues={":now": now},
+                    ReturnValues="ALL_NEW",
+                )["Attributes"]
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+                return  # fim da cadeia (ou já expirou e o TTL apagou)
+            token_hash = item.get("replaced_by")
+            if not token_hash:
+                return
+
+    def revoke(self, token):
+        """Logout: revoga o token e todos os sucessores dele."""
+        self._revoke_chain(hash_token(token), int(time.time()))
+
+
+# ---------- Memória (dev/testes) ----------
+class InMemoryRefreshTokenStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items = {}
+
+    def issue(self, email, card_id=None, family_id=None):
+        now = int(time.time())
+        token = _new_token()
+        with self._lock:
+            token_hash = hash_token(token)
+            self.items[token_hash] = _record(token_hash, email, card_id, family_id or uuid.uuid4().hex, now)
+        return token
+
+    def rotate(self, token, find_card_id=None):
+        now = int(time.time())
+        old_hash, token_next = hash_token(token), _new_token()
+        next_hash = hash_token(token_next)
+        with self._lock:
+            old = self.items.get(old_hash)
+            usable = old and not old.get("used_at") and not old.get("revoked_at") and old["expires_at"] > now
+            if not usable:
+                error = _refused(dict(old) if old else None, now)
+                if isinstance(error, RefreshTokenReuseError):
+                    self._revoke_chain(old_hash, now)
+                raise error
+            old.update(used_at=now, replaced_by=next_hash)
+        # o cartão é conferido a cada renovação: apagado/recriado ou com outro dono, o claim muda
+        card_id = find_card_id(old["email"]) if find_card_id else old.get("card_id")
+        with self._lock:
+            self.items[next_hash] = _record(next_hash, old["email"], card_id, old["family_id"], now)
+        return token_next, {"email": old["email"], "card_id": card_id, "family_id": old["family_id"]}
+
+    def _revoke_chain(self, token_hash, now):
+        for _ in range(_MAX_CHAIN):
+            item = self.items.get(token_hash)
+            if not item:
+                return
+            item["revoked_at"] = now
+            token_hash = item.get("replaced_by")
+
+    def revoke(self, token):
+        with self._lock:
+            self._revoke_chain(hash_token(token), int(time.time()))
+
+
+# ---------- Instância padrão ----------
+_store = None
+
+
+def get_refresh_token_store():
+    global _store
+    if _store is None:
+        if Config.REFRESH_TOKEN_BACKEND == "memory":
+            _store = InMemoryRefreshTokenStore()
+        else:
+            from app import aws
+            _store = DynamoRefreshTokenStore(aws.refresh_tokens_table)
+    return _store
+
+
+def set_refresh_token_store(store):
+    global _store
+    _store = store
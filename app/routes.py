@@ -1,36 +1,44 @@
 # routes.py
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify, Response, stream_with_context, g
 from app.models import User, Card
 from pydantic import ValidationError
 import jwt
 from datetime import datetime, timedelta
-from boto3.dynamodb.conditions import Attr
-import boto3
 import uuid
 from app.services_utils import hash_password
+from app.card_repository import get_card_repository, find_card_by_owner, OwnerConflictError, VersionConflictError
+from app.card_repository import CardNotFoundError, CardAccessDeniedError, GalleryOpError, GalleryConflictError
+from app.card_cache import card_cache
 from app.config import Config
+from app.metrics import span
+from app.compression import cached_json, hot_bodies, decoded_etag_header, conditional_environ
+from app.rate_limit import rate_limited
+from app.refresh_tokens import get_refresh_token_store, RefreshTokenError, RefreshTokenReuseError
+from app import aws, aio, metrics
 from functools import wraps
-import os
+from werkzeug.http import generate_etag, parse_etags
 
 # ---- Uploads (S3) ----
-from app.storage import upload_image, delete_image_by_url  # <- crie app/storage.py conforme instruções
-
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "uploads")
+from app.storage import upload_images  # <- crie app/storage.py conforme instruções
+from app.cleanup import enqueue_urls, enqueue_replaced, enqueue_deleted, retain_card_images
+from app import card_artifacts, analytics, search
+from app.storage import presign_upload, receive_signed_upload, head_uploads, url_for_key, SignedUploadError
 
 # ---- DynamoDB ----
-dynamodb = boto3.resource(
-    "dynamodb",
-    region_name=Config.AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
-users_table = dynamodb.Table("GetiCardUsers")
-cards_table = dynamodb.Table("Testecard")   # ajuste se o nome da sua tabela for outro
-
+# tabelas vêm do registro em app/aws.py (aws.users_table / aws.cards_table),
+# criadas só no primeiro uso
 routes = Blueprint("api", __name__)
 SECRET_KEY = Config.SECRET_KEY
 
 
+@routes.before_request
+def _receber_multipart():
+    # Lê o multipart antes da rota: os arquivos vão em streaming para o destino
+    # (app/ingest.py) e um 413 por tamanho não cai no try/except genérico das rotas.
+    if request.content_type and request.content_type.startswith("multipart/form-data"):
+        request.files
+
+
 # ---------- Helpers ----------
 def _abs_url(u: str) -> str:
     """
@@ -49,8 +57,216 @@ def _abs_url(u: str) -> str:
 def _clean_dict(d: dict) -> dict:
     return {k: v for k, v in d.items() if v is not None}
 
+def _public_card(item: dict) -> dict:
+    """Cópia do cartão com as URLs legadas (/uploads/...) já absolutas."""
+    item = dict(item)
+    if item.get("foto_perfil"):
+        item["foto_perfil"] = _abs_url(item["foto_perfil"])
+    if isinstance(item.get("galeria"), list):
+        item["galeria"] = [_abs_url(u) for u in item.get("galeria")]
+    # variantes p/ srcset (avatar 128/256, galeria thumb/display)
+    if isinstance(item.get("foto_perfil_variants"), dict):
+        item["foto_perfil_variants"] = {k: _abs_url(u) for k, u in item["foto_perfil_variants"].items()}
+    if isinstance(item.get("galeria_variants"), list):
+        item["galeria_variants"] = [
+            {k: _abs_url(u) for k, u in (v or {}).items()} for v in item["galeria_variants"]
+        ]
+    # vCard, QR e página de compartilhamento (app/card_artifacts.py)
+    if isinstance(item.get("artifacts"), dict):
+        item["artifacts"] = {k: _abs_url(u) for k, u in item["artifacts"].items()}
+    return item
+
+def _card_etag(card: dict) -> str:
+    """ETag forte: hash do corpo JSON exatamente como é servido (o corpo fica pronto para o GET)."""
+    body = jsonify(card).get_data()
+    etag = generate_etag(body)
+    hot_bodies.set(etag, "identity", body)
+    return etag
+
+def _card_last_modified(card: dict):
+    try:
+        return datetime.strptime(card["updated_at"], "%Y-%m-%dT%H:%M:%SZ")
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _upload_card_images(card_id: str, avatar, galeria: list):
+    """
+    Sobe avatar + galeria em paralelo (já processadas, com variantes).
+    Retorna (avatar | None, galeria, falhas), com avatar/itens da galeria no
+    formato {"url", "variants"}; se houver falhas nada fica no S3. A mesma
+    imagem enviada duas vezes vira a mesma URL e entra na galeria uma vez só.
+    """
+    has_avatar = bool(avatar and avatar.filename)
+    items = [(avatar, f"cards/{card_id}/avatar", "avatar")] if has_avatar else []
+    items += [(f, f"cards/{card_id}/galeria", "galeria") for f in galeria if f and f.filename]
+
+    results = upload_images(items)
+    if any(r["error"] for r in results):
+        return None, [], results
+    avatar_result, results = (results[0], results[1:]) if has_avatar else (None, results)
+    galeria = {}
+    for r in results:
+        galeria.setdefault(r["url"], r)
+    return avatar_result, list(galeria.values()), []
+
+# campos de texto que o dono pode alterar no update
+_CAMPOS_TEXTO = ("nome", "biografia", "empresa", "whatsapp", "emailContato", "instagram", "linkedin", "site", "chave_pix")
+
+def _descartar_uploads(items: list) -> None:
+    """Manda para a fila de limpeza as imagens recém-enviadas quando a gravação do cartão falha."""
+    urls = [u for item in items for u in [item.get("url"), *(item.get("variants") or {}).values()]]
+    try:
+        enqueue_urls(urls)
+    except Exception as e:
+        print("Erro ao enfileirar uploads descartados:", e)
+
+def _retain_images(card: dict) -> None:
+    """Conta as imagens do cartão novo como em uso (a fila de limpeza não apaga imagens compartilhadas)."""
+    try:
+        retain_card_images(card)
+    except Exception as e:
+        print("Erro ao registrar referências das imagens:", e)
+
+def _indexar(card: dict) -> None:
+    """Cartão novo/alterado no índice de busca (falha aqui não derruba a gravação)."""
+    try:
+        search.index_card(card)
+    except Exception as e:
+        print("Erro ao atualizar índice de busca:", e)
+
+def _agendar_artefatos(card: dict) -> None:
+    """vCard/QR/página do cartão novo (falha aqui não derruba a gravação)."""
+    try:
+        card_artifacts.schedule(card)
+    except Exception as e:
+        print("Erro ao agendar artefatos do cartão:", e)
+
+def _stored_url(u):
+    """URL como está gravada no cartão (legados /uploads/... voltam a ser relativos)."""
+    base = request.host_url.rstrip("/")
+    if isinstance(u, str) and u.startswith(f"{base}/uploads/"):
+        return u[len(base):]
+    return u
+
+def _if_match_version(card_id: str):
+    """
+    Versão esperada a partir do If-Match (ETag do GET), ou None sem If-Match.
+    Usa o cache quando o ETag bate; só lê o cartão se não bater. O ETag de uma
+    resposta comprimida ("<etag>-gzip") vale pela mesma versão.
+    """
+    if_match = parse_etags(decoded_etag_header(request.headers.get("If-Match")))
+    if not if_match or if_match.star_tag:
+        return None
+    hit, cached, etag = card_cache.get(card_id, request.host_url.rstrip("/"))
+    if hit and cached and etag and if_match.contains(etag):
+        return cached.get("version") or 0
+    card = get_card_repository().get_card(card_id)
+    if not card:
+        raise CardNotFoundError(card_id)
+    if not if_match.contains(_card_etag(_public_card(card))):
+        raise VersionConflictError(card_id)
+    return card.get("version") or 0
+
+def _card_atualizado(card_id: str, card: dict, previous: dict, status=200):
+    """
+    Resposta de uma atualização: o cartão novo vai direto para o cache, as
+    imagens que ele deixou de usar (avatar/galeria trocados) para a fila de
+    limpeza e, se mudou algo que aparece no vCard/QR/página, os artefatos são regerados.
+    """
+    try:
+        enqueue_replaced(previous, card)
+    except Exception as e:
+        print("Erro ao enfileirar imagens substituídas:", e)
+    try:
+        card_artifacts.schedule_if_changed(previous, card)
+    except Exception as e:
+        print("Erro ao agendar artefatos do cartão:", e)
+    _indexar(card)
+    base = request.host_url.rstrip("/")
+    public = _public_card(card)
+    etag = _card_etag(public)
+    try:
+        card_cache.set(card_id, public, base, etag=etag)
+    except Exception as e:
+        print("Erro ao atualizar cache do cartão:", e)
+    resp = jsonify({"message": "Cartão atualizado com sucesso", "card": public})
+    resp.set_etag(etag)
+    return resp, status
+
+def _erro_atualizacao(e: Exception):
+    if isinstance(e, CardNotFoundError):
+        return jsonify({"error": "Cartão não encontrado"}), 404
+    if isinstance(e, CardAccessDeniedError):
+        return jsonify({"error": "Acesso negado: você não é o dono deste cartão."}), 403
+    if isinstance(e, VersionConflictError):
+        return jsonify({"error": "O cartão foi alterado por outra requisição."}), 412
+    if isinstance(e, GalleryConflictError):
+        return jsonify({"error": "A galeria mudou; recarregue o cartão e tente de novo."}), 409
+    if isinstance(e, OwnerConflictError):
+        return jsonify({"error": "Já existe um cartão para este email."}), 409
+    if isinstance(e, GalleryOpError):
+        return jsonify({"error": str(e)}), 400
+    return None
+
+def _falha_upload(results: list):
+    return jsonify({
+        "error": "Falha ao enviar imagens",
+        "arquivos": [{"filename": r["filename"], "error": r["error"]} for r in results],
+    }), 502
+
+def _card_existente(card_id: str):
+    return jsonify({
+        "message": "Já existe um cartão para este email.",
+        "card_id": card_id,
+    }), 200
+
 
 # ---------- Auth decorator ----------
+def _access_token(email, card_id):
+    """JWT de acesso; card_id vai como claim para as rotas não precisarem buscar o dono."""
+    claims = {"sub": email, "exp": datetime.utcnow() + timedelta(seconds=Config.ACCESS_TOKEN_TTL)}
+    if card_id:
+        claims["card_id"] = card_id
+    return jwt.encode(claims, SECRET_KEY, algorithm="HS256")
+
+def _tokens_response(email, card_id, refresh_token):
+    return jsonify({
+        "access_token": _access_token(email, card_id),
+        "refresh_token": refresh_token,
+        "expires_in": Config.ACCESS_TOKEN_TTL,
+        "card_id": card_id,
+    })
+
+def _claims_card(card_id):
+    """True se o token da requisição diz que o usuário é dono deste cartão (só uma dica)."""
+    return bool(card_id) and g.get("token_card_id") == card_id
+
+def _confirma_dono(user_email, card_id):
+    """
+    None se o usuário é dono do cartão; senão a resposta de erro. Com o claim
+    do token batendo, basta o índice de donos (leitura pequena); sem ele, ou se
+    o índice discordar, o cartão é lido.
+    """
+    if _claims_card(card_id) and get_card_repository().owns_card(user_email, card_id):
+        return None
+    _, erro = _owned_card(user_email, card_id)
+    return erro
+
+def _antes_do_upload(user_email, card_id):
+    """
+    Confere o dono antes de enviar imagens (para não subir arquivos de quem
+    vai levar 403). Token com outro card_id é recusado na hora; com o mesmo,
+    segue (a escrita condicional ainda confere); sem claim, o índice de donos
+    decide e, se discordar, o cartão é lido para dar 404/403.
+    """
+    token_card_id = g.get("token_card_id")
+    if token_card_id and token_card_id != card_id:
+        return jsonify({"error": "Acesso negado: você não é o dono deste cartão."}), 403
+    if token_card_id or get_card_repository().owns_card(user_email, card_id):
+        return None
+    _, erro = _owned_card(user_email, card_id)
+    return erro
+
 def token_required(f):
     @wraps(f)
     def decorator(*args, **kwargs):
@@ -59,16 +275,19 @@ def token_required(f):
             return jsonify({"error": "Token ausente"}), 401
         try:
             token = auth_header.split(" ")[1]
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+            with span("jwt"):
+                payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
             user_email = payload.get("sub")
         except Exception as e:
             return jsonify({"error": str(e)}), 403
+        g.token_card_id = payload.get("card_id")  # tokens antigos não têm: cai na busca do cartão
         return f(user_email, *args, **kwargs)
     return decorator
 
 
 # ---------- Register ----------
 @routes.route("/register", methods=["POST"])
+@rate_limited("auth", email_field="email")
 def register():
     try:
         data = request.json
@@ -76,10 +295,10 @@ def register():
         user_dict = user.dict()
         user_dict["password"] = hash_password(user_dict["password"])
 
-        if users_table.get_item(Key={"email": user_dict["email"]}).get("Item"):
+        if aws.users_table.get_item(Key={"email": user_dict["email"]}).get("Item"):
             return jsonify({"error": "Usuário já existe"}), 409
 
-        users_table.put_item(Item=user_dict)
+        aws.users_table.put_item(Item=user_dict)
         return jsonify({"message": "Usuário criado com sucesso"}), 201
     except ValidationError as e:
         return jsonify(e.errors()), 400
@@ -90,33 +309,73 @@ def register():
 
 # ---------- Login ----------
 @routes.route("/login", methods=["POST"])
-def login():
+@rate_limited("auth", email_field="email")
+async def login():
     data = request.json
     email = data.get("email")
     password = data.get("password")
 
-    resp = users_table.get_item(Key={"email": email})
+    # usuário e cartão do dono em paralelo (o cartão só é usado se a senha bater)
+    resp, card = await aio.gather(
+        aio.wrap(aws.users_table).get_item(Key={"email": email}),
+        aio.run(find_card_by_owner, email),
+    )
     user = resp.get("Item")
     if not user:
         return jsonify({"error": "Usuário não encontrado"}), 401
     if user["password"] != hash_password(password):
         return jsonify({"error": "Senha inválida"}), 401
 
-    token = jwt.encode(
-        {"sub": email, "exp": datetime.utcnow() + timedelta(minutes=60)},
-        SECRET_KEY,
-        algorithm="HS256",
-    )
+    card_id = card["card_id"] if card else None
+    refresh_token = await aio.run(get_refresh_token_store().issue, email, card_id)
+    return _tokens_response(email, card_id, refresh_token), 200
 
-    card_resp = cards_table.scan(FilterExpression=Attr("emailContato").eq(email))
-    cards = card_resp.get("Items", [])
-    card_id = cards[0]["card_id"] if cards else None
 
-    return jsonify({"access_token": token, "card_id": card_id}), 200
+# ---------- Refresh ----------
+@routes.route("/refresh", methods=["POST"])
+@rate_limited("auth")
+def refresh():
+    """
+    Corpo: {"refresh_token": "..."}. Devolve um access_token novo e o próximo
+    refresh_token (o enviado deixa de valer). Sem senha, sem ler o usuário.
+    """
+    refresh_token = (request.get_json(silent=True) or {}).get("refresh_token")
+    if not isinstance(refresh_token, str) or not refresh_token:
+        return jsonify({"error": "refresh_token obrigatório"}), 400
+    try:
+        def find_card_id(email):
+            card = find_card_by_owner(email)
+            return card["card_id"] if card else None
+
+        new_token, session = get_refresh_token_store().rotate(refresh_token, find_card_id=find_card_id)
+    except RefreshTokenReuseError as e:
+        print("Refresh token reutilizado; família revogada")
+        return jsonify({"error": str(e)}), 401
+    except RefreshTokenError as e:
+        return jsonify({"error": str(e)}), 401
+    except Exception as e:
+        print("Erro ao renovar token:", e)
+        return jsonify({"error": str(e)}), 500
+    return _tokens_response(session["email"], session.get("card_id"), new_token), 200
+
+
+@routes.route("/logout", methods=["POST"])
+def logout():
+    """Corpo: {"refresh_token": "..."}. Revoga a sessão (o token e os que vieram dele)."""
+    refresh_token = (request.get_json(silent=True) or {}).get("refresh_token")
+    if not isinstance(refresh_token, str) or not refresh_token:
+        return jsonify({"error": "refresh_token obrigatório"}), 400
+    try:
+        get_refresh_token_store().revoke(refresh_token)
+    except Exception as e:
+        print("Erro ao revogar token:", e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"message": "Sessão encerrada"}), 200
 
 
 # ---------- Create Card ----------
 @routes.route("/card", methods=["POST"])
+@rate_limited("write", email_field="emailContato")
 def create_card():
     try:
         if request.content_type and request.content_type.startswith("multipart/form-data"):
@@ -126,28 +385,19 @@ def create_card():
             if not emailContato:
                 return jsonify({"error": "Email para contato obrigatório!"}), 400
 
-            # 1 cartão por e-mail
-            resp = cards_table.scan(FilterExpression=Attr("emailContato").eq(emailContato))
-            if resp.get("Items"):
-                card_existente = resp["Items"][0]
-                return jsonify({
-                    "message": "Já existe um cartão para este email.",
-                    "card_id": card_existente["card_id"],
-                }), 200
+            # 1 cartão por e-mail (checa antes de subir imagens)
+            card_existente = find_card_by_owner(emailContato)
+            if card_existente:
+                return _card_existente(card_existente["card_id"])
 
             card_id = f"card-{uuid.uuid4().hex[:8]}"
 
-            # Avatar -> S3
-            foto_perfil_url = ""
-            avatar = request.files.get("foto_perfil")
-            if avatar and avatar.filename:
-                foto_perfil_url = upload_image(avatar, key_prefix=f"cards/{card_id}/avatar")
-
-            # Galeria -> S3
-            galeria_urls = []
-            for f in request.files.getlist("galeria"):
-                if f and f.filename:
-                    galeria_urls.append(upload_image(f, key_prefix=f"cards/{card_id}/galeria"))
+            # Avatar + galeria -> S3 (em paralelo)
+            avatar, galeria, falhas = _upload_card_images(
+                card_id, request.files.get("foto_perfil"), request.files.getlist("galeria")
+            )
+            if falhas:
+                return _falha_upload(falhas)
 
             card_dict = _clean_dict({
                 "card_id": card_id,
@@ -160,10 +410,17 @@ def create_card():
                 "linkedin": form.get("linkedin"),
                 "site": form.get("site"),
                 "chave_pix": form.get("chave_pix"),
-                "foto_perfil": foto_perfil_url,  # URL completa (S3)
-                "galeria": galeria_urls,        # lista de URLs completas (S3)
+                "foto_perfil": avatar["url"] if avatar else "",  # URL completa (S3)
+                "foto_perfil_variants": avatar["variants"] if avatar else None,
+                "galeria": [g["url"] for g in galeria],        # lista de URLs completas (S3)
+                "galeria_variants": [g["variants"] for g in galeria],
             })
-            cards_table.put_item(Item=card_dict)
+            card_dict["artifacts"] = card_artifacts.artifact_urls(card_id)
+            get_card_repository().create_card(card_dict)
+            card_cache.invalidate(card_id)
+            _retain_images(card_dict)
+            _indexar(card_dict)
+            _agendar_artefatos(card_dict)
             return jsonify({"message": "Cartão criado com sucesso", "card_id": card_id}), 201
 
         # JSON fallback (sem imagens)
@@ -172,21 +429,25 @@ def create_card():
         if not emailContato:
             return jsonify({"error": "Email para contato obrigatório!"}), 400
 
-        resp = cards_table.scan(FilterExpression=Attr("emailContato").eq(emailContato))
-        if resp.get("Items"):
-            card_existente = resp["Items"][0]
-            return jsonify({
-                "message": "Já existe um cartão para este email.",
-                "card_id": card_existente["card_id"],
-            }), 200
+        card_existente = find_card_by_owner(emailContato)
+        if card_existente:
+            return _card_existente(card_existente["card_id"])
 
         card_id = f"card-{uuid.uuid4().hex[:8]}"
         card = Card(**data)
         card_dict = card.dict()
         card_dict["card_id"] = card_id
-        cards_table.put_item(Item=card_dict)
+        card_dict["artifacts"] = card_artifacts.artifact_urls(card_id)
+        get_card_repository().create_card(card_dict)
+        card_cache.invalidate(card_id)
+        _retain_images(card_dict)
+        _indexar(card_dict)
+        _agendar_artefatos(card_dict)
         return jsonify({"message": "Cartão criado com sucesso", "card_id": card_id}), 201
 
+    except OwnerConflictError as e:
+        # corrida: outro request criou o cartão deste email no meio do caminho
+        return _card_existente(e.card_id)
     except ValidationError as e:
         return jsonify(e.errors()), 400
     except Exception as e:
@@ -196,117 +457,394 @@ def create_card():
 
 # ---------- Get Card ----------
 @routes.route("/card/<card_id>", methods=["GET"])
+@rate_limited("read")
 def get_card(card_id):
     try:
-        response = cards_table.get_item(Key={"card_id": card_id})
-        item = response.get("Item")
+        base = request.host_url.rstrip("/")
+        with span("cache"):
+            hit, item, etag = card_cache.get(card_id, base)
+        if not hit:
+            item = get_card_repository().get_card(card_id)
+            etag = None
+            if item:
+                # Normaliza legados (/uploads/...) para URL absoluta; S3 (http) fica como está
+                with span("json"):
+                    item = _public_card(item)
+                    etag = _card_etag(item)
+            with span("cache"):
+                card_cache.set(card_id, item or None, base, etag=etag)
+
         if not item:
             return jsonify({"error": "Cartão não encontrado"}), 404
 
-        # Normaliza legados (/uploads/...) para URL absoluta; S3 (http) fica como está
-        if item.get("foto_perfil"):
-            item["foto_perfil"] = _abs_url(item["foto_perfil"])
-        if isinstance(item.get("galeria"), list):
-            item["galeria"] = [_abs_url(u) for u in item.get("galeria")]
+        etag = etag or _card_etag(item)
+        with span("json"):
+            resp = cached_json(item, etag)  # corpo (e gzip/br) reaproveitado enquanto o ETag não muda
+        resp.set_etag(etag)
+        resp.last_modified = _card_last_modified(item)
+        resp.headers["Cache-Control"] = Config.CARD_CACHE_CONTROL
+        analytics.record_view(card_id)  # só soma em memória; gravado em lote depois
+        # If-None-Match / If-Modified-Since -> 304 sem corpo (ETag do gzip/br conta como o da versão)
+        return resp.make_conditional(conditional_environ(request.environ))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ---------- Busca ----------
+@routes.route("/cards/search", methods=["GET"])
+@rate_limited("read")
+def search_cards():
+    """
+    Diretório: ?q=texto (nome, empresa, biografia; sem acento e com prefixo,
+    "jo sil" acha "João Silva"), &limit=20&offset=0. Resultados por relevância
+    com uma prévia de cada cartão; nenhuma ida ao DynamoDB.
+    """
+    if not Config.SEARCH_ENABLED:
+        return jsonify({"error": "Busca desativada"}), 404
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "q obrigatório"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), Config.SEARCH_MAX_LIMIT)
+        offset = max(int(request.args.get("offset", 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit e offset devem ser números"}), 400
+    try:
+        with span("search"):
+            result = search.search(q, limit=limit, offset=offset)
+        for item in result["results"]:
+            if item.get("foto_perfil"):
+                item["foto_perfil"] = _abs_url(item["foto_perfil"])
+        return jsonify({"query": q, **result}), 200
+    except Exception as e:
+        print("Erro na busca:", e)
+        return jsonify({"error": str(e)}), 500
+
 
-        return jsonify(item), 200
+# ---------- Batch Get ----------
+@routes.route("/cards:batchGet", methods=["POST"])
+@rate_limited("read")
+def batch_get_cards():
+    """Corpo: {"card_ids": [...]}. Um resultado por id (200, 404 ou 503 se o DynamoDB não respondeu)."""
+    try:
+        card_ids = (request.json or {}).get("card_ids")
+        if not isinstance(card_ids, list) or not all(isinstance(c, str) for c in card_ids):
+            return jsonify({"error": "card_ids deve ser uma lista de ids"}), 400
+        if len(card_ids) > Config.BATCH_GET_MAX:
+            return jsonify({"error": f"No máximo {Config.BATCH_GET_MAX} ids por chamada"}), 400
+
+        base = request.host_url.rstrip("/")
+        cards, missing = {}, []
+        for cid in dict.fromkeys(card_ids):
+            hit, item, _ = card_cache.get(cid, base)
+            if hit:
+                cards[cid] = item
+            else:
+                missing.append(cid)
+
+        unprocessed = []
+        if missing:
+            found, unprocessed = get_card_repository().get_cards(missing)
+            for cid in missing:
+                if cid in unprocessed:
+                    continue
+                item = _public_card(found[cid]) if cid in found else None
+                cards[cid] = item
+                card_cache.set(cid, item, base, etag=_card_etag(item) if item else None)
+
+        results = []
+        for cid in card_ids:
+            if cid in unprocessed:
+                results.append({"card_id": cid, "status": 503, "error": "Tente novamente"})
+            elif cards.get(cid):
+                results.append({"card_id": cid, "status": 200, "card": cards[cid]})
+            else:
+                results.append({"card_id": cid, "status": 404, "error": "Cartão não encontrado"})
+        return jsonify({"results": results}), 200
     except Exception as e:
+        print("Erro no batchGet:", e)
         return jsonify({"error": str(e)}), 500
 
 
 # ---------- Update Card ----------
 @routes.route("/card/<card_id>", methods=["PUT"])
 @token_required
+@rate_limited("write")
 def update_card(user_email, card_id):
-    try:
-        response = cards_table.get_item(Key={"card_id": card_id})
-        card = response.get("Item")
-        if not card:
-            return jsonify({"error": "Cartão não encontrado"}), 404
+    """
+    Atualização parcial: só os campos enviados vão para o DynamoDB, numa única
+    escrita condicionada ao dono (sem ler o cartão antes). Com imagens, o dono
+    é conferido antes do upload (claim do token ou índice de donos).
 
-        # Permissão: apenas o dono
-        if card.get("emailContato") != user_email:
-            return jsonify({"error": "Acesso negado: você não é o dono deste cartão."}), 403
+    multipart: campos de texto + foto_perfil + galeria (anexa; replace_gallery=1 substitui)
+    JSON: campos, "galeria": [...] (substitui) ou "galeria_op": {"op": "append" |
+    "replace" | "remove" | "reorder", ...} (ver normalize_gallery_op)
+    """
+    enviados = []  # imagens desta requisição: apagadas se a gravação falhar
+    try:
+        expected_version = _if_match_version(card_id)
+        remove, gallery = [], None
 
         if request.content_type and request.content_type.startswith("multipart/form-data"):
             form = request.form
-
-            # Campos de texto
-            for campo in ["nome", "biografia", "empresa", "whatsapp", "emailContato", "instagram", "linkedin", "site", "chave_pix"]:
-                if campo in form:
-                    card[campo] = form.get(campo)
-
-            # Avatar novo -> S3 (opcional: remover o antigo)
-            new_avatar = request.files.get("foto_perfil")
-            if new_avatar and new_avatar.filename:
-                # delete_image_by_url(card.get("foto_perfil"))  # descomente se quiser apagar o antigo
-                card["foto_perfil"] = upload_image(new_avatar, key_prefix=f"cards/{card_id}/avatar")
-
-            # Novas imagens da galeria
-            new_urls = []
-            for f in request.files.getlist("galeria"):
-                if f and f.filename:
-                    new_urls.append(upload_image(f, key_prefix=f"cards/{card_id}/galeria"))
-
-            # Controle: anexar ou substituir
-            replace = form.get("replace_gallery", "").lower() in ("1", "true", "yes")
-            if new_urls:
-                if replace:
-                    card["galeria"] = new_urls
-                else:
-                    card["galeria"] = (card.get("galeria") or []) + new_urls
-
-            cards_table.put_item(Item=card)
-            return jsonify({"message": "Cartão atualizado com sucesso"}), 200
-
-        # JSON fallback (sem imagens)
-        data = request.json or {}
-        for campo in ["nome", "biografia", "empresa", "whatsapp", "emailContato", "instagram", "linkedin", "site", "chave_pix", "foto_perfil", "galeria"]:
-            if campo in data:
-                card[campo] = data[campo]
-
-        cards_table.put_item(Item=card)
-        return jsonify({"message": "Cartão atualizado com sucesso"}), 200
+            fields = {campo: form.get(campo) for campo in _CAMPOS_TEXTO if campo in form}
+            erro = _antes_do_upload(user_email, card_id)
+            if erro:
+                return erro
+
+            # Avatar novo + novas imagens da galeria -> S3 (em paralelo)
+            new_avatar, new_items, falhas = _upload_card_images(
+                card_id, request.files.get("foto_perfil"), request.files.getlist("galeria")
+            )
+            if falhas:
+                return _falha_upload(falhas)
+            enviados = ([new_avatar] if new_avatar else []) + new_items
+            if new_avatar:
+                fields["foto_perfil"] = new_avatar["url"]
+                fields["foto_perfil_variants"] = new_avatar["variants"]
+            if new_items:
+                # Controle: anexar ou substituir
+                replace = form.get("replace_gallery", "").lower() in ("1", "true", "yes")
+                gallery = {"op": "replace" if replace else "append", "items": new_items}
+        else:
+            # JSON (sem imagens)
+            data = request.json or {}
+            fields = {campo: data[campo] for campo in _CAMPOS_TEXTO + ("foto_perfil",) if campo in data}
+            # URL trocada via JSON: as variantes antigas não valem mais
+            if "foto_perfil" in data:
+                remove.append("foto_perfil_variants")
+            gallery = data.get("galeria_op")
+            if "galeria" in data:
+                if gallery:
+                    return jsonify({"error": "Envie galeria ou galeria_op, não os dois."}), 400
+                gallery = {"op": "replace", "items": data["galeria"] or []}
+            if isinstance(gallery, dict) and gallery.get("op") == "remove" and "urls" in gallery:
+                gallery = {**gallery, "urls": [_stored_url(u) for u in gallery["urls"] or []]}
+
+        card, previous = get_card_repository().update_card(
+            card_id, user_email, fields=fields, remove=remove, gallery=gallery, expected_version=expected_version,
+        )
 
     except Exception as e:
+        _descartar_uploads(enviados)
+        erro = _erro_atualizacao(e)
+        if erro:
+            return erro
         print("Erro ao atualizar cartão:", e)
         return jsonify({"error": str(e)}), 500
 
+    # gravado: as imagens enviadas já estão no cartão e não podem mais ser descartadas
+    return _card_atualizado(card_id, card, previous)
+
 
 # ---------- Delete Card ----------
 @routes.route("/card/<card_id>", methods=["DELETE"])
 @token_required
+@rate_limited("write")
 def delete_card(user_email, card_id):
     try:
-        response = cards_table.get_item(Key={"card_id": card_id})
-        card = response.get("Item")
+        card = get_card_repository().get_card(card_id)
         if not card:
             return jsonify({"error": "Cartão não encontrado"}), 404
 
         if card.get("emailContato") != user_email:
             return jsonify({"error": "Acesso negado: você não é o dono deste cartão."}), 403
 
-        # (Opcional) limpar imagens do S3
+        get_card_repository().delete_card(card)
+        card_cache.invalidate(card_id)
+        # imagens (e variantes) e artefatos saem depois, em lote, pela fila de limpeza
+        # (imagens que outro cartão também usa ficam)
         try:
-            if card.get("foto_perfil"):
-                delete_image_by_url(card["foto_perfil"])
-            for u in card.get("galeria") or []:
-                delete_image_by_url(u)
-        except Exception:
-            pass
-
-        cards_table.delete_item(Key={"card_id": card_id})
+            enqueue_deleted(card)
+        except Exception as e:
+            print("Erro ao enfileirar imagens do cartão:", e)
+        try:
+            analytics.forget_card(card_id)
+        except Exception as e:
+            print("Erro ao apagar estatísticas do cartão:", e)
+        try:
+            search.remove_card(card_id)
+        except Exception as e:
+            print("Erro ao atualizar índice de busca:", e)
         return jsonify({"message": "Cartão excluído com sucesso"}), 200
     except Exception as e:
         print("Erro ao excluir cartão:", e)
         return jsonify({"error": str(e)}), 500
 
 
-# ---------- Servir uploads legados ----------
-@routes.route("/uploads/<path:filename>")
-def servir_arquivo(filename):
-    # apenas para compatibilidade com arquivos antigos em disco
-    return send_from_directory(UPLOAD_FOLDER, filename)
+# ---------- Estatísticas ----------
+@routes.route("/card/<card_id>/stats", methods=["GET"])
+@token_required
+@rate_limited("read")
+def card_stats(user_email, card_id):
+    """
+    Visualizações do cartão (só o dono): ?days=30 (até ANALYTICS_MAX_DAYS) e
+    ?granularity=hour|day. Vem do que já foi gravado; o que os outros workers
+    ainda têm em memória aparece depois do próximo flush deles.
+    """
+    try:
+        erro = _confirma_dono(user_email, card_id)
+        if erro:
+            return erro
+        try:
+            days = int(request.args.get("days", 30))
+        except ValueError:
+            return jsonify({"error": "days deve ser um número"}), 400
+        granularity = request.args.get("granularity", "hour")
+        if granularity not in ("hour", "day"):
+            return jsonify({"error": "granularity deve ser hour ou day"}), 400
+        days = max(1, min(days, Config.ANALYTICS_MAX_DAYS))
+        return jsonify(analytics.card_stats(card_id, days, granularity)), 200
+    except Exception as e:
+        print("Erro ao ler estatísticas:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# ---------- Importação em lote ----------
+@routes.route("/cards:import", methods=["POST"])
+@token_required
+@rate_limited("write")
+def import_cards_route(user_email):
+    """Corpo: {"cards": [...]} (só ADMIN_EMAILS). Resultado por linha: created/duplicate/invalid."""
+    from app.card_import import import_cards
+
+    if user_email not in Config.ADMIN_EMAILS:
+        return jsonify({"error": "Acesso negado"}), 403
+    try:
+        rows = (request.json or {}).get("cards")
+        if not isinstance(rows, list) or not rows:
+            return jsonify({"error": "cards deve ser uma lista não vazia"}), 400
+        if len(rows) > Config.IMPORT_MAX_ROWS:
+            return jsonify({"error": f"No máximo {Config.IMPORT_MAX_ROWS} cartões por chamada"}), 400
+        return jsonify(import_cards(rows)), 200
+    except Exception as e:
+        print("Erro na importação:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+# ---------- Upload direto (URLs assinadas) ----------
+# Os bytes vão do cliente direto para o S3; a API só assina e depois confere.
+_UPLOAD_FIELDS = ("avatar", "galeria")
+_EXT_BY_TYPE = {
+    "image/jpeg": "jpg", "image/png": "png", "image/webp": "webp",
+    "image/gif": "gif", "image/heic": "heic", "image/avif": "avif",
+}
+
+def _owned_card(user_email, card_id):
+    """(card, None) se o usuário é dono do cartão; senão (None, resposta de erro)."""
+    card = get_card_repository().get_card(card_id)
+    if not card:
+        return None, (jsonify({"error": "Cartão não encontrado"}), 404)
+    if card.get("emailContato") != user_email:
+        return None, (jsonify({"error": "Acesso negado: você não é o dono deste cartão."}), 403)
+    return card, None
+
+
+@routes.route("/card/<card_id>/uploads", methods=["POST"])
+@token_required
+@rate_limited("write")
+def presign_card_uploads(user_email, card_id):
+    """
+    Corpo: {"files": [{"field": "avatar"|"galeria", "content_type": "image/jpeg",
+    "size": 12345}], "method": "post"|"put"}. Devolve uma URL assinada por arquivo.
+    """
+    erro = _confirma_dono(user_email, card_id)
+    if erro:
+        return erro
+
+    data = request.json or {}
+    files = data.get("files") or []
+    method = (data.get("method") or "post").lower()
+    if not files or len(files) > Config.UPLOAD_MAX_FILES:
+        return jsonify({"error": f"Envie de 1 a {Config.UPLOAD_MAX_FILES} arquivos."}), 400
+    if method not in ("post", "put"):
+        return jsonify({"error": "method deve ser post ou put"}), 400
+
+    uploads = []
+    for f in files:
+        field = f.get("field")
+        content_type = f.get("content_type")
+        size = f.get("size")
+        if field not in _UPLOAD_FIELDS:
+            return jsonify({"error": f"field inválido: {field}"}), 400
+        if content_type not in Config.UPLOAD_CONTENT_TYPES:
+            return jsonify({"error": f"Tipo de arquivo não permitido: {content_type}"}), 400
+        if method == "put" and not (isinstance(size, int) and 0 < size <= Config.UPLOAD_MAX_BYTES):
+            return jsonify({"error": f"size obrigatório (até {Config.UPLOAD_MAX_BYTES} bytes)"}), 400
+
+        key = f"cards/{card_id}/{field}/{uuid.uuid4().hex}.{_EXT_BY_TYPE[content_type]}"
+        signed = presign_upload(
+            key, content_type, Config.UPLOAD_MAX_BYTES,
+            expires=Config.UPLOAD_URL_EXPIRES, method=method, size=size,
+        )
+        if signed["url"].startswith("/"):
+            signed["url"] = _abs_url(signed["url"])
+        uploads.append({"field": field, "key": key, **signed})
+
+    return jsonify({"uploads": uploads, "expires_in": Config.UPLOAD_URL_EXPIRES}), 200
+
+
+@routes.route("/card/<card_id>/uploads/finalize", methods=["POST"])
+@token_required
+@rate_limited("write")
+def finalize_card_uploads(user_email, card_id):
+    """
+    Corpo: {"avatar": key, "galeria": [keys], "replace_gallery": bool}.
+    Confere (HEAD) que cada objeto existe e anexa as URLs ao cartão (a posse é
+    checada na própria escrita condicional).
+    """
+    try:
+        data = request.json or {}
+        avatar_key = data.get("avatar")
+        galeria_keys = data.get("galeria") or []
+        keys = ([avatar_key] if avatar_key else []) + list(galeria_keys)
+        if not keys:
+            return jsonify({"error": "Nenhum arquivo informado."}), 400
+
+        for k in keys:
+            field = "avatar" if k == avatar_key else "galeria"
+            if not isinstance(k, str) or not k.startswith(f"cards/{card_id}/{field}/") or ".." in k:
+                return jsonify({"error": f"Chave fora do escopo do cartão: {k}"}), 400
+
+        falhas = []
+        for k, head in zip(keys, head_uploads(keys)):
+            if head is None:
+                falhas.append({"key": k, "error": "Arquivo não encontrado"})
+            elif head["size"] > Config.UPLOAD_MAX_BYTES:
+                falhas.append({"key": k, "error": "Arquivo maior que o permitido"})
+            elif head["content_type"] not in Config.UPLOAD_CONTENT_TYPES:
+                falhas.append({"key": k, "error": f"Tipo não permitido: {head['content_type']}"})
+        if falhas:
+            return jsonify({"error": "Uploads inválidos", "arquivos": falhas}), 400
+
+        fields, remove, gallery = {}, [], None
+        if avatar_key:
+            fields["foto_perfil"] = url_for_key(avatar_key)
+            remove.append("foto_perfil_variants")
+        if galeria_keys:
+            gallery = {
+                "op": "replace" if data.get("replace_gallery") else "append",
+                "items": [url_for_key(k) for k in galeria_keys],
+            }
+        card, previous = get_card_repository().update_card(card_id, user_email, fields=fields, remove=remove, gallery=gallery)
+        return _card_atualizado(card_id, card, previous)
+    except Exception as e:
+        erro = _erro_atualizacao(e)
+        if erro:
+            return erro
+        print("Erro ao finalizar uploads:", e)
+        return jsonify({"error": str(e)}), 500
+
+
+@routes.route("/uploads/signed/<token>", methods=["PUT"])
+@rate_limited("write")
+def receber_upload_assinado(token):
+    # fallback local do upload direto (sem S3): o token faz o papel da assinatura
+    try:
+        url = receive_signed_upload(token, request.stream, request.content_type)
+    except SignedUploadError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"url": _abs_url(url)}), 201
 
 
 # ---------- Rota protegida de teste ----------
@@ -316,11 +854,46 @@ def segredo(user_email):
     return jsonify({"mensagem": f"Você tem acesso autorizado como {user_email}"}), 200
 
 
-# ---------- Debug Dynamo (opcional) ----------
+# ---------- Debug cache (contadores p/ dimensionar) ----------
+@routes.route("/debug-cache", methods=["GET"])
+def debug_cache():
+    if not metrics.authorized():  # METRICS_TOKEN ou JWT de admin, como o /metrics
+        return jsonify({"error": "Acesso negado"}), 403
+    return jsonify(card_cache.stats()), 200
+
+
+# ---------- Exportação (substitui o antigo /debug-dynamo) ----------
+@routes.route("/cards:export", methods=["GET"])
 @routes.route("/debug-dynamo", methods=["GET"])
-def debug_dynamo():
+@token_required
+def export_cards_route(user_email):
+    """
+    NDJSON em streaming (só ADMIN_EMAILS). Query: segments, fields (lista ou "*"),
+    token (continuação), gzip=1 (força gzip; senão segue o Accept-Encoding), checkpoint_every.
+    A última linha diz como terminou: {"_complete": true, "count": N} ou {"error": ...}.
+    """
+    from app.export import iter_cards, ndjson_lines, parse_fields, decode_token, ExportTokenError
+    from app.compression import compress_stream, negotiate
+
+    if user_email not in Config.ADMIN_EMAILS:
+        return jsonify({"error": "Acesso negado"}), 403
+    args = request.args
     try:
-        response = cards_table.scan()
-        return jsonify(response.get("Items", [])), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        segments = min(max(int(args.get("segments", 4)), 1), Config.EXPORT_MAX_SEGMENTS)
+        checkpoint_every = max(int(args.get("checkpoint_every", 10)), 0)
+        token = args.get("token")
+        if token:
+            decode_token(token)
+    except (ValueError, ExportTokenError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    body = ndjson_lines(
+        iter_cards(segments=segments, fields=parse_fields(args.get("fields")), token=token),
+        checkpoint_every=checkpoint_every,
+    )
+    headers = {"Content-Disposition": "attachment; filename=cards.ndjson", "Vary": "Accept-Encoding"}
+    encoding = "gzip" if args.get("gzip") in ("1", "true") else negotiate()
+    if encoding:
+        body = compress_stream(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(stream_with_context(body), mimetype="application/x-ndjson", headers=headers)
@@ -0,0 +1,363 @@
+# app/search.py
+"""
+Busca de cartões por nome, empresa e biografia (diretório de participantes).
+
+Índice invertido em memória, por worker:
+  - tokens sem acento e em minúsculas ("João" -> "joao"), sem as palavras
+    curtas mais comuns (de, da, e, ...)
+  - termo -> {card_id: peso}; o peso soma os campos em que o termo aparece
+    (nome 3, empresa 2, biografia 1)
+  - lista ordenada dos termos para prefixo (typeahead): "jo sil" acha
+    "João Silva"; o termo exato vale mais que o completado
+  - todas as palavras da busca precisam bater (E); ordem: pontuação, nome
+
+Nenhuma consulta vai ao DynamoDB. O índice é atualizado junto com
+create/update/delete do cartão (index_card / remove_card) e fica em disco:
+
+  - SEARCH_INDEX_PATH: retrato compacto (JSON com gzip, ids internados),
+    carregado inteiro na subida
+  - SEARCH_INDEX_PATH + ".journal": uma linha por alteração desde o retrato.
+    Cada worker aplica as linhas novas antes de responder (um stat quando
+    nada mudou), então a alteração feita num worker aparece nos outros.
+    Passando de SEARCH_JOURNAL_MAX_BYTES, o diário é incorporado a um retrato novo
+
+Sem retrato na primeira busca, o índice é montado com um scan dos cartões
+(uma vez, sob lock). Para remontar: flask --app main cards search-reindex
+"""
+import bisect
+import gzip
+import json
+import os
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+from app.config import Config
+from app.json_provider import dumps_bytes
+
+try:
+    import fcntl
+except ImportError:  # sem flock (ex.: Windows): um processo só
+    fcntl = None
+
+FIELD_WEIGHTS = {"nome": 3, "empresa": 2, "biografia": 1}
+PREVIEW_FIELDS = ("nome", "empresa", "foto_perfil")
+_PREFIX_FACTOR = 0.6  # termo completado pelo prefixo vale menos que o exato
+_STOPWORDS = frozenset("a as o os e de da das do dos du em no na nos nas um uma com por para the of and".split())
+_TOKEN = re.compile(r"[a-z0-9]+")
+_VERSION = 1
+
+
+def fold(text):
+    """Minúsculas sem acento: "Conceição" -> "conceicao"."""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(fold(text)) if t not in _STOPWORDS]
+
+
+def card_terms(card):
+    """{termo: peso} de um cartão."""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in set(tokenize(card.get(field))):
+            terms[term] = terms.get(term, 0) + weight
+    return terms
+
+
+def card_preview(card):
+    """O que a busca devolve de cada cartão (sem ler o cartão de novo)."""
+    preview = {f: card[f] for f in PREVIEW_FIELDS if card.get(f)}
+    thumb = (card.get("foto_perfil_variants") or {}).get("128")
+    if thumb:
+        preview["foto_perfil"] = thumb
+    bio = (card.get("biografia") or "").strip()
+    if bio:
+        preview["biografia"] = bio if len(bio) <= Config.SEARCH_PREVIEW_CHARS else bio[:Config.SEARCH_PREVIEW_CHARS].rstrip() + "…"
+    return preview
+
+
+# ---------- Índice em memória ----------
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}   # termo -> {card_id: peso}
+        self.doc_terms = {}  # card_id -> [termos], para remover/atualizar
+        self.previews = {}   # card_id -> prévia
+        self.sorted_terms = []
+
+    def __len__(self):
+        return len(self.previews)
+
+    def put(self, card_id, terms, preview):
+        self.remove(card_id)
+        for term, weight in terms.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = {}
+                bisect.insort(self.sorted_terms, term)
+            docs[card_id] = weight
+        self.doc_terms[card_id] = list(terms)
+        self.previews[card_id] = preview
+
+    def remove(self, card_id):
+        for term in self.doc_terms.pop(card_id, ()):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(card_id, None)
+            if not docs:
+                del self.postings[term]
+                i = bisect.bisect_left(self.sorted_terms, term)
+                if i < len(self.sorted_terms) and self.sorted_terms[i] == term:
+                    del self.sorted_terms[i]
+        self.previews.pop(card_id, None)
+
+    def _expand(self, token):
+        """(termo, fator) para o token: o exato e os que começam com ele."""
+        matches = [(token, 1.0)] if token in self.postings else []
+        if len(token) < Config.SEARCH_MIN_PREFIX:
+            return matches
+        i = bisect.bisect_right(self.sorted_terms, token)
+        limit = Config.SEARCH_MAX_EXPANSIONS
+        while i < len(self.sorted_terms) and self.sorted_terms[i].startswith(token) and limit:
+            matches.append((self.sorted_terms[i], _PREFIX_FACTOR))
+            i += 1
+            limit -= 1
+        return matches
+
+    def search(self, query):
+        """[(card_id, pontuação)] ordenado; todos os tokens da busca precisam bater."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        scores = None
+        # o token mais raro primeiro: o conjunto de candidatos já começa pequeno
+        for token in sorted(tokens, key=lambda t: sum(len(self.postings[m]) for m, _ in self._expand(t))):
+            best = {}
+            for term, factor in self._expand(token):
+                for card_id, weight in self.postings[term].items():
+                    if scores is not None and card_id not in scores:
+                        continue
+                    score = weight * factor
+                    if score > best.get(card_id, 0):
+                        best[card_id] = score
+            scores = best if scores is None else {cid: scores[cid] + s for cid, s in best.items()}
+            if not scores:
+                return []
+        return sorted(
+            scores.items(),
+            key=lambda item: (-item[1], fold(self.previews[item[0]].get("nome")), item[0]),
+        )
+
+    # ---------- Arquivo ----------
+    def to_bytes(self):
+        """Retrato compacto: ids numa lista, postings como [posição, peso, posição, peso, ...]."""
+        ids = sorted(self.previews)
+        position = {cid: i for i, cid in enumerate(ids)}
+        terms = {}
+        for term in self.sorted_terms:
+            flat = []
+            for cid, weight in self.postings[term].items():
+                flat += [position[cid], weight]
+            terms[term] = flat
+        payload = {"v": _VERSION, "ids": ids, "previews": [self.previews[cid] for cid in ids], "terms": terms}
+        return gzip.compress(dumps_bytes(payload), compresslevel=6, mtime=0)
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(gzip.decompress(data))
+        if payload.get("v") != _VERSION:
+            raise ValueError("Versão do índice de busca desconhecida")
+        index = cls()
+        ids = payload["ids"]
+        index.previews = dict(zip(ids, payload["previews"]))
+        index.doc_terms = {cid: [] for cid in ids}
+        index.sorted_terms = sorted(payload["terms"])
+        for term in index.sorted_terms:
+            flat = payload["terms"][term]
+            docs = index.postings[term] = {}
+            for i in range(0, len(flat), 2):
+                cid = ids[flat[i]]
+                docs[cid] = flat[i + 1]
+                index.doc_terms[cid].append(term)
+        return index
+
+
+# ---------- Índice compartilhado (retrato + diário) ----------
+class SearchStore:
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.index = None
+        self._snapshot_id = None
+        self._journal_pos = 0
+        self._mutex = threading.RLock()
+
+    @contextmanager
+    def _locked(self, exclusive):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._mutex, open(self.path + ".lock", "a+") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _stat_id(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _journal_size(self):
+        try:
+            return os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            return 0
+
+    def _load_snapshot(self):
+        with open(self.path, "rb") as f:
+            self.index = SearchIndex.from_bytes(f.read())
+        self._snapshot_id = self._stat_id(self.path)
+        self._journal_pos = 0
+
+    def _apply_journal(self):
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(self._journal_pos)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # linha ainda sendo escrita (não acontece sob o lock; por segurança)
+                self._journal_pos += len(line)
+                entry = json.loads(line)
+                if entry["op"] == "put":
+                    self.index.put(entry["id"], entry["terms"], entry["preview"])
+                else:
+                    self.index.remove(entry["id"])
+
+    def _changed(self):
+        return (self.index is None or self._stat_id(self.path) != self._snapshot_id
+                or self._journal_size() != self._journal_pos)
+
+    def refresh(self):
+        """Traz o índice deste worker para o estado do disco (quase sempre só dois stats)."""
+        if not self._changed():
+            return self.index
+        if self.index is None and not os.path.exists(self.path):
+            self.rebuild(only_if_missing=True)
+            return self.index
+        with self._locked(exclusive=False):
+            if self.index is None or self._stat_id(self.path) != self._snapshot_id:
+                self._load_snapshot()
+            self._apply_journal()
+        return self.index
+
+    def append(self, entries):
+        """Grava alterações no diário e já as aplica neste worker."""
+        lines = b"".join(dumps_bytes(e) + b"\n" for e in entries)
+        if not lines:
+            return
+        if self.index is None and not os.path.exists(self.path):
+            self.rebuild(only_if_missing=True)
+        with self._locked(exclusive=True):
+            if self.index is None or self._stat_id(self.path) != self._snapshot_id:
+                self._load_snapshot()
+            with open(self.journal_path, "ab") as f:
+                f.write(lines)
+            self._apply_journal()
+            if self._journal_pos > Config.SEARCH_JOURNAL_MAX_BYTES:
+                self._write_snapshot()
+
+    def _write_snapshot(self):
+        # chamado com o lock exclusivo: ninguém escreve no diário enquanto isso
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.index.to_bytes())
+        os.replace(tmp, self.path)
+        open(self.journal_path, "wb").close()
+        self._snapshot_id = self._stat_id(self.path)
+        self._journal_pos = 0
+
+    def rebuild(self, repository=None, only_if_missing=False):
+        """
+        Monta o índice do zero com um scan dos cartões e grava o retrato.
+        only_if_missing: se outro worker montou enquanto este esperava o lock, só carrega.
+        """
+        from app.card_repository import get_card_repository
+
+        repository = repository or get_card_repository()
+        fields = ["card_id", *FIELD_WEIGHTS, *PREVIEW_FIELDS, "foto_perfil_variants"]
+        with self._locked(exclusive=True):
+            if only_if_missing and os.path.exists(self.path):
+                self._load_snapshot()
+                self._apply_journal()
+                return len(self.index)
+            print("Montando o índice de busca a partir dos cartões...")
+            index, start = SearchIndex(), None
+            while True:
+                items, start = repository.scan_page(0, 1, start, 1000, list(dict.fromkeys(fields)))
+                for card in items:
+                    index.put(card["card_id"], card_terms(card), card_preview(card))
+                if not start:
+                    break
+            self.index = index
+            self._write_snapshot()
+        return len(index)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_search_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SearchStore(Config.SEARCH_INDEX_PATH)
+    return _store
+
+
+def set_search_store(store):
+    global _store
+    _store = store
+
+
+# ---------- Operações ----------
+def index_card(card):
+    """Cartão criado/alterado: entra (ou é atualizado) no índice."""
+    if Config.SEARCH_ENABLED and card and card.get("card_id"):
+        get_search_store().append([{
+            "op": "put", "id": card["card_id"], "terms": card_terms(card), "preview": card_preview(card),
+        }])
+
+
+def index_cards(cards):
+    if Config.SEARCH_ENABLED:
+        get_search_store().append([
+            {"op": "put", "id": c["card_id"], "terms": card_terms(c), "preview": card_preview(c)} for c in cards
+        ])
+
+
+def remove_card(card_id):
+    if Config.SEARCH_ENABLED:
+        get_search_store().append([{"op": "del", "id": card_id}])
+
+
+def search(query, limit=20, offset=0):
+    """{"total", "results": [{"card_id", "score", **prévia}], "next_offset" | None}."""
+    with get_search_store()._mutex:
+        index = get_search_store().refresh()
+        ranked = index.search(query)
+        page = [{"card_id": cid, "score": round(score, 2), **index.previews[cid]}
+                for cid, score in ranked[offset:offset + limit]]
+    next_offset = offset + limit if offset + limit < len(ranked) else None
+    return {"total": len(ranked), "results": page, "next_offset": next_offset}
@@ -7,60 +7,31 @@ from flask import request, jsonify
 from app.config import Config
 from functools import wraps
 import os
-import json
 from uuid import uuid4
-from app.aws import users_table
-from boto3.dynamodb.conditions import Attr
-import boto3
+from app import aws
+from app.card_repository import find_card_by_owner
+from app.local_store import get_local_store
+from app import image_processing
 import uuid
 
-dynamodb = boto3.resource(
-    'dynamodb',
-    region_name=Config.AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY")
-)
-
-users_table = dynamodb.Table("GetiCardUsers")
-cards_table = dynamodb.Table("Testecard")
-
 SECRET_KEY = Config.SECRET_KEY
 
-# Arquivo de persistência em disco
-CARDS_FILE = os.path.join(os.getcwd(), 'cards.json')
-
-# Carrega cartões do arquivo JSON
-if os.path.exists(CARDS_FILE):
-    with open(CARDS_FILE, 'r', encoding='utf-8') as f:
-        try:
-            CARDS = json.load(f)
-        except json.JSONDecodeError:
-            CARDS = {}
-else:
-    CARDS = {}
-
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
-# Usuários em memória (pode evoluir para JSON também)
-USERS = {}
-
+# Persistência local em SQLite (app/local_store.py), aberta só no primeiro uso
 def save_user(user_data: dict) -> None:
-    key = user_data['email']
-    if key in USERS:
-        raise RuntimeError('Usuário já existe')
-    USERS[key] = user_data
+    get_local_store().save_user(user_data)
 
-# Salva cartão em memória e em disco
+# Salva (só) este cartão em disco
 def save_card(card_data: dict) -> None:
-    key = card_data['card_id']
-    CARDS[key] = card_data
-    with open(CARDS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(CARDS, f, ensure_ascii=False, indent=2)
+    get_local_store().save_card(card_data)
 
-# Obtém cartão do dicionário em memória
 def get_card_local(card_id: str) -> dict:
-    return CARDS.get(card_id)
+    return get_local_store().get_card(card_id)
+
+def get_card_local_by_email(email: str) -> dict:
+    return get_local_store().find_card_by_email(email)
 
 # Salva imagem base64 localmente
 def salvar_imagem_local(base64_data: str, card_id: str) -> str:
@@ -68,10 +39,18 @@ def salvar_imagem_local(base64_data: str, card_id: str) -> str:
     os.makedirs(uploads_dir, exist_ok=True)
     if ',' in base64_data:
         base64_data = base64_data.split(',', 1)[1]
-    filename = f"{card_id}_{uuid.uuid4().hex}.png"
+    data = base64.b64decode(base64_data)
+    ext = "png"
+    if image_processing.enabled():
+        # sem EXIF, dimensão limitada e recodificada (WebP/AVIF)
+        try:
+            data, _, ext = image_processing.process_image_async(data)[""]
+        except ValueError:
+            pass
+    filename = f"{card_id}_{uuid.uuid4().hex}.{ext}"
     path = os.path.join(uploads_dir, filename)
     with open(path, 'wb') as f:
-        f.write(base64.b64decode(base64_data))
+        f.write(data)
     return f"/uploads/{filename}"
 
 
@@ -91,18 +70,16 @@ def token_required(f):
     return decorated
 
 def save_user_dynamo(user_dict):
-    users_table.put_item(Item=user_dict)
+    aws.users_table.put_item(Item=user_dict)
 
 def get_user_dynamo(email):
-    response = users_table.get_item(Key={'email': email})
+    response = aws.users_table.get_item(Key={'email': email})
     return response.get('Item')
 
 def save_card_dynamo(card_dict):
-    cards_table.put_item(Item=card_dict)
+    aws.cards_table.put_item(Item=card_dict)
 
 def get_card_by_user(email):
-    response = cards_table.scan(FilterExpression=Attr('user_email').eq(email))
-    items = response.get("Items", [])
-    return items[0] if items else None
+    return find_card_by_owner(email)
 
 
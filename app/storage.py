@@ -1,6 +1,8 @@
 # app/storage.py
-import os, uuid
+import os, re, uuid, threading, hashlib, mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
+from app import content_index, image_processing
 
 _BUCKET = os.getenv("S3_BUCKET")
 _REGION = os.getenv("AWS_REGION") or "us-east-1"
@@ -8,48 +10,276 @@ _AK = os.getenv("AWS_ACCESS_KEY_ID")
 _SK = os.getenv("AWS_SECRET_ACCESS_KEY")
 _ENDPOINT = os.getenv("S3_ENDPOINT_URL")  # opcional
 _USE_S3 = bool(_BUCKET and _AK and _SK)
+_UPLOAD_WORKERS = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
 
-if _USE_S3:
-    import boto3
-    _s3 = boto3.client(
+def get_s3():
+    """Client S3 compartilhado (criado no 1º uso pelo registro em app/aws.py)."""
+    from app.aws import get_client
+    return get_client(
         "s3",
-        region_name=_REGION,
-        aws_access_key_id=_AK,
-        aws_secret_access_key=_SK,
         endpoint_url=_ENDPOINT if _ENDPOINT else None,
+        region_name=_REGION,
+        # pool >= threads de upload, senão as threads disputam conexões
+        max_pool_connections=max(10, _UPLOAD_WORKERS * 2),
+    )
+
+def uses_s3():
+    return _USE_S3
+
+def bucket():
+    return _BUCKET
+
+def _transfer_config():
+    # multipart em partes de 8 MB: o upload_fileobj lê do disco aos poucos
+    from boto3.s3.transfer import TransferConfig
+    from app.config import Config
+    return TransferConfig(
+        multipart_threshold=Config.INGEST_PART_SIZE,
+        multipart_chunksize=Config.INGEST_PART_SIZE,
+        max_concurrency=4,
     )
 
 _UPLOAD_ROOT = os.path.join(os.path.dirname(__file__), "..", "uploads")
 
-def _local_save(file, key_prefix="uploads"):
+# O mimetypes depende do /etc/mime.types e nem todo sistema conhece heic/avif:
+# sem isso o head_upload local (e o /uploads) devolveriam tipo None.
+mimetypes.add_type("image/heic", ".heic")
+mimetypes.add_type("image/avif", ".avif")
+
+# ---------- Endereçamento pelo conteúdo ----------
+# Imagens e arquivos enviados ficam numa chave derivada do sha256 dos bytes:
+# content/<aa>/<sha256>.<ext> no S3, uploads/<sha256>.<ext> no local. Se a
+# chave já existe (HEAD / arquivo presente), a transferência é pulada. Como a
+# mesma chave pode estar em vários cartões, quem apaga é a fila de limpeza,
+# consultando as contagens de app/content_index.py.
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+def _ext(filename):
+    return os.path.splitext(secure_filename(filename or ""))[1].lower()
+
+def content_key(digest, ext):
+    from app.config import Config
+    return f"{Config.CONTENT_PREFIX.strip('/')}/{digest[:2]}/{digest}{ext}"
+
+def _hash_stream(stream):
+    """sha256 de um stream que volta para o início (FileStorage comum)."""
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(64 * 1024), b""):
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+def _stored(url):
+    """True se o objeto da URL (deste app) existe."""
+    key = key_for_url(url)
+    if key is None:
+        return False
+    target, name = key
+    if target == "s3":
+        return head_upload(name) is not None
+    return os.path.isfile(os.path.join(_UPLOAD_ROOT, name))
+
+def put_content(data, ext, content_type):
+    """Grava bytes na chave do seu conteúdo (pula se já existir). Retorna a URL."""
+    digest = hashlib.sha256(data).hexdigest()
+    if _USE_S3:
+        key = content_key(digest, ext)
+        if head_upload(key) is None:
+            get_s3().put_object(Bucket=_BUCKET, Key=key, Body=data, ACL="public-read",
+                                ContentType=content_type, CacheControl=_IMMUTABLE)
+        return _s3_url(key)
     os.makedirs(_UPLOAD_ROOT, exist_ok=True)
-    fname = f"{uuid.uuid4().hex}-{secure_filename(file.filename or 'file.bin')}"
+    fname = f"{digest}{ext}"
     path = os.path.join(_UPLOAD_ROOT, fname)
-    file.save(path)
+    if not os.path.exists(path):
+        tmp = os.path.join(_UPLOAD_ROOT, f".{uuid.uuid4().hex}.part")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return f"/uploads/{fname}"
+
+def _local_save(file, key_prefix="uploads"):
+    from app.ingest import LocalSink
+
+    os.makedirs(_UPLOAD_ROOT, exist_ok=True)
+    ext = _ext(file.filename)
+    stream = getattr(file, "stream", None)
+    if isinstance(stream, LocalSink):
+        # recebido em streaming (hash já calculado): só move o arquivo, se ainda não existir
+        fname = f"{stream.sha256}{ext}"
+        path = os.path.join(_UPLOAD_ROOT, fname)
+        if not os.path.exists(path):
+            stream.promote(path)
+        return f"/uploads/{fname}"
+    hasher = hashlib.sha256()
+    tmp = os.path.join(_UPLOAD_ROOT, f".{uuid.uuid4().hex}.part")
+    try:
+        with open(tmp, "wb") as out:
+            for chunk in iter(lambda: file.stream.read(64 * 1024), b""):
+                hasher.update(chunk)
+                out.write(chunk)
+        fname = f"{hasher.hexdigest()}{ext}"
+        path = os.path.join(_UPLOAD_ROOT, fname)
+        if not os.path.exists(path):
+            os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
     return f"/uploads/{fname}"
 
+def _s3_url(key):
+    host = f"https://{_BUCKET}.s3.{_REGION}.amazonaws.com"
+    if _ENDPOINT and "amazonaws.com" not in _ENDPOINT:
+        # provedor S3 compatível (ex.: R2/Wasabi)
+        host = _ENDPOINT.rstrip("/")
+        # tenta usar estilo virtual-host se possível
+        if _BUCKET not in host:
+            # path-style: https://endpoint/bucket/key
+            return f"{host}/{_BUCKET}/{key}"
+    return f"{host}/{key}"
+
+def put_bytes_at(key, data, content_type, cache_control=None):
+    """Grava (sobrescrevendo) numa chave fixa, ex.: artefatos em cards/<id>/. Retorna a URL."""
+    if _USE_S3:
+        extra = {"CacheControl": cache_control} if cache_control else {}
+        get_s3().put_object(Bucket=_BUCKET, Key=key, Body=data, ACL="public-read", ContentType=content_type, **extra)
+        return _s3_url(key)
+    os.makedirs(_UPLOAD_ROOT, exist_ok=True)
+    path = os.path.join(_UPLOAD_ROOT, _local_name(key))
+    tmp = os.path.join(_UPLOAD_ROOT, f".{uuid.uuid4().hex}.part")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)  # quem estiver lendo vê o arquivo antigo ou o novo, nunca pela metade
+    return url_for_key(key)
+
+def _upload_raw(file, key_prefix="uploads"):
+    if _USE_S3:
+        from app.ingest import S3MultipartSink
+
+        stream = getattr(file, "stream", None)
+        digest = getattr(stream, "sha256", None) or _hash_stream(file.stream)
+        key = content_key(digest, _ext(file.filename))
+        if head_upload(key) is not None:
+            # já existe: o temporário do multipart (se houver) some no fim do request
+            return _s3_url(key)
+        extra = {"ACL": "public-read", "ContentType": file.mimetype or "application/octet-stream",
+                 "CacheControl": _IMMUTABLE, "Metadata": {"sha256": digest}}
+        if isinstance(stream, S3MultipartSink):
+            # já está no S3 (multipart durante o request): só copia para a chave final
+            stream.promote(key, extra)
+        else:
+            get_s3().upload_fileobj(file, _BUCKET, key, ExtraArgs=extra, Config=_transfer_config())
+        return _s3_url(key)
+    # fallback local
+    return _local_save(file, key_prefix)
+
+def upload_image_variants(file, key_prefix="uploads", kind=None):
+    """
+    Processa (sem EXIF, dimensão limitada, WebP/AVIF) e envia a imagem.
+    Com kind="avatar"/"galeria" também envia as variantes de tamanho fixo.
+    Retorna {"url": principal, "variants": {nome: url}}.
+
+    Cada saída vai para a chave do seu conteúdo (key_prefix ficou só para
+    compatibilidade). Um arquivo já recebido antes, com o mesmo processamento,
+    é respondido pelo índice de conteúdo sem reprocessar nem transferir.
+    """
+    if not file:
+        return {"url": "", "variants": {}}
+    if not image_processing.enabled():
+        url = _upload_raw(file, key_prefix)
+        content_index.touch_urls([url])
+        return {"url": url, "variants": {}}
+
+    from app.ingest import LocalSink
+
+    # recebido em streaming: o processo do pool lê direto do arquivo (e o hash já veio pronto)
+    stream = getattr(file, "stream", None)
+    if isinstance(stream, LocalSink) and stream.path:
+        data, digest = stream.path, stream.sha256
+    else:
+        data = file.read()
+        digest = hashlib.sha256(data).hexdigest()
+    source = f"{digest}:{image_processing.signature(kind)}"
+    known = content_index.lookup(source)
+    if known:
+        urls = [known["url"], *known["variants"].values()]
+        if all(_stored(u) for u in urls):
+            content_index.touch_urls(urls)
+            return known
+        content_index.forget_source(source)  # algum objeto já foi apagado: processa de novo
+
+    try:
+        processed = image_processing.process_image_async(data, kind)
+    except ValueError:
+        # não é imagem que o Pillow entenda: guarda como veio
+        file.stream.seek(0)
+        url = _upload_raw(file, key_prefix)
+        content_index.touch_urls([url])
+        return {"url": url, "variants": {}}
+
+    urls = {name: put_content(body, f".{ext}", content_type) for name, (body, content_type, ext) in processed.items()}
+    result = {"url": urls.pop(""), "variants": urls}
+    content_index.remember(source, result)
+    return result
+
 def upload_image(file, key_prefix="uploads"):
     if not file:
         return ""
+    return upload_image_variants(file, key_prefix)["url"]
+
+def key_for_url(url):
+    """
+    ("s3", chave) ou ("local", nome em uploads/) para URLs gravadas por este
+    app; None para qualquer outra (links externos não são apagados).
+    """
+    if not isinstance(url, str) or not url:
+        return None
+    from urllib.parse import urlparse
+
+    path = urlparse(url).path
+    if path.startswith("/uploads/") and (url.startswith("/") or not _USE_S3):
+        name = path[len("/uploads/"):]
+        return ("local", name) if name and "/" not in name and not name.startswith(".") else None
     if _USE_S3:
-        key = f"{key_prefix.strip('/')}/{uuid.uuid4().hex}-{secure_filename(file.filename or 'file.bin')}"
-        _s3.upload_fileobj(
-            file, _BUCKET, key,
-            ExtraArgs={"ACL": "public-read", "ContentType": file.mimetype or "application/octet-stream"}
-        )
-        host = f"https://{_BUCKET}.s3.{_REGION}.amazonaws.com"
-        if _ENDPOINT and "amazonaws.com" not in _ENDPOINT:
-            # provedor S3 compatível (ex.: R2/Wasabi)
-            host = _ENDPOINT.rstrip("/")
-            # tenta usar estilo virtual-host se possível
-            if _BUCKET not in host:
-                # path-style: https://endpoint/bucket/key
-                return f"{host}/{_BUCKET}/{key}"
-        return f"{host}/{key}"
-    # fallback local
-    return _local_save(file, key_prefix)
+        prefix = _s3_url("")
+        if url.startswith(prefix) and len(url) > len(prefix):
+            return ("s3", url[len(prefix):].split("?")[0])
+    return None
+
+_CARD_UPLOAD = re.compile(r"(avatar|galeria)/[^/]+")
+_CARD_UPLOAD_LOCAL = re.compile(r"(avatar|galeria)_[0-9a-f]{32}\.[a-z0-9]+")
+
+def card_owns_key(card_id, target, key):
+    """
+    True se a chave (de key_for_url) fica no espaço do cartão: cards/<card_id>/
+    avatar|galeria/<arquivo> (uploads assinados e legados) ou um artefato. Chave
+    de outro cartão, de uploads/ antigos ou endereçada pelo conteúdo: False.
+    """
+    from app.card_artifacts import ARTIFACTS
+
+    if not card_id:
+        return False
+    files = {name for name, _ in ARTIFACTS.values()}
+    if target == "s3":
+        prefix = f"cards/{card_id}/"
+        rest = key[len(prefix):] if key.startswith(prefix) else None
+        return rest is not None and (rest in files or bool(_CARD_UPLOAD.fullmatch(rest)))
+    # uploads/ local é plano (ver _local_name): o resto do nome precisa ser de um arquivo do
+    # próprio cartão, senão "cards_ab_" pegaria os arquivos do cartão "ab_x"
+    if key in {_local_name(f"cards/{card_id}/{name}") for name in files}:
+        return True
+    prefix = _local_name(f"cards/{card_id}/x")[:-1]
+    return key.startswith(prefix) and bool(_CARD_UPLOAD_LOCAL.fullmatch(key[len(prefix):]))
+
+def delete_local_upload(name):
+    """Apaga um arquivo de uploads/ (ausente conta como apagado)."""
+    try:
+        os.remove(os.path.join(_UPLOAD_ROOT, name))
+    except FileNotFoundError:
+        pass
 
 def delete_image_by_url(url: str):
+    # apaga na hora, sem olhar as referências: para chaves endereçadas pelo conteúdo use cleanup.enqueue_urls
     if not url or not _USE_S3:
         return
     try:
@@ -59,7 +289,172 @@ def delete_image_by_url(url: str):
         # Se vier em formato path-style: /bucket/key
         if key.split("/")[0] == _BUCKET:
             key = "/".join(key.split("/")[1:])
-        _s3.delete_object(Bucket=_BUCKET, Key=key)
+        get_s3().delete_object(Bucket=_BUCKET, Key=key)
     except Exception:
         # não quebra a app por erro de limpeza
         pass
+
+
+# ---------- Upload em lote (paralelo) ----------
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_UPLOAD_WORKERS, thread_name_prefix="upload")
+    return _executor
+
+def _upload_one(file, key_prefix, kind=None):
+    try:
+        result = upload_image_variants(file, key_prefix=key_prefix, kind=kind)
+        return {"filename": file.filename, "url": result["url"], "variants": result["variants"], "error": None}
+    except Exception as e:
+        return {"filename": file.filename, "url": None, "variants": {}, "error": str(e)}
+
+def _discard(urls):
+    """
+    Manda os uploads deste lote para a fila de limpeza: a chave pode ser de
+    um objeto que outro cartão já usa, então não dá para apagar direto.
+    """
+    from app.cleanup import enqueue_urls
+
+    try:
+        enqueue_urls([u for u in urls if u])
+    except Exception as e:
+        print("Erro ao enfileirar uploads descartados:", e)
+
+def upload_images(items):
+    """
+    Envia vários arquivos em paralelo (pool de threads limitado, mesmo client S3).
+
+    items: lista de (file, key_prefix) ou (file, key_prefix, kind). Retorna uma
+    lista na mesma ordem com {"filename", "url", "variants", "error"}. Se algum
+    arquivo falhar, os que já subiram são apagados e todos ficam com url=None.
+    """
+    items = [tuple(item) for item in items if item[0] and item[0].filename]
+    if not items:
+        return []
+    if len(items) == 1:
+        results = [_upload_one(*items[0])]
+    else:
+        executor = _get_executor()
+        futures = [executor.submit(_upload_one, *item) for item in items]
+        results = [fut.result() for fut in futures]
+
+    if any(r["error"] for r in results):
+        _discard([url for r in results for url in [r["url"], *r["variants"].values()]])
+        for r in results:
+            r["url"], r["variants"] = None, {}
+    return results
+
+
+# ---------- Upload direto (URL assinada) ----------
+# O cliente envia os bytes direto para o S3 (ou para /uploads/signed/<token>
+# no fallback local) e depois só avisa a API quais chaves subiu.
+_SIGNED_SALT = "upload-direto"
+
+class SignedUploadError(ValueError):
+    pass
+
+def _signer():
+    from itsdangerous import URLSafeTimedSerializer
+    from app.config import Config
+    return URLSafeTimedSerializer(Config.SECRET_KEY, salt=_SIGNED_SALT)
+
+def _local_name(key):
+    # uploads/ local é plano: cards/<id>/avatar/x.jpg -> cards_<id>_avatar_x.jpg
+    return secure_filename(key.replace("/", "_"))
+
+def url_for_key(key):
+    return _s3_url(key) if _USE_S3 else f"/uploads/{_local_name(key)}"
+
+def presign_upload(key, content_type, max_size, expires=900, method="post", size=None):
+    """
+    URL assinada para enviar um arquivo direto para `key`.
+    POST (padrão) limita o tamanho a max_size; PUT assina o tamanho exato (`size`).
+    """
+    if _USE_S3:
+        if method == "put":
+            url = get_s3().generate_presigned_url(
+                "put_object",
+                Params={"Bucket": _BUCKET, "Key": key, "ContentType": content_type,
+                        "ContentLength": size, "ACL": "public-read"},
+                ExpiresIn=expires,
+            )
+            return {"method": "PUT", "url": url,
+                    "headers": {"Content-Type": content_type, "x-amz-acl": "public-read"}}
+        post = get_s3().generate_presigned_post(
+            _BUCKET, key,
+            Fields={"Content-Type": content_type, "acl": "public-read"},
+            Conditions=[
+                {"acl": "public-read"},
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_size],
+            ],
+            ExpiresIn=expires,
+        )
+        return {"method": "POST", "url": post["url"], "fields": post["fields"]}
+    # fallback local: token assinado com a SECRET_KEY no lugar da assinatura AWS
+    token = _signer().dumps({"k": key, "ct": content_type, "max": max_size, "exp": expires})
+    return {"method": "PUT", "url": f"/uploads/signed/{token}", "headers": {"Content-Type": content_type}}
+
+def receive_signed_upload(token, stream, content_type, chunk_size=64 * 1024):
+    """Recebe (fallback local) o corpo de um PUT em /uploads/signed/<token>. Retorna a URL."""
+    from itsdangerous import BadSignature
+
+    import time
+
+    try:
+        claims, signed_at = _signer().loads(token, return_timestamp=True)
+    except BadSignature:
+        raise SignedUploadError("URL de upload inválida")
+    if time.time() - signed_at.timestamp() > claims["exp"]:
+        raise SignedUploadError("URL de upload expirada")
+    if (content_type or "").split(";")[0].strip() != claims["ct"]:
+        raise SignedUploadError("Content-Type diferente do assinado")
+
+    os.makedirs(_UPLOAD_ROOT, exist_ok=True)
+    path = os.path.join(_UPLOAD_ROOT, _local_name(claims["k"]))
+    tmp = f"{path}.part"
+    size = 0
+    try:
+        with open(tmp, "wb") as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > claims["max"]:
+                    raise SignedUploadError("Arquivo maior que o permitido")
+                f.write(chunk)
+        if not size:
+            raise SignedUploadError("Arquivo vazio")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return url_for_key(claims["k"])
+
+def head_upload(key):
+    """{"size", "content_type"} do objeto enviado, ou None se não existir."""
+    if _USE_S3:
+        from botocore.exceptions import ClientError
+        try:
+            resp = get_s3().head_object(Bucket=_BUCKET, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {"size": resp["ContentLength"], "content_type": resp.get("ContentType")}
+    path = os.path.join(_UPLOAD_ROOT, _local_name(key))
+    if not os.path.isfile(path):
+        return None
+    return {"size": os.path.getsize(path), "content_type": mimetypes.guess_type(path)[0]}
+
+def head_uploads(keys):
+    """head_upload em paralelo, mesma ordem de `keys`."""
+    if len(keys) <= 1:
+        return [head_upload(k) for k in keys]
+    return list(_get_executor().map(head_upload, keys))
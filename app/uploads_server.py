@@ -0,0 +1,158 @@
+# app/uploads_server.py
+"""
+Serve os arquivos de uploads/ (fallback local e imagens legadas).
+
+Na subida do app o diretório é lido uma vez (os.scandir) e cada arquivo
+vira uma entrada em memória com tamanho, mtime, tipo e ETag, então servir
+um arquivo não faz stat nem lê o conteúdo para calcular nada. Arquivos que
+aparecem depois (outro worker gravou) entram no índice no primeiro acesso.
+
+Cache:
+  - nomes com hash do conteúdo ou uuid (tudo que o app grava) nunca mudam
+    de conteúdo: Cache-Control "max-age=1 ano, immutable"; nos nomes com
+    hash (storage.put_content, <sha256>.<ext>) o próprio hash é o ETag
+  - outros nomes: max-age=UPLOADS_MAX_AGE, ETag de tamanho+mtime
+
+Envio:
+  - padrão: wsgi.file_wrapper (o gunicorn usa sendfile, sem copiar os bytes
+    pelo Python); Range/If-None-Match tratados pelo Werkzeug
+  - UPLOADS_OFFLOAD=x-accel: só os cabeçalhos + X-Accel-Redirect, o nginx
+    envia o arquivo (location internal em UPLOADS_ACCEL_PREFIX)
+  - UPLOADS_OFFLOAD=x-sendfile: X-Sendfile com o caminho absoluto
+"""
+import mimetypes
+import os
+import re
+import threading
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, abort, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from app.config import Config
+
+UPLOAD_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "uploads"))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_HASHED = re.compile(r"^([0-9a-f]{32})(?:[0-9a-f]{32}\.|-)")  # <sha256>.<ext> ou o legado <hash32>-<aleatório>
+_UNIQUE = re.compile(r"[0-9a-f]{32}")       # hash ou uuid4().hex no nome
+
+uploads = Blueprint("uploads", __name__)
+
+
+class FileMeta:
+    __slots__ = ("path", "size", "mtime", "stamp", "etag", "content_type", "immutable")
+
+    def __init__(self, name, path, size, mtime):
+        self.path = path
+        self.size = size
+        self.stamp = (size, mtime)
+        self.mtime = datetime.fromtimestamp(int(mtime), timezone.utc)
+        hashed = _HASHED.match(name)
+        self.etag = hashed.group(1) if hashed else f"{size:x}-{int(mtime * 1000):x}"
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.immutable = bool(_UNIQUE.search(name))
+
+
+class UploadIndex:
+    def __init__(self, root):
+        self.root = root
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        entries = {}
+        if os.path.isdir(self.root):
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    entries[entry.name] = FileMeta(entry.name, entry.path, st.st_size, st.st_mtime)
+        with self._lock:
+            self._entries = entries
+        return len(entries)
+
+    def get(self, name):
+        meta = self._entries.get(name)
+        if meta is not None and meta.immutable:
+            return meta
+        if meta is not None:
+            # nome fixo (ex.: artefatos de cards/<id>/) pode ser regravado: confere o mtime
+            try:
+                st = os.stat(meta.path)
+            except FileNotFoundError:
+                self.discard(name)
+                return None
+            if (st.st_size, st.st_mtime) == meta.stamp:
+                return meta
+        # gravado depois da subida (ou por outro worker)
+        if name.startswith(".") or "/" in name:
+            return None
+        path = safe_join(self.root, name)
+        if path is None or not os.path.isfile(path):
+            return None
+        st = os.stat(path)
+        meta = FileMeta(name, path, st.st_size, st.st_mtime)
+        with self._lock:
+            self._entries[name] = meta
+        return meta
+
+    def discard(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+upload_index = UploadIndex(UPLOAD_ROOT)
+
+
+def _response(name, meta):
+    if Config.UPLOADS_OFFLOAD == "x-accel":
+        resp = Response(mimetype=meta.content_type)
+        resp.headers["X-Accel-Redirect"] = f"{Config.UPLOADS_ACCEL_PREFIX.rstrip('/')}/{name}"
+        return resp
+    if Config.UPLOADS_OFFLOAD == "x-sendfile":
+        resp = Response(mimetype=meta.content_type)
+        resp.headers["X-Sendfile"] = meta.path
+        return resp
+    try:
+        f = open(meta.path, "rb")
+    except FileNotFoundError:
+        # apagado (ex.: fila de limpeza) depois de entrar no índice
+        upload_index.discard(name)
+        abort(404)
+    resp = Response(wrap_file(request.environ, f), mimetype=meta.content_type, direct_passthrough=True)
+    resp.content_length = meta.size
+    return resp
+
+
+@uploads.route("/uploads/<path:filename>", methods=["GET", "HEAD"])
+def servir_arquivo(filename):
+    meta = upload_index.get(filename)
+    if meta is None:
+        abort(404)
+
+    resp = _response(filename, meta)
+    resp.set_etag(meta.etag)
+    resp.last_modified = meta.mtime
+    resp.cache_control.public = True
+    if meta.immutable:
+        resp.cache_control.max_age = IMMUTABLE_MAX_AGE
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.max_age = Config.UPLOADS_MAX_AGE
+    if Config.UPLOADS_OFFLOAD:
+        # Range e validação ficam com o servidor da frente
+        return resp
+    return resp.make_conditional(request, accept_ranges=True, complete_length=meta.size)
+
+
+def init_app(app):
+    """Registra a rota e monta o índice (uma vez, na subida do worker)."""
+    app.register_blueprint(uploads)
+    n = upload_index.build()
+    app.logger.debug("uploads: %d arquivos indexados", n)
@@ -0,0 +1,27 @@
+# asgi.py
+"""
+Ponte ASGI para o mesmo app WSGI (o app continua síncrono).
+
+    uvicorn asgi:app --workers 2 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker -w 2 asgi:app
+
+Cada requisição roda numa thread do pool do a2wsgi (ASGI_THREADS por
+worker), então o ganho é o mesmo do worker com threads em WSGI:
+
+    gunicorn -k gthread --threads 16 -w 2 main:app
+
+Só o /login é uma view async (usuário e cartão lidos juntos, app/aio.py);
+GET/criação/atualização do cartão e o lote fazem chamadas dependentes umas
+das outras e seguem síncronos. O worker "sync" padrão do gunicorn atende
+uma requisição por vez por processo. Comparação de req/s por worker:
+scripts/benchmark.py --server.
+
+O WsgiToAsgi do asgiref roda tudo numa thread só ("thread sensitive") e
+não serve aqui.
+"""
+from a2wsgi import WSGIMiddleware
+
+from app.config import Config
+from main import app as flask_app
+
+app = WSGIMiddleware(flask_app, workers=Config.ASGI_THREADS)
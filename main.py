@@ -1,10 +1,31 @@
 # app.py
-from flask import Flask, send_from_directory
+from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import re
 
+from app.config import Config
+from app.ingest import StreamingRequest
+
 app = Flask(__name__)
 
+# JSON com orjson (se instalado), Decimal/datetime do DynamoDB tratados
+from app import json_provider
+json_provider.init_app(app)
+
+# Views async (hoje só /login) rodam num event loop por thread (app/aio.py)
+from app import aio
+aio.init_app(app)
+
+# Uploads: arquivos gravados em streaming no destino (S3/disco), com limites
+app.request_class = StreamingRequest
+app.config["MAX_CONTENT_LENGTH"] = Config.MAX_REQUEST_BYTES
+app.config["MAX_FORM_MEMORY_SIZE"] = Config.MAX_FORM_MEMORY_BYTES
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_grande_demais(e):
+    return jsonify({"error": e.description or "Upload maior que o permitido"}), 413
+
 ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "https://geticard.com",
@@ -27,14 +48,30 @@ CORS(
     },
 )
 
+# Latência por rota/AWS em /metrics (+ Server-Timing opcional)
+from app import metrics
+metrics.init_app(app)
+
+# gzip/brotli negociado (depois das métricas, para o tempo de compressão entrar na conta)
+from app import compression
+compression.init_app(app)
+
 # REGISTRA AS ROTAS
 from app.routes import routes
 app.register_blueprint(routes)
 
-# Servir uploads
-@app.route("/uploads/<path:filename>")
-def servir_arquivo(filename):
-    return send_from_directory("uploads", filename)
+# Clients AWS são lazy; AWS_WARM_UP=1 cria/conecta tudo já no boot do worker
+if Config.AWS_WARM_UP:
+    from app.aws import warm_up
+    warm_up(ping=True)
+
+# Comandos de manutenção (flask --app main cards ...)
+from app.cli import cards_cli
+app.cli.add_command(cards_cli)
+
+# Servir uploads (índice em memória + cache imutável + sendfile/X-Accel-Redirect)
+from app import uploads_server
+uploads_server.init_app(app)
 
 if __name__ == "__main__":
     app.run(debug=True)
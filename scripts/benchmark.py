@@ -0,0 +1,563 @@
+"""
+Benchmark de carga e latência dos fluxos principais (register, login, GET do
+cartão, criação com imagens e update), com o app rodando neste processo
+contra stand-ins em memória do DynamoDB e do S3: sem rede, sem AWS, sem
+servidor. O resultado sai em JSON (p50/p90/p99 por operação, req/s e o
+commit do git) para comparar entre commits.
+
+    python scripts/benchmark.py                                   # padrão
+    python scripts/benchmark.py --cards 5000 --requests 20000 --concurrency 32
+    python scripts/benchmark.py --mix get=80,login=10,update=10 --latency-ms 5
+    python scripts/benchmark.py --out bench.json
+    python scripts/benchmark.py --compare bench-main.json         # diferenças por operação
+
+--latency-ms simula a ida e volta de cada chamada ao DynamoDB/S3 (sleep, que
+solta o GIL como um socket faria); com 0 mede só o custo de CPU do app.
+
+--server sobe o app (com os mesmos stand-ins) num processo-filho atrás de um
+servidor de verdade, com um worker só, e dispara por HTTP: req/s por worker
+em cada modo de serviço.
+
+    python scripts/benchmark.py --server sync --latency-ms 20      # 1 req por vez (gunicorn sync)
+    python scripts/benchmark.py --server threaded --latency-ms 20  # threads (gunicorn gthread)
+    python scripts/benchmark.py --server asgi --latency-ms 20      # uvicorn + asgi.py (ponte para o app WSGI)
+"""
+import argparse
+import base64
+import http.client
+import io
+import json
+import mimetypes
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PASSWORD = "bench-password"
+EXPECTED = {"get": (200, 304), "login": (200,), "register": (201,), "create": (201,), "update": (200,)}
+DEFAULT_MIX = "get=70,login=10,update=10,create=5,register=5"
+
+
+# ---------- Stand-ins ----------
+class Backend:
+    """Conta as chamadas e aplica a latência simulada."""
+
+    def __init__(self, latency_ms):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeTable:
+    """O pouco da Table do boto3 que register/login usam."""
+
+    def __init__(self, name, key, backend):
+        self.name = name
+        self.key = key
+        self.items = {}
+        self.backend = backend
+
+    def get_item(self, Key, **kwargs):
+        self.backend.call()
+        item = self.items.get(Key[self.key])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.backend.call()
+        self.items[Item[self.key]] = dict(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.backend.call()
+        self.items.pop(Key[self.key], None)
+        return {}
+
+
+class FakeS3:
+    def __init__(self, backend):
+        self.objects = {}
+        self.backend = backend
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.backend.call()
+        self.objects[Key] = (len(Body), kwargs.get("ContentType"))
+        return {"ETag": '"bench"'}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.backend.call()
+        size = 0
+        for chunk in iter(lambda: fileobj.read(64 * 1024), b""):
+            size += len(chunk)
+        self.objects[key] = (size, (ExtraArgs or {}).get("ContentType"))
+
+    def head_object(self, Bucket, Key):
+        self.backend.call()
+        if Key not in self.objects:
+            # como o S3: HEAD de chave ausente é um ClientError 404 (storage.head_upload -> None)
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        size, content_type = self.objects[Key]
+        return {"ContentLength": size, "ContentType": content_type}
+
+    def delete_object(self, Bucket, Key):
+        self.backend.call()
+        self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self.backend.call()
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+
+class SlowRepository:
+    """InMemoryCardRepository com a mesma latência por chamada dos outros stand-ins."""
+
+    def __init__(self, repository, backend):
+        self._repository = repository
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self._repository, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._backend.call()
+            return attr(*args, **kwargs)
+        return call
+
+
+# ---------- App ----------
+def boot_app(args, workdir):
+    """Importa main.app já apontando para os stand-ins (nada de .env/AWS de verdade)."""
+    os.environ.update({
+        "CARD_REPOSITORY": "memory",
+        "CARD_CACHE_BACKEND": args.cache,
+        "CARD_CACHE_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "LOCAL_STORE_PATH": os.path.join(workdir, "cards.sqlite3"),
+        "CLEANUP_QUEUE_PATH": os.path.join(workdir, "cleanup.sqlite3"),
+        "BLOB_INDEX_PATH": os.path.join(workdir, "blob-index.sqlite3"),
+        "ANALYTICS_PATH": os.path.join(workdir, "analytics.sqlite3"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search-index.json.gz"),
+        "CLEANUP_WORKER": "0",
+        "AWS_WARM_UP": "0",
+        "S3_BUCKET": "bench-bucket",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "INGEST_TARGET": "local",
+        "IMAGE_PROCESSING": "1" if args.image_processing else "0",
+        # tudo vem do mesmo IP/emails: mede o app, não os limites
+        "RATE_LIMIT_BACKEND": "off",
+        "ADMISSION_MAX_INFLIGHT": "0",
+        "ADMISSION_LATENCY_MS": "0",
+    })
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+
+    from app import aws, storage
+    from app.card_repository import InMemoryCardRepository, set_card_repository
+
+    backend = Backend(args.latency_ms)
+    s3 = FakeS3(backend)
+    storage.get_s3 = lambda: s3
+    aws.users_table = FakeTable("GetiCardUsers", "email", backend)
+    repository = InMemoryCardRepository()
+    set_card_repository(SlowRepository(repository, backend))
+
+    from main import app
+    return app, repository, aws.users_table, backend
+
+
+def _inline_image(rng, kb):
+    return "data:image/png;base64," + base64.b64encode(rng.randbytes(kb * 1024)).decode()
+
+
+def seeded_ids(count):
+    return [(f"seed-{i:06d}", f"seed{i}@bench.geticard.com") for i in range(count)]
+
+
+def seed(repository, users_table, args, rng):
+    """N cartões (uma fração com galeria base64 inline) e um usuário por cartão."""
+    from app.services_utils import hash_password
+
+    password = hash_password(PASSWORD)
+    cards = []
+    for i, (card_id, email) in enumerate(seeded_ids(args.cards)):
+        galeria = [f"https://bench-bucket.s3.amazonaws.com/cards/seed-{i}/galeria/{j}.webp" for j in range(3)]
+        if rng.random() < args.inline_ratio:
+            galeria = [_inline_image(rng, args.inline_kb) for _ in range(args.inline_images)]
+        cards.append({
+            "card_id": card_id, "nome": f"Seed {i}", "emailContato": email,
+            "whatsapp": "5585999999999", "biografia": "Cartão de benchmark " * 5,
+            "foto_perfil": f"https://bench-bucket.s3.amazonaws.com/cards/seed-{i}/avatar/a.webp",
+            "galeria": galeria,
+        })
+        users_table.items[email] = {"email": email, "nome": f"Seed {i}", "password": password}
+    repository.create_cards(cards)
+    return seeded_ids(args.cards)
+
+
+def _image_bytes(rng):
+    try:
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.effect_noise((800, 600), 64).convert("RGB").save(buf, "JPEG", quality=85)
+        return buf.getvalue(), "foto.jpg"
+    except ImportError:
+        return rng.randbytes(200 * 1024), "foto.png"
+
+
+# ---------- Servidor (--server) ----------
+class HttpResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+
+def _multipart(fields):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, values in fields.items():
+        for value in values if isinstance(values, list) else [values]:
+            if isinstance(value, tuple):
+                fileobj, filename = value
+                content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                head = (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                        f"Content-Type: {content_type}\r\n\r\n")
+                parts.append(head.encode() + fileobj.read() + b"\r\n")
+            else:
+                parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class HttpClient:
+    """O pouco do test_client que o Workload usa, por HTTP (uma conexão por thread, keep-alive se o servidor deixar)."""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=120)
+
+    def _request(self, method, path, headers=None, **kwargs):
+        headers = dict(headers or {})
+        body = None
+        if "json" in kwargs:
+            body = json.dumps(kwargs["json"]).encode()
+            headers["Content-Type"] = "application/json"
+        elif "data" in kwargs:
+            body, headers["Content-Type"] = _multipart(kwargs["data"])
+        for attempt in (1, 2):
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                data = resp.read()
+                if resp.will_close:
+                    self.conn.close()
+                return HttpResponse(resp.status, data)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # servidor fechou a conexão ociosa: reconecta uma vez
+                self.conn.close()
+                if attempt == 2:
+                    raise
+
+    def get(self, path, **kwargs):
+        return self._request("GET", path, **kwargs)
+
+    def post(self, path, content_type=None, **kwargs):
+        return self._request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self._request("PUT", path, **kwargs)
+
+
+def serve(args):
+    """Processo-filho de --server: app + stand-ins atrás de um servidor de verdade."""
+    with tempfile.TemporaryDirectory(prefix="geticard-bench-") as workdir:
+        app, repository, users_table, _ = boot_app(args, workdir)
+        seed(repository, users_table, args, random.Random(args.seed))
+        if args.serve == "asgi":
+            import uvicorn
+            from a2wsgi import WSGIMiddleware
+            from app.config import Config
+
+            asgi_app = WSGIMiddleware(app, workers=Config.ASGI_THREADS)  # o mesmo que asgi.py monta
+            uvicorn.run(asgi_app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+            return
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class Handler(WSGIRequestHandler):
+            # sync fecha a conexão a cada resposta (como o worker sync do gunicorn); threaded mantém
+            protocol_version = "HTTP/1.1" if args.serve == "threaded" else "HTTP/1.0"
+
+            def log_request(self, *a, **k):
+                pass
+
+        make_server("127.0.0.1", args.port, app, threaded=args.serve == "threaded",
+                    request_handler=Handler).serve_forever()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    port = _free_port()
+    cmd = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--serve", args.server, "--port", str(port)]
+    proc = subprocess.Popen(cmd, stdout=sys.stderr)  # prints do app não sujam o JSON
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Servidor ({args.server}) saiu com código {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("Servidor não subiu a tempo")
+
+
+# ---------- Operações ----------
+class Workload:
+    def __init__(self, app, seeded, args, address=None):
+        import jwt
+        from app.config import Config
+
+        self.app = app
+        self.address = address
+        self.seeded = seeded
+        self.image, self.image_name = _image_bytes(random.Random(args.seed))
+        self._local = threading.local()
+        self._counter = iter(range(10 ** 9))
+        self._counter_lock = threading.Lock()
+        exp = datetime.utcnow() + timedelta(hours=2)
+        self.tokens = {
+            email: jwt.encode({"sub": email, "exp": exp}, Config.SECRET_KEY, algorithm="HS256")
+            for _, email in seeded
+        }
+
+    def client(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self.app.test_client() if self.address is None else HttpClient(*self.address)
+            self._local.client = client
+        return client
+
+    def _unique(self):
+        with self._counter_lock:
+            return next(self._counter)
+
+    def run(self, op, rng):
+        c = self.client()
+        card_id, email = self.seeded[rng.randrange(len(self.seeded))]
+        if op == "get":
+            return c.get(f"/card/{card_id}").status_code
+        if op == "login":
+            return c.post("/login", json={"email": email, "password": PASSWORD}).status_code
+        if op == "register":
+            n = self._unique()
+            return c.post("/register", json={
+                "nome": f"Novo {n}", "email": f"novo{n}-{os.getpid()}@bench.geticard.com", "password": PASSWORD,
+            }).status_code
+        if op == "create":
+            n = self._unique()
+            data = {
+                "nome": f"Criado {n}", "emailContato": f"criado{n}-{os.getpid()}@bench.geticard.com",
+                "whatsapp": "5585999999999",
+                "foto_perfil": (io.BytesIO(self.image), self.image_name),
+                "galeria": [(io.BytesIO(self.image), self.image_name) for _ in range(2)],
+            }
+            return c.post("/card", data=data, content_type="multipart/form-data").status_code
+        if op == "update":
+            return c.put(
+                f"/card/{card_id}", json={"biografia": f"Atualizado {rng.random():.6f}"},
+                headers={"Authorization": f"Bearer {self.tokens[email]}"},
+            ).status_code
+        raise ValueError(f"Operação desconhecida: {op}")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in EXPECTED:
+            raise SystemExit(f"Operação desconhecida em --mix: {name} (use {', '.join(EXPECTED)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples, wall):
+    ops = {}
+    for op in sorted({s[0] for s in samples}):
+        lat = sorted(s[1] for s in samples if s[0] == op)
+        errors = [s[2] for s in samples if s[0] == op and s[2] not in EXPECTED[op]]
+        ops[op] = {
+            "count": len(lat),
+            "errors": len(errors),
+            "error_statuses": sorted(set(errors)),
+            "rps": round(len(lat) / wall, 1),
+            "mean_ms": round(sum(lat) / len(lat), 3),
+            "p50_ms": round(percentile(lat, 50), 3),
+            "p90_ms": round(percentile(lat, 90), 3),
+            "p99_ms": round(percentile(lat, 99), 3),
+            "max_ms": round(lat[-1], 3),
+        }
+    return ops
+
+
+def git_commit():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{sha}-dirty" if dirty else sha
+    except OSError:
+        return None
+
+
+def compare(result, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    lines = [f"Comparação com {baseline.get('commit')} ({baseline_path}):"]
+    for op, cur in result["ops"].items():
+        old = baseline.get("ops", {}).get(op)
+        if not old:
+            continue
+        cells = []
+        for metric in ("p50_ms", "p99_ms", "rps"):
+            delta = (cur[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            cells.append(f"{metric} {old[metric]:.2f} -> {cur[metric]:.2f} ({delta:+.1f}%)")
+        lines.append(f"  {op:9} " + "  ".join(cells))
+    return "\n".join(lines)
+
+
+def run_load(workload, names, weights, args, rng, backend=None):
+    """Aquecimento e depois o plano dividido entre `concurrency` threads. Retorna (amostras, segundos)."""
+    plan = rng.choices(names, weights=weights, k=args.requests)
+    for op in rng.choices(names, weights=weights, k=args.warmup):
+        workload.run(op, rng)
+
+    samples = []
+    samples_lock = threading.Lock()
+    if backend is not None:
+        backend.calls = 0
+
+    def worker(index, ops):
+        local_rng = random.Random(args.seed * 1000 + index)
+        mine = []
+        for op in ops:
+            start = time.perf_counter()
+            status = workload.run(op, local_rng)
+            mine.append((op, (time.perf_counter() - start) * 1000, status))
+        with samples_lock:
+            samples.extend(mine)
+
+    chunks = [plan[i::args.concurrency] for i in range(args.concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency), chunks))
+    return samples, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=1000, help="cartões (e usuários) semeados")
+    parser.add_argument("--inline-ratio", type=float, default=0.2, help="fração com galeria base64 inline")
+    parser.add_argument("--inline-images", type=int, default=3)
+    parser.add_argument("--inline-kb", type=int, default=60, help="tamanho de cada imagem inline")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"pesos por operação (padrão: {DEFAULT_MIX})")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência simulada por chamada DynamoDB/S3")
+    parser.add_argument("--cache", choices=["memory", "sqlite", "off"], default="memory")
+    parser.add_argument("--image-processing", action="store_true", help="processa as imagens (Pillow) na criação")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="grava o JSON neste arquivo (padrão: stdout)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--server", choices=["inproc", "sync", "threaded", "asgi"], default="inproc",
+                        help="inproc: test_client neste processo; os outros: servidor de verdade com 1 worker")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)  # uso interno: processo do servidor
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    names, weights = list(mix), list(mix.values())
+    if args.server == "inproc":
+        with tempfile.TemporaryDirectory(prefix="geticard-bench-") as workdir:
+            app, repository, users_table, backend = boot_app(args, workdir)
+            seeded = seed(repository, users_table, args, rng)
+            workload = Workload(app, seeded, args)
+            samples, wall = run_load(workload, names, weights, args, rng, backend)
+
+            from app import image_processing
+
+            image_processing_enabled = image_processing.enabled()
+            calls = round(backend.calls / max(len(samples), 1), 2)
+    else:
+        sys.path.insert(0, ROOT)
+        proc, port = start_server(args)
+        try:
+            workload = Workload(None, seeded_ids(args.cards), args, address=("127.0.0.1", port))
+            samples, wall = run_load(workload, names, weights, args, rng)
+        finally:
+            proc.terminate()
+            proc.wait()
+        image_processing_enabled = None  # decidido no processo do servidor
+        calls = None  # contadas no processo do servidor
+
+    result = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "serve", "port")},
+        "image_processing": image_processing_enabled,
+        "requests": len(samples),
+        "wall_s": round(wall, 3),
+        "rps": round(len(samples) / wall, 1),
+        "backend_calls_per_request": calls,
+        "ops": summarize(samples, wall),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+    if args.compare:
+        sys.stderr.write(compare(result, args.compare) + "\n")
+
+
+if __name__ == "__main__":
+    main()
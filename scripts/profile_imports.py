@@ -0,0 +1,88 @@
+"""
+Mede o custo de import (cold start) de cada módulo do app.
+
+Roda `python -X importtime -c "import main"` num processo novo e agrega o
+tempo por módulo. Útil para acompanhar o cold start da Lambda entre commits.
+
+    python scripts/profile_imports.py              # top 25
+    python scripts/profile_imports.py --top 50 --json > imports.json
+    python scripts/profile_imports.py --module app.routes
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def run_importtime(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"Falha ao importar {module}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    return rows
+
+
+def summarize(rows):
+    """Tempo total e por pacote de topo (boto3, pydantic, flask, app...)."""
+    packages = {}
+    for r in rows:
+        top = r["module"].split(".")[0]
+        packages[top] = packages.get(top, 0) + r["self_ms"]
+    total = sum(r["self_ms"] for r in rows)
+    return total, sorted(packages.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="módulo a importar (padrão: main)")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="saída em JSON")
+    args = parser.parse_args()
+
+    rows = run_importtime(args.module)
+    total, packages = summarize(rows)
+    slowest = sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[: args.top]
+
+    if args.json:
+        json.dump({
+            "module": args.module,
+            "total_ms": round(total, 2),
+            "packages": [{"package": p, "self_ms": round(ms, 2)} for p, ms in packages[: args.top]],
+            "modules": slowest,
+        }, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    print(f"import {args.module}: {total:.1f} ms no total\n")
+    print("Por pacote (self):")
+    for package, ms in packages[: args.top]:
+        print(f"  {ms:9.1f} ms  {package}")
+    print("\nMódulos mais lentos (cumulativo):")
+    for r in slowest:
+        print(f"  {r['cumulative_ms']:9.1f} ms  {'  ' * r['depth']}{r['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# tests/conftest.py
+"""
+Os testes rodam sem AWS: cartões e refresh tokens em memória, fila de
+limpeza, índice de conteúdo e busca em SQLite/arquivos num diretório
+temporário. O Config é lido no import, então o ambiente vem antes de tudo.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+_WORKDIR = tempfile.mkdtemp(prefix="geticard-tests-")
+atexit.register(shutil.rmtree, _WORKDIR, ignore_errors=True)
+
+os.environ.update({
+    "CARD_REPOSITORY": "memory",
+    "REFRESH_TOKEN_BACKEND": "memory",
+    "S3_BUCKET": "",
+    "AWS_WARM_UP": "0",
+    "CARD_CACHE_BACKEND": "off",
+    "LOCAL_STORE_PATH": os.path.join(_WORKDIR, "cards.sqlite3"),
+    "CLEANUP_QUEUE_PATH": os.path.join(_WORKDIR, "cleanup.sqlite3"),
+    "CLEANUP_WORKER": "0",
+    "BLOB_INDEX_BACKEND": "sqlite",
+    "BLOB_INDEX_PATH": os.path.join(_WORKDIR, "blob-index.sqlite3"),
+    "ANALYTICS_BACKEND": "off",
+    "SEARCH_INDEX_PATH": os.path.join(_WORKDIR, "search-index.json.gz"),
+    "ARTIFACTS_ENABLED": "0",
+    "IMAGE_PROCESSING": "0",
+    "RATE_LIMIT_BACKEND": "off",
+    "ADMISSION_MAX_INFLIGHT": "0",
+    "ADMISSION_LATENCY_MS": "0",
+})
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def repository():
+    from app.card_repository import InMemoryCardRepository, set_card_repository
+
+    repo = InMemoryCardRepository()
+    set_card_repository(repo)
+    yield repo
+    set_card_repository(None)
+
+
+@pytest.fixture
+def refresh_store():
+    from app.refresh_tokens import InMemoryRefreshTokenStore, set_refresh_token_store
+
+    store = InMemoryRefreshTokenStore()
+    set_refresh_token_store(store)
+    yield store
+    set_refresh_token_store(None)
+
+
+@pytest.fixture
+def search_store(tmp_path, repository):
+    from app import search
+
+    store = search.SearchStore(str(tmp_path / "search-index.json.gz"))
+    search.set_search_store(store)
+    yield store
+    search.set_search_store(None)
+
+
+@pytest.fixture
+def client(repository, refresh_store):
+    from main import app
+
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_header():
+    """Authorization com um JWT de acesso como o do /login."""
+    from app.routes import _access_token
+
+    def make(email, card_id=None):
+        return {"Authorization": f"Bearer {_access_token(email, card_id)}"}
+    return make
+
+
+@pytest.fixture
+def uploads_dir(tmp_path, monkeypatch):
+    """uploads/ local num diretório temporário."""
+    from app import storage
+
+    path = tmp_path / "uploads"
+    path.mkdir()
+    monkeypatch.setattr(storage, "_UPLOAD_ROOT", str(path))
+    return path
+
+
+@pytest.fixture
+def cleanup_queue(tmp_path, monkeypatch):
+    from app import cleanup
+
+    queue = cleanup.CleanupQueue(str(tmp_path / "cleanup.sqlite3"))
+    monkeypatch.setattr(cleanup, "_queue", queue)
+    return queue
+
+
+@pytest.fixture
+def blob_index(tmp_path):
+    from app import content_index
+
+    index = content_index.SQLiteContentIndex(str(tmp_path / "blob-index.sqlite3"))
+    content_index.set_content_index(index)
+    yield index
+    content_index.set_content_index(None)
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete["Objects"]:
+            self.objects.pop(obj["Key"], None)
+        return {}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """storage em modo S3 (bucket "bkt") com um client de mentira."""
+    from app import storage
+
+    fake = FakeS3()
+    monkeypatch.setattr(storage, "_USE_S3", True)
+    monkeypatch.setattr(storage, "_BUCKET", "bkt")
+    monkeypatch.setattr(storage, "_REGION", "us-east-1")
+    monkeypatch.setattr(storage, "_ENDPOINT", None)
+    monkeypatch.setattr(storage, "get_s3", lambda: fake)
+    return fake
@@ -0,0 +1,18 @@
+from app import card_artifacts
+
+
+def _broken(*args, **kwargs):
+    raise RuntimeError("fila de artefatos fora")
+
+
+def test_artifact_failure_does_not_fail_committed_writes(client, repository, auth_header, monkeypatch):
+    monkeypatch.setattr(card_artifacts, "schedule", _broken)
+    monkeypatch.setattr(card_artifacts, "schedule_if_changed", _broken)
+
+    resp = client.post("/card", json={"emailContato": "ana@x.com", "nome": "Ana", "whatsapp": "5585999999999"})
+    assert resp.status_code == 201
+    card_id = resp.get_json()["card_id"]
+
+    resp = client.put(f"/card/{card_id}", headers=auth_header("ana@x.com", card_id), json={"nome": "Ana Souza"})
+    assert resp.status_code == 200
+    assert repository.get_card(card_id)["nome"] == "Ana Souza"
@@ -0,0 +1,79 @@
+import pytest
+
+from app.card_repository import (
+    CardAccessDeniedError, CardNotFoundError, GalleryConflictError, OwnerConflictError,
+    VersionConflictError,
+)
+
+
+def _card(card_id, email, **fields):
+    return {"card_id": card_id, "emailContato": email, "nome": card_id, **fields}
+
+
+def test_find_card_by_owner_uses_index(repository):
+    repository.create_card(_card("c1", "ana@x.com"))
+    assert repository.find_card_by_owner("ana@x.com")["card_id"] == "c1"
+    assert repository.find_card_by_owner("outro@x.com") is None
+
+
+def test_create_card_rejects_second_card_for_owner(repository):
+    repository.create_card(_card("c1", "ana@x.com"))
+    with pytest.raises(OwnerConflictError) as exc:
+        repository.create_card(_card("c2", "ana@x.com"))
+    assert exc.value.card_id == "c1"
+
+
+def test_update_card_bumps_version_and_returns_previous(repository):
+    repository.create_card(_card("c1", "ana@x.com"))
+    card, previous = repository.update_card("c1", "ana@x.com", fields={"nome": "Ana"})
+    assert card["nome"] == "Ana" and previous["nome"] == "c1"
+    assert card["version"] == previous["version"] + 1
+
+
+def test_update_card_checks_owner_and_version(repository):
+    repository.create_card(_card("c1", "ana@x.com"))
+    with pytest.raises(CardAccessDeniedError):
+        repository.update_card("c1", "bia@x.com", fields={"nome": "x"})
+    with pytest.raises(VersionConflictError):
+        repository.update_card("c1", "ana@x.com", fields={"nome": "x"}, expected_version=99)
+    with pytest.raises(CardNotFoundError):
+        repository.update_card("nao-existe", "ana@x.com", fields={"nome": "x"})
+
+
+def test_changing_owner_email_moves_index(repository):
+    repository.create_card(_card("c1", "ana@x.com"))
+    repository.update_card("c1", "ana@x.com", fields={"emailContato": "ana@novo.com"})
+    assert repository.find_card_by_owner("ana@x.com") is None
+    assert repository.find_card_by_owner("ana@novo.com")["card_id"] == "c1"
+
+
+def test_gallery_ops_keep_variants_aligned(repository):
+    repository.create_card(_card("c1", "ana@x.com", galeria=["/uploads/a.webp"], galeria_variants=[{}]))
+    op = {"op": "append", "items": [{"url": "/uploads/b.webp", "variants": {"thumb": "/uploads/bt.webp"}},
+                                    "/uploads/a.webp"]}
+    card, _ = repository.update_card("c1", "ana@x.com", gallery=op)
+    assert card["galeria"] == ["/uploads/a.webp", "/uploads/b.webp"]
+    assert card["galeria_variants"] == [{}, {"thumb": "/uploads/bt.webp"}]
+
+    card, _ = repository.update_card("c1", "ana@x.com", gallery={"op": "reorder", "order": [1, 0]})
+    assert card["galeria"] == ["/uploads/b.webp", "/uploads/a.webp"]
+    with pytest.raises(GalleryConflictError):
+        repository.update_card("c1", "ana@x.com", gallery={"op": "remove", "index": 0, "url": "/uploads/a.webp"})
+
+
+def test_delete_card_releases_owner(repository):
+    card = repository.create_card(_card("c1", "ana@x.com"))
+    repository.delete_card(card)
+    assert repository.get_card("c1") is None
+    repository.create_card(_card("c2", "ana@x.com"))
+
+
+def test_scan_page_paginates(repository):
+    repository.create_cards([_card(f"c{i:02d}", f"u{i}@x.com") for i in range(5)])
+    seen, start = [], None
+    while True:
+        items, start = repository.scan_page(0, 1, start, 2, ["card_id"])
+        seen += [c["card_id"] for c in items]
+        if not start:
+            break
+    assert seen == [f"c{i:02d}" for i in range(5)]
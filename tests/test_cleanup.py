@@ -0,0 +1,78 @@
+import pytest
+
+from app import cleanup, content_index, storage
+from app.config import Config
+
+S3 = "https://bkt.s3.us-east-1.amazonaws.com/"
+BLOB = "content/ab/" + "ab" * 32 + ".webp"
+
+
+def _queued(queue, target):
+    rows = queue._conn().execute("SELECT key FROM cleanup_queue WHERE target = ?", (target,))
+    return sorted(r[0] for r in rows)
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    monkeypatch.setattr(Config, "BLOB_DELETE_GRACE", 0)
+
+
+def test_foreign_s3_url_is_never_queued(s3, cleanup_queue, blob_index):
+    previous = {
+        "card_id": "c1",
+        "foto_perfil": S3 + "cards/c2/avatar/abc-foto.jpg",   # colada do cartão c2
+        "galeria": [S3 + "cards/c1/galeria/def-1.jpg", S3 + "cards/c1x/galeria/ghi.jpg", S3 + "uploads/x.jpg"],
+    }
+    cleanup.enqueue_replaced(previous, {"card_id": "c1"})
+    assert _queued(cleanup_queue, "s3") == ["cards/c1/galeria/def-1.jpg"]
+
+    cleanup.enqueue_deleted({**previous, "artifacts": {"vcf": S3 + "cards/c1/card.vcf"}})
+    assert _queued(cleanup_queue, "s3") == ["cards/c1/card.vcf", "cards/c1/galeria/def-1.jpg"]
+
+
+def test_foreign_local_file_is_never_queued(cleanup_queue, blob_index):
+    own = "/uploads/cards_ab_avatar_" + "0" * 32 + ".jpg"
+    card = {
+        "card_id": "ab",
+        "foto_perfil": own,
+        "galeria": [
+            "/uploads/cards_cd_avatar_" + "1" * 32 + ".jpg",  # outro cartão
+            "/uploads/cards_ab_x_card.vcf",                   # artefato do cartão "ab_x"
+            "/uploads/4f2c-legado.jpg",                       # sem dono conhecido
+        ],
+        "artifacts": {"vcf": "/uploads/cards_ab_card.vcf"},
+    }
+    cleanup.enqueue_deleted(card)
+    assert _queued(cleanup_queue, "local") == ["cards_ab_avatar_" + "0" * 32 + ".jpg", "cards_ab_card.vcf"]
+
+
+def test_shared_blob_survives_until_last_card_releases_it(s3, cleanup_queue, blob_index, no_grace):
+    s3.objects[BLOB] = b"img"
+    a = {"card_id": "a", "foto_perfil": S3 + BLOB}
+    b = {"card_id": "b", "galeria": [S3 + BLOB]}
+    cleanup.retain_card_images(a)
+    cleanup.retain_card_images(b)
+
+    cleanup.enqueue_deleted(a)
+    assert cleanup.drain(cleanup_queue) == {"deleted": 0, "failed": 0}
+    assert BLOB in s3.objects and _queued(cleanup_queue, "s3") == []
+
+    cleanup.enqueue_replaced(b, {"card_id": "b", "galeria": []})
+    assert cleanup.drain(cleanup_queue) == {"deleted": 1, "failed": 0}
+    assert BLOB not in s3.objects
+
+
+def test_recently_touched_blob_waits_for_grace(s3, cleanup_queue, blob_index):
+    s3.objects[BLOB] = b"img"
+    content_index.touch_urls([S3 + BLOB])
+    cleanup.enqueue_urls([S3 + BLOB])
+    assert cleanup.drain(cleanup_queue)["deleted"] == 0
+    assert BLOB in s3.objects and _queued(cleanup_queue, "s3") == [BLOB]
+
+
+def test_card_owns_key():
+    assert storage.card_owns_key("c1", "s3", "cards/c1/avatar/x.jpg")
+    assert storage.card_owns_key("c1", "s3", "cards/c1/qr.png")
+    assert not storage.card_owns_key("c1", "s3", "cards/c1/outra/pasta/x.jpg")
+    assert not storage.card_owns_key("c1", "s3", "cards/c2/avatar/x.jpg")
+    assert not storage.card_owns_key("", "s3", "cards//avatar/x.jpg")
@@ -0,0 +1,19 @@
+def test_encoded_card_gets_its_own_etag(client, repository, auth_header):
+    repository.create_card({"card_id": "c1", "emailContato": "ana@x.com", "nome": "Ana", "biografia": "bio " * 600})
+
+    plain = client.get("/card/c1", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/card/c1", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    etag, coded = plain.headers["ETag"], gzipped.headers["ETag"]
+    assert coded == etag[:-1] + '-gzip"'
+
+    # If-None-Match com o ETag do gzip: 304 devolvendo o mesmo ETag
+    resp = client.get("/card/c1", headers={"Accept-Encoding": "gzip", "If-None-Match": coded})
+    assert resp.status_code == 304 and resp.headers["ETag"] == coded
+    resp = client.get("/card/c1", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert resp.status_code == 304 and resp.headers["ETag"] == etag
+
+    # If-Match com o ETag comprimido vale pela mesma versão
+    headers = {**auth_header("ana@x.com", "c1"), "If-Match": coded}
+    assert client.put("/card/c1", headers=headers, json={"nome": "Ana S."}).status_code == 200
+    assert client.put("/card/c1", headers=headers, json={"nome": "Ana R."}).status_code == 412
@@ -0,0 +1,57 @@
+from botocore.exceptions import ClientError
+
+from app import content_index
+from app.content_index import DynamoContentIndex
+
+BLOB = "/uploads/" + "cd" * 32 + ".webp"
+REF = "local:" + "cd" * 32 + ".webp"
+
+
+def _count(index):
+    return index.states([REF]).get(REF, (0, 0))[0]
+
+
+def test_double_release_does_not_go_negative(blob_index):
+    content_index.update_refs([BLOB], ())
+    content_index.update_refs((), [BLOB])
+    content_index.update_refs((), [BLOB])  # delete refeito
+    assert _count(blob_index) == 0
+    content_index.update_refs([BLOB], ())
+    assert _count(blob_index) == 1
+
+
+class FakeRefsTable:
+    """Só as duas formas de update_item que DynamoContentIndex usa para as contagens."""
+
+    def __init__(self):
+        self.items = {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None):
+        item = self.items.setdefault(Key["id"], {"id": Key["id"]})
+        values = ExpressionAttributeValues
+        if ConditionExpression == "refs >= :need":
+            ok = "refs" in item and item["refs"] >= values[":need"]
+        elif ConditionExpression:
+            ok = "refs" not in item or item["refs"] < values[":need"]
+        else:
+            ok = True
+        if not ok:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        if UpdateExpression.startswith("ADD"):
+            item["refs"] = item.get("refs", 0) + values[":d"]
+        else:
+            item["refs"] = values[":zero"]
+        item["touched"] = values[":now"]
+
+
+def test_dynamo_release_is_clamped_at_zero():
+    table = FakeRefsTable()
+    index = DynamoContentIndex(table)
+    index.adjust({REF: 1}, 100)
+    index.adjust({REF: -1}, 101)
+    index.adjust({REF: -1}, 102)
+    index.adjust({"local:nunca-visto.webp": -1}, 103)
+    assert table.items[f"ref#{REF}"]["refs"] == 0
+    assert table.items["ref#local:nunca-visto.webp"]["refs"] == 0
+    index.adjust({REF: 1}, 104)
+    assert table.items[f"ref#{REF}"]["refs"] == 1
@@ -0,0 +1,32 @@
+from app.config import Config
+
+
+def test_debug_cache_requires_metrics_token_or_admin(client, auth_header, monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "")
+    monkeypatch.setattr(Config, "ADMIN_EMAILS", {"admin@x.com"})
+    assert client.get("/debug-cache").status_code == 403
+    assert client.get("/debug-cache", headers=auth_header("ana@x.com")).status_code == 403
+    assert client.get("/debug-cache", headers=auth_header("admin@x.com")).status_code == 200
+
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "segredo")
+    assert client.get("/debug-cache", headers={"Authorization": "Bearer errado"}).status_code == 403
+    assert client.get("/debug-cache", headers={"Authorization": "Bearer segredo"}).status_code == 200
+
+
+def test_metrics_closed_without_token(client, auth_header, monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "")
+    monkeypatch.setattr(Config, "ADMIN_EMAILS", {"admin@x.com"})
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers=auth_header("ana@x.com")).status_code == 403
+    assert client.get("/metrics", headers=auth_header("admin@x.com")).status_code == 200
+    assert client.get("/debug/profiler").status_code == 403
+
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "segredo")
+    assert client.get("/metrics", headers={"Authorization": "Bearer segredo"}).status_code == 200
+
+
+def test_profiler_rejects_bad_arguments(client, monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_TOKEN", "segredo")
+    headers = {"Authorization": "Bearer segredo"}
+    for query in ("seconds=abc", "seconds=0", "seconds=-5", "seconds=nan", "interval_ms=0", "interval_ms=x"):
+        assert client.post(f"/debug/profiler?{query}", headers=headers).status_code == 400
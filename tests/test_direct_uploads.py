@@ -0,0 +1,14 @@
+import pytest
+
+from app import storage
+
+
+@pytest.mark.parametrize("ext, content_type", [("heic", "image/heic"), ("avif", "image/avif"), ("jpg", "image/jpeg")])
+def test_local_head_upload_knows_image_types(uploads_dir, ext, content_type):
+    key = f"cards/c1/galeria/foto.{ext}"
+    (uploads_dir / storage._local_name(key)).write_bytes(b"img")
+    assert storage.head_upload(key) == {"size": 3, "content_type": content_type}
+
+
+def test_local_head_upload_missing(uploads_dir):
+    assert storage.head_upload("cards/c1/galeria/nada.avif") is None
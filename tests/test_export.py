@@ -0,0 +1,38 @@
+import json
+
+from app.export import ndjson_lines
+
+
+def _lines(events, **kwargs):
+    return [json.loads(line) for line in ndjson_lines(events, **kwargs)]
+
+
+def test_stream_ends_with_complete_trailer():
+    events = [("item", {"card_id": "c1"}), ("checkpoint", "t1"), ("item", {"card_id": "c2"}), ("checkpoint", "t2")]
+    lines = _lines(iter(events), checkpoint_every=1)
+    assert lines[-1] == {"_complete": True, "count": 2}
+    assert {"_checkpoint": "t2"} in lines
+
+
+def test_failure_ends_with_error_line():
+    def events():
+        yield "item", {"card_id": "c1"}
+        yield "checkpoint", "t1"
+        raise RuntimeError("scan falhou")
+
+    lines = _lines(events(), checkpoint_every=0)
+    assert lines[0] == {"card_id": "c1"}
+    assert lines[-1] == {"error": "scan falhou", "_checkpoint": "t1"}
+    assert not any("_complete" in line for line in lines)
+
+
+def test_export_route_writes_trailer(client, repository, auth_header, monkeypatch):
+    from app.config import Config
+
+    monkeypatch.setattr(Config, "ADMIN_EMAILS", {"admin@x.com"})
+    for i in range(3):
+        repository.create_card({"card_id": f"c{i}", "emailContato": f"{i}@x.com", "nome": f"N{i}"})
+    resp = client.get("/cards:export?segments=2", headers=auth_header("admin@x.com"))
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.data.splitlines()]
+    assert lines[-1] == {"_complete": True, "count": 3}
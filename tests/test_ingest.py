@@ -0,0 +1,21 @@
+import hashlib
+
+from app.config import Config
+from app.ingest import LocalSink
+
+
+def test_local_sink_stages_outside_package_and_promotes(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "INGEST_TMP_DIR", str(tmp_path / "incoming"))
+    sink = LocalSink("foto.jpg", "image/jpeg", max_bytes=1024)
+    sink.write(b"abc")
+    sink.write(b"def")
+    assert sink.path.startswith(str(tmp_path / "incoming"))
+    assert sink.sha256 == hashlib.sha256(b"abcdef").hexdigest()
+
+    dest = tmp_path / "uploads" / "final.jpg"
+    dest.parent.mkdir()
+    sink.promote(str(dest))
+    sink.close()
+    assert dest.read_bytes() == b"abcdef"
+    assert list((tmp_path / "incoming").iterdir()) == []
+    assert [p.name for p in dest.parent.iterdir()] == ["final.jpg"]
@@ -0,0 +1,53 @@
+import base64
+
+from botocore.exceptions import ClientError
+
+from app import content_index, storage
+from app.inline_images import migrate_dynamo_table
+
+PNG = "data:image/png;base64," + base64.b64encode(b"\x89PNG inline").decode()
+
+
+class FakeCardsTable:
+    def __init__(self, items, conflict=()):
+        self.items = {i["card_id"]: dict(i) for i in items}
+        self.conflict = set(conflict)  # cartões "editados" durante a migração
+
+    def scan(self, **kwargs):
+        return {"Items": [dict(i) for i in self.items.values()]}
+
+    def update_item(self, Key, ExpressionAttributeNames, ExpressionAttributeValues, **kwargs):
+        if Key["card_id"] in self.conflict:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        item = self.items[Key["card_id"]]
+        for name, field in ExpressionAttributeNames.items():
+            if name.startswith("#f"):
+                item[field] = ExpressionAttributeValues[":" + name[1:]]
+
+
+def _refs(url):
+    target, key = storage.key_for_url(url)
+    return content_index.get_content_index().states([f"{target}:{key}"]).get(f"{target}:{key}", (0, 0))[0]
+
+
+def test_migrated_images_are_counted_as_references(blob_index, uploads_dir):
+    table = FakeCardsTable([
+        {"card_id": "c1", "foto_perfil": PNG, "galeria": ["/uploads/ja-migrada.webp", PNG]},
+        {"card_id": "c2", "galeria": [PNG]},
+    ])
+    migrate_dynamo_table(table, segments=1, on_report=lambda r: None)
+
+    url = table.items["c1"]["foto_perfil"]
+    assert url.startswith("/uploads/") and table.items["c1"]["galeria"] == ["/uploads/ja-migrada.webp", url]
+    # mesma imagem no c1 (avatar + galeria conta uma vez por cartão) e no c2
+    assert _refs(url) == 2
+    assert _refs("/uploads/ja-migrada.webp") == 0
+
+
+def test_dry_run_and_conflicts_are_not_counted(blob_index, uploads_dir):
+    table = FakeCardsTable([{"card_id": "c1", "foto_perfil": PNG}], conflict={"c1"})
+    totals = migrate_dynamo_table(table, segments=1, on_report=lambda r: None)
+    assert totals["conflicts"] == 1
+    migrate_dynamo_table(FakeCardsTable([{"card_id": "c2", "foto_perfil": PNG}]), segments=1,
+                         dry_run=True, on_report=lambda r: None)
+    assert blob_index._conn().execute("SELECT COUNT(*) FROM refs WHERE count != 0").fetchone()[0] == 0
@@ -0,0 +1,31 @@
+import json
+import threading
+
+import pytest
+
+from app.local_store import LocalCardStore
+
+
+def test_legacy_json_is_imported_before_first_read(tmp_path):
+    legacy = tmp_path / "cards.json"
+    legacy.write_text(json.dumps({f"c{i}": {"nome": f"N{i}", "emailContato": f"{i}@x.com"} for i in range(200)}))
+    store = LocalCardStore(str(tmp_path / "cards.sqlite3"), legacy_json=str(legacy))
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.get_card("c199"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [r and r["nome"] for r in results] == ["N199"] * 8
+
+
+def test_failed_legacy_import_is_retried(tmp_path):
+    legacy = tmp_path / "cards.json"
+    legacy.write_text('{"c1": {"nome": "Ana"}, "c2": ')
+    store = LocalCardStore(str(tmp_path / "cards.sqlite3"), legacy_json=str(legacy))
+    with pytest.raises(Exception):
+        store.get_card("c1")
+
+    legacy.write_text('{"c1": {"nome": "Ana"}}')
+    assert store.get_card("c1")["nome"] == "Ana"
@@ -0,0 +1,28 @@
+from app import rate_limit
+
+
+def test_email_field_read_from_multipart_form(client, uploads_dir, monkeypatch):
+    seen = []
+
+    def check(group, email):
+        seen.append((group, email))
+        return 30
+    monkeypatch.setattr(rate_limit, "check", check)
+
+    resp = client.post(
+        "/card",
+        data={"nome": "Ana", "emailContato": "ana@x.com", "whatsapp": "11999999999"},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "30"
+    assert seen == [("write", "ana@x.com")]
+
+
+def test_email_field_read_from_json(client, monkeypatch):
+    seen = []
+    monkeypatch.setattr(rate_limit, "check", lambda group, email: seen.append(email) or 30)
+
+    resp = client.post("/card", json={"nome": "Ana", "emailContato": "ana@x.com", "whatsapp": "11999999999"})
+    assert resp.status_code == 429
+    assert seen == ["ana@x.com"]
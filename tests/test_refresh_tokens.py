@@ -0,0 +1,73 @@
+import pytest
+
+from app.config import Config
+from app.refresh_tokens import RefreshTokenError, RefreshTokenReuseError
+
+
+def test_rotate_returns_successor_once(refresh_store):
+    token = refresh_store.issue("ana@x.com", "c1")
+    successor, session = refresh_store.rotate(token)
+    assert successor != token
+    assert session["email"] == "ana@x.com" and session["card_id"] == "c1"
+    refresh_store.rotate(successor)
+
+
+def test_reuse_within_grace_is_refused_without_revoking(refresh_store):
+    token = refresh_store.issue("ana@x.com", "c1")
+    successor, _ = refresh_store.rotate(token)
+    with pytest.raises(RefreshTokenError) as exc:
+        refresh_store.rotate(token)
+    assert not isinstance(exc.value, RefreshTokenReuseError)
+    refresh_store.rotate(successor)
+
+
+def test_reuse_after_grace_revokes_family(refresh_store, monkeypatch):
+    monkeypatch.setattr(Config, "REFRESH_REUSE_GRACE", -1)
+    token = refresh_store.issue("ana@x.com", "c1")
+    successor, _ = refresh_store.rotate(token)
+    with pytest.raises(RefreshTokenReuseError):
+        refresh_store.rotate(token)
+    with pytest.raises(RefreshTokenError):
+        refresh_store.rotate(successor)
+
+
+def test_revoke_ends_session(refresh_store):
+    token = refresh_store.issue("ana@x.com")
+    successor, _ = refresh_store.rotate(token, find_card_id=lambda email: "c9")
+    refresh_store.revoke(token)
+    with pytest.raises(RefreshTokenError):
+        refresh_store.rotate(successor)
+
+
+def test_missing_card_id_is_looked_up_on_rotate(refresh_store):
+    token = refresh_store.issue("ana@x.com")
+    _, session = refresh_store.rotate(token, find_card_id=lambda email: "c9")
+    assert session["card_id"] == "c9"
+
+
+def test_refresh_route(client, repository, refresh_store, monkeypatch):
+    monkeypatch.setattr(Config, "REFRESH_REUSE_GRACE", -1)
+    repository.create_card({"card_id": "c1", "emailContato": "ana@x.com", "nome": "Ana"})
+    token = refresh_store.issue("ana@x.com", "c1")
+    resp = client.post("/refresh", json={"refresh_token": token})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert body["card_id"] == "c1" and body["refresh_token"] != token
+
+    assert client.post("/refresh", json={"refresh_token": token}).status_code == 401
+    assert client.post("/refresh", json={"refresh_token": body["refresh_token"]}).status_code == 401
+    assert client.post("/refresh", json={}).status_code == 400
+
+
+def test_rotate_rechecks_card_id(refresh_store):
+    token = refresh_store.issue("ana@x.com", "c1")
+    _, session = refresh_store.rotate(token, find_card_id=lambda email: None)
+    assert session["card_id"] is None
+
+
+def test_stale_card_claim_is_not_ownership(client, repository, auth_header):
+    repository.create_card({"card_id": "c1", "emailContato": "bia@x.com", "nome": "Bia"})
+    headers = auth_header("ana@x.com", "c1")
+    assert client.get("/card/c1/stats", headers=headers).status_code == 403
+    resp = client.post("/card/c1/uploads", headers=headers, json={"files": []})
+    assert resp.status_code == 403
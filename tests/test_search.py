@@ -0,0 +1,54 @@
+from app import search
+
+
+def _card(card_id, nome, empresa="", biografia=""):
+    return {"card_id": card_id, "nome": nome, "empresa": empresa, "biografia": biografia}
+
+
+def test_fold_and_tokenize():
+    assert search.fold("Conceição") == "conceicao"
+    assert search.tokenize("João da Silva") == ["joao", "silva"]
+
+
+def test_ranking_prefers_name_and_exact_terms():
+    index = search.SearchIndex()
+    for card in (_card("c1", "Ana Souza", biografia="designer"),
+                 _card("c2", "Bruno", empresa="Designer Co"),
+                 _card("c3", "Designer Lima")):
+        index.put(card["card_id"], search.card_terms(card), search.card_preview(card))
+    assert [cid for cid, _ in index.search("designer")] == ["c3", "c2", "c1"]
+
+    index.put("c4", search.card_terms(_card("c4", "Designers Unidos")), {"nome": "Designers Unidos"})
+    ranked = [cid for cid, _ in index.search("designer")]
+    assert ranked.index("c3") < ranked.index("c4")
+
+
+def test_prefix_and_all_tokens_must_match():
+    index = search.SearchIndex()
+    index.put("c1", search.card_terms(_card("c1", "João Silva")), {"nome": "João Silva"})
+    index.put("c2", search.card_terms(_card("c2", "João Pereira")), {"nome": "João Pereira"})
+    assert [cid for cid, _ in index.search("jo sil")] == ["c1"]
+    assert index.search("joao xyz") == []
+
+
+def test_snapshot_roundtrip():
+    index = search.SearchIndex()
+    index.put("c1", search.card_terms(_card("c1", "Ana", "Acme")), {"nome": "Ana"})
+    loaded = search.SearchIndex.from_bytes(index.to_bytes())
+    assert loaded.search("acme") == index.search("acme")
+    loaded.remove("c1")
+    assert loaded.search("acme") == []
+
+
+def test_store_builds_from_repository_and_sees_other_workers(search_store, repository):
+    repository.create_card(_card("c1", "Maria Conceição"))
+    assert search.search("conceicao")["total"] == 1
+
+    # outro worker (outra instância no mesmo arquivo) grava no diário
+    other = search.SearchStore(search_store.path)
+    other.append([{"op": "put", "id": "c2", "terms": search.card_terms(_card("c2", "Mariana")),
+                   "preview": {"nome": "Mariana"}}])
+    assert [r["card_id"] for r in search.search("mari")["results"]] == ["c1", "c2"]
+
+    search.remove_card("c1")
+    assert search.search("conceicao")["total"] == 0
@@ -0,0 +1,58 @@
+import io
+
+from app import routes
+from app.card_cache import card_cache
+from app.card_repository import CardAccessDeniedError
+
+
+def test_failure_after_write_keeps_new_uploads(client, repository, auth_header, uploads_dir, monkeypatch):
+    repository.create_card({"card_id": "c1", "emailContato": "ana@x.com", "nome": "Ana"})
+    discarded = []
+    monkeypatch.setattr(routes, "_descartar_uploads", discarded.extend)
+
+    def broken_cache(*args, **kwargs):
+        raise RuntimeError("cache fora")
+    monkeypatch.setattr(card_cache, "set", broken_cache)
+
+    resp = client.put(
+        "/card/c1", headers=auth_header("ana@x.com", "c1"),
+        data={"foto_perfil": (io.BytesIO(b"avatar-bytes"), "avatar.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 200
+    foto = repository.get_card("c1")["foto_perfil"]
+    assert foto.startswith("/uploads/")
+    assert discarded == []
+    assert (uploads_dir / foto.rsplit("/", 1)[-1]).exists()
+
+
+def test_non_owner_is_refused_before_upload(client, repository, auth_header, uploads_dir):
+    repository.create_card({"card_id": "c1", "emailContato": "ana@x.com", "nome": "Ana"})
+    for headers in (auth_header("bia@x.com"), auth_header("bia@x.com", "c2")):
+        resp = client.put(
+            "/card/c1", headers=headers,
+            data={"foto_perfil": (io.BytesIO(b"avatar-bytes"), "avatar.jpg")},
+            content_type="multipart/form-data",
+        )
+        assert resp.status_code == 403
+    assert list(uploads_dir.iterdir()) == []
+    assert repository.get_card("c1").get("foto_perfil") is None
+
+
+def test_failed_write_discards_new_uploads(client, repository, auth_header, uploads_dir, monkeypatch):
+    repository.create_card({"card_id": "c1", "emailContato": "ana@x.com", "nome": "Ana"})
+    discarded = []
+    monkeypatch.setattr(routes, "_descartar_uploads", discarded.extend)
+
+    def lost_race(*args, **kwargs):  # o dono mudou entre a conferência e a escrita
+        raise CardAccessDeniedError()
+    monkeypatch.setattr(repository, "update_card", lost_race)
+
+    resp = client.put(
+        "/card/c1", headers=auth_header("ana@x.com", "c1"),
+        data={"foto_perfil": (io.BytesIO(b"avatar-bytes"), "avatar.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert resp.status_code == 403
+    assert [item["url"] for item in discarded] != []
+    assert repository.get_card("c1").get("foto_perfil") is None